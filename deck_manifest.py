@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+
+def replace_file(path: Path, text: str):
+    """Writes ``text`` to ``path`` through a temp file, so readers see the old or the new file, never half of one."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class DeckManifest:
+    """What each slide of a deck was last uploaded as: the hashes it was made from and its Tana nodeId.
+
+    Entries are listed in slide order: ``content`` hashes the extracted text,
+    ``source`` the PDF page (so an unchanged page is known without rendering
+    it) and ``image`` the rendered upload. ``removed`` holds entries of slides
+    that left the deck until they've been reported.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        data = json.loads(path.read_text(encoding='utf-8')) if path.is_file() else {}
+        self.target_node_id: Optional[str] = data.get('target_node_id')
+        self.image_format: Optional[str] = data.get('image_format')
+        self.slides: list[Optional[dict]] = data.get('slides', [])
+        self.removed: list[dict] = data.get('removed', [])
+
+    @classmethod
+    def for_deck(cls, pptx_path: Path, manifest_dir: Path) -> 'DeckManifest':
+        key = hashlib.sha256(str(pptx_path.resolve()).encode('utf-8')).hexdigest()[:16]
+        return cls(manifest_dir / f'{pptx_path.stem}-{key}.json')
+
+    def reset(self, target_node_id: str, image_format: str):
+        self.target_node_id, self.image_format, self.slides, self.removed = target_node_id, image_format, [], []
+
+    def get(self, index: int) -> Optional[dict]:
+        return self.slides[index] if index < len(self.slides) else None
+
+    def set(self, index: int, entry: dict):
+        self.slides.extend([None] * (index + 1 - len(self.slides)))
+        self.slides[index] = entry
+
+    def rematch(self, contents: list[str], sources: list[Optional[str]]):
+        """Re-lays the entries out for the deck's current slides, so inserting or moving a slide shifts nothing else.
+
+        A slide takes an entry with its content hash first, preferring one
+        with the same page, then the nearest; a slide with new content takes
+        the entry at its position, if no other slide claimed it. Entries
+        left over move to ``removed``.
+        """
+        unclaimed = {i for i, entry in enumerate(self.slides) if entry}
+        by_content: dict[str, list[int]] = {}
+        for i in sorted(unclaimed):
+            by_content.setdefault(self.slides[i]['content'], []).append(i)
+
+        matched: list[Optional[int]] = [None] * len(contents)
+        for index, content in enumerate(contents):
+            candidates = [i for i in by_content.get(content, ()) if i in unclaimed]
+            if candidates:
+                matched[index] = min(candidates, key=lambda i: (self.slides[i]['source'] != sources[index],
+                                                                abs(i - index)))
+                unclaimed.discard(matched[index])
+        for index in range(len(contents)):
+            if matched[index] is None and index in unclaimed:
+                matched[index] = index
+                unclaimed.discard(index)
+
+        self.removed.extend(self.slides[i] for i in sorted(unclaimed))
+        self.slides = [self.slides[i] if i is not None else None for i in matched]
+
+    def save(self):
+        data = {'target_node_id': self.target_node_id, 'image_format': self.image_format, 'slides': self.slides,
+                'removed': self.removed}
+        replace_file(self.path, json.dumps(data, indent=1))
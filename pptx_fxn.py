@@ -1,5 +1,12 @@
+import hashlib
+import io
+import json
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from configparser import ConfigParser, NoOptionError
 from pathlib import Path
+from typing import Iterable, Optional
 
 import appdirs
 import fitz
@@ -11,14 +18,19 @@ import typer
 import win32com.client
 
 import tana_helpers.TanaAPI as tapi
-from tana_helpers.TanaAPI import LargeFileError
+from tana_helpers.TanaAPI._resolver import FIELD
+from deck_manifest import DeckManifest, replace_file
+from slide_images import IMAGE_FORMATS, render_image
 
 SLIDE_TAG = tapi.SuperTag(id='EzfED-izb3-0')
 APP_PATH = Path(appdirs.AppDirs('hc2md').user_data_dir)
 TABLE_FIELD_PATH = APP_PATH / 'pptx_table_fields.cfg'
+MANIFEST_DIR = APP_PATH / 'deck_manifests'
 TABLE_FIELDS_NODE_ID = '2ZW21NkrZcxq'
 FIELD_TAG = tapi.SuperTag(id='SYS_T02')
 TABLE_TAG = tapi.SuperTag(id='HyaHwYWkdPXK')
+# rendered pages waiting to be uploaded; caps how many images are held in memory at once
+RENDER_AHEAD = 4
 
 
 class OutputterData:
@@ -27,30 +39,22 @@ class OutputterData:
         self.data: list[tuple[str, int]] = []
         self.index = 0
 
+    def content_hash(self) -> str:
+        text = json.dumps([self.title, self.data], separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
     def to_nodes(self) -> list[tapi.Node]:
-        parent_node = tapi.Node(children=[])
-        cur_node_by_level: dict[int, tapi.Node] = {-1: parent_node}
-        for cur_data, cur_level in self.data:
+        def line_node(item: tuple[str, int]) -> tuple[int, tapi.Node]:
+            cur_data, cur_level = item
             if cur_data == TABLE_TAG.id:
-                cur_node = tapi.PlainNode(name='Table', supertags=[TABLE_TAG])
+                return cur_level, tapi.PlainNode(name='Table', supertags=[TABLE_TAG])
             elif cur_data.endswith('::'):
-                cur_node = get_field(cur_data[:-2].strip())
+                return cur_level, get_field(cur_data[:-2].strip())
             else:
-                cur_node = tapi.PlainNode(name=cur_data)
-            cur_node_by_level[cur_level] = cur_node
-            try:
-                cur_node_by_level[cur_level - 1].children.append(cur_node)
-            except AttributeError:
-                cur_node_by_level[cur_level - 1].children = [cur_node]
-            except KeyError:
-                cur_level -= 1
-                while cur_level >= 0:
-                    cur_level -= 1
-                    if cur_level in cur_node_by_level:
-                        cur_node_by_level[cur_level].children.append(cur_node)
-                        break
-
-        return parent_node.children
+                return cur_level, tapi.PlainNode(name=cur_data)
+
+        # a skipped level puts the line under its nearest open ancestor
+        return tapi.build_outline(self.data, line_node)
 
 
 class TanaOutputter(outputter.md_outputter):
@@ -128,31 +132,102 @@ class TanaOutputter(outputter.md_outputter):
         pass
 
 
-def get_field(field_name: str, make_new: bool = True) -> tapi.FieldNode:
-    node_name = field_name.replace(':', '').replace('=', '')
-    if TABLE_FIELD_PATH.is_file():
-        parser = ConfigParser()
-        parser.read(TABLE_FIELD_PATH)
-    else:
-        parser = ConfigParser()
-        with TABLE_FIELD_PATH.open('w') as cfg_file:
-            parser.write(cfg_file)
+class TableFieldConfig(tapi.ResolverStore):
+    """The table field ids in ``pptx_table_fields.cfg``: read once, and written back by ``save`` in one atomic replace."""
+    def __init__(self, path: Path = TABLE_FIELD_PATH):
+        self.path = path
+        self.parser = ConfigParser()
+        if path.is_file():
+            self.parser.read(path)
+        self.dirty = False
+
+    def option(self, field_name: str) -> str:
+        return self.parser.optionxform(field_name.replace(':', '').replace('=', ''))
+
+    def get_many(self, kind: str, names: list[str]) -> dict[str, tuple[float, str]]:
+        defaults = self.parser.defaults()
+        found = {}
+        for name in names:
+            node_id = defaults.get(self.option(name))
+            if node_id is not None:
+                found[name] = (0.0, node_id)
+        return found
+
+    def put_many(self, kind: str, node_ids: dict[str, str], stored_at: float):
+        for name, node_id in node_ids.items():
+            self.parser.set('DEFAULT', self.option(name), node_id)
+        self.dirty = True
+
+    def delete(self, kind: str, names: list[str]):
+        for name in names:
+            self.parser.remove_option('DEFAULT', self.option(name))
+        self.dirty = True
+
+    def delete_kind(self, kind: str):
+        # the file only holds table fields
+        for option in list(self.parser.defaults()):
+            self.parser.remove_option('DEFAULT', option)
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        cfg_file = io.StringIO()
+        self.parser.write(cfg_file)
+        replace_file(self.path, cfg_file.getvalue())
+        self.dirty = False
+
+
+_FIELD_REGISTRY: Optional[tapi.NodeResolver] = None
+
+
+def get_field_registry() -> tapi.NodeResolver:
+    """Table column name -> field id for this run; new fields are created under ``TABLE_FIELDS_NODE_ID``."""
+    global _FIELD_REGISTRY
+    if _FIELD_REGISTRY is None:
+        _FIELD_REGISTRY = tapi.NodeResolver(store=TableFieldConfig(), targets={FIELD: TABLE_FIELDS_NODE_ID})
+    return _FIELD_REGISTRY
+
+
+def register_table_fields(slides: Iterable[OutputterData]) -> dict[str, str]:
+    """Resolves every table column in the deck up front.
+
+    Columns without a field yet are all created in one submit, and the
+    config is written once, so building the slides never touches the file
+    or the API for a field.
+    """
+    registry = get_field_registry()
+    store: TableFieldConfig = registry.store
+    # names that differ only in case or ':'/'=' share a config entry, so only the first is created
+    by_option: dict[str, str] = {}
+    for slide in slides:
+        for cur_data, _ in slide.data:
+            if cur_data.endswith('::'):
+                name = cur_data[:-2].strip()
+                by_option.setdefault(store.option(name), name)
+    node_ids = registry.resolve_many(FIELD, by_option.values())
+    store.save()
+    return node_ids
 
-    try:
-        node_id = parser.get('DEFAULT', node_name)
-    except NoOptionError:
-        if not make_new:
-            raise
 
-        field_node = tapi.PlainNode(name=field_name, supertags=[FIELD_TAG])
-        new_nodes = tapi.Tana(field_node, target_id=TABLE_FIELDS_NODE_ID).submit(True)
-        node_id = new_nodes.children[0].nodeId
+def get_field(field_name: str, make_new: bool = True) -> tapi.FieldNode:
+    registry = get_field_registry()
+    try:
+        node_id = registry.resolve(FIELD, field_name, make_new)
+    except KeyError:
+        raise NoOptionError(registry.store.option(field_name), 'DEFAULT') from None
+    registry.store.save()
+    return tapi.FieldNode(attributeId=node_id)
 
-        parser.set('DEFAULT', node_name, node_id)
-        with TABLE_FIELD_PATH.open('w') as cfg_file:
-            parser.write(cfg_file)
 
-    return tapi.FieldNode(attributeId=node_id)
+def page_fingerprint(page: fitz.Page) -> str:
+    """Hashes what a page is drawn from: its content stream and the images and forms it uses; nothing is rendered."""
+    doc = page.parent
+    digest = hashlib.sha256(repr(tuple(page.rect)).encode('ascii'))
+    digest.update(page.read_contents())
+    for xref in sorted({img[0] for img in page.get_images(full=True)} | {x[0] for x in page.get_xobjects()}):
+        digest.update(doc.xref_stream_raw(xref) or b'')
+    return digest.hexdigest()
 
 
 class SlideNode(tapi.Node):
@@ -182,7 +257,39 @@ def ppt_to_pdf(input_file: Path, output_file: Path, format_type=32):
     powerpoint.Quit()
 
 
-def main(pptx_path: Path, pdf_path: Path = None, target_node_id: str = None):
+_worker_pdf: Optional[fitz.Document] = None
+
+
+def _open_worker_pdf(pdf_path: str):
+    global _worker_pdf
+    _worker_pdf = fitz.open(pdf_path)
+
+
+def render_page(index: int, image_format: str = 'png', max_bytes: int = None) -> bytes:
+    """Renders one page in a pool worker, from that worker's own copy of the PDF."""
+    return render_image(_worker_pdf[index], image_format, max_bytes)
+
+
+def upload_slide(api: tapi.Tana, index: int, slide: OutputterData, page_img_bytes: bytes,
+                 image_format: str = 'png') -> str:
+    suffix = IMAGE_FORMATS[image_format][0]
+    api.add_children(slide_node := SlideNode.new(slide, f'slide{index + 1:d}{suffix}', page_img_bytes))
+    return api.submit(compact=True).id_for(slide_node)
+
+
+def main(pptx_path: Path, pdf_path: Path = None, target_node_id: str = None, workers: int = None,
+         render_ahead: int = RENDER_AHEAD, image_format: str = 'png', incremental: bool = False,
+         max_image_bytes: int = None):
+    """With ``--incremental``, slides whose text and page are unchanged since the last run are skipped.
+
+    Slides render at zoom 1. ``--max-image-bytes`` caps each image instead,
+    rendering it as large as fits; ``slide_images.image_byte_budget()`` is
+    Tana's documented file limit, which leaves thumbnails of about 3.6 KB.
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise typer.BadParameter(f'image_format must be one of {", ".join(IMAGE_FORMATS)}')
+    manifest = DeckManifest.for_deck(pptx_path, MANIFEST_DIR)
+
     # Get missing values
     if not pdf_path:
         pdf_path = pptx_path.with_suffix('.pdf')
@@ -190,14 +297,20 @@ def main(pptx_path: Path, pdf_path: Path = None, target_node_id: str = None):
             print(f'Converting {pptx_path.name} to PDF')
             ppt_to_pdf(pptx_path, pdf_path)
 
-    if target_node_id is None:
+    if target_node_id is None and incremental and manifest.target_node_id:
+        target_node_id = manifest.target_node_id
+        print(f'Re-syncing into https://app.tana.inc?nodeid={target_node_id}')
+    elif target_node_id is None:
         print('Adding a node to your Tana Inbox')
-        slides_node = tapi.Tana(tapi.PlainNode(name=f'Slides ({pptx_path.name})')).target_inbox().submit()
-        target_node_id = slides_node.children[0].nodeId
+        slides_node = tapi.PlainNode(name=f'Slides ({pptx_path.name})')
+        target_node_id = tapi.Tana(slides_node).target_inbox().submit(compact=True).id_for(slides_node)
         print(f'Complete. See https://app.tana.inc?nodeid={target_node_id}')
     elif target_node_id.startswith('http'):
         target_node_id = target_node_id.split('=', 1)[1]
     api = tapi.Tana().set_target_id(target_node_id)
+    if not incremental or manifest.target_node_id != target_node_id or manifest.image_format != image_format:
+        # the recorded slides live under another node, or were rendered differently
+        manifest.reset(target_node_id, image_format)
 
     print('Opening PPTX')
     prs = Presentation(pptx_path)
@@ -207,24 +320,69 @@ def main(pptx_path: Path, pdf_path: Path = None, target_node_id: str = None):
     del prs
     print('Completed Extracting')
 
+    print('Registering Table Fields')
+    register_table_fields(t_out.slides)
+
     print('Opening PDF')
-    pdf = fitz.open(pdf_path.as_posix())
-
-    cur_page: fitz.Page
-    for i, (cur_page, slide) in tqdm(enumerate(zip(pdf, t_out.slides)), total=len(pdf)):
-        # print(f'Getting Slide {i+1}')
-        cur_zoom = 1.0
-        while cur_zoom > 0:
-            try:
-                zoom_matrix = fitz.Matrix(cur_zoom, cur_zoom)
-                page_img_bytes = cur_page.get_pixmap(matrix=zoom_matrix).tobytes()
-                api.add_children(SlideNode.new(slide, f'slide{i + 1:d}.png', page_img_bytes))
-                api.submit()
-                break
-            except LargeFileError as lfe:
-                cur_zoom  *= lfe.MAX_LEN / lfe.encoded_size
-        else:
-            raise LargeFileError('Could not zoom out enough to make the image uploadable')
+    with fitz.open(pdf_path.as_posix()) as pdf:
+        n_slides = min(len(pdf), len(t_out.slides))
+        # recorded on every run, so the next incremental one can tell which pages changed
+        sources = [page_fingerprint(pdf[i]) for i in range(n_slides)]
+    contents = [t_out.slides[i].content_hash() for i in range(n_slides)]
+    manifest.rematch(contents, sources)
+
+    def unchanged(index: int) -> bool:
+        entry = manifest.get(index)
+        return entry is not None and entry['content'] == contents[index] and entry['source'] == sources[index]
+
+    to_sync = [i for i in range(n_slides) if not unchanged(i)]
+    if incremental:
+        print(f'{n_slides - len(to_sync)} of {n_slides} slides unchanged')
+    superseded = []
+
+    if to_sync:
+        # Pages render in worker processes while the main process uploads the ones before them, in order.
+        # At most render_ahead rendered pages wait for upload, so memory doesn't grow with the deck.
+        workers = workers or max(min(os.cpu_count() or 1, render_ahead), 1)
+        with ProcessPoolExecutor(workers, initializer=_open_worker_pdf, initargs=(pdf_path.as_posix(),)) as pool:
+            pages = iter(to_sync)
+            pending: deque[tuple[int, Future]] = deque()
+
+            def render_next():
+                index = next(pages, None)
+                if index is not None:
+                    pending.append((index, pool.submit(render_page, index, image_format, max_image_bytes)))
+
+            for _ in range(max(render_ahead, 1)):
+                render_next()
+            with tqdm(total=len(to_sync)) as progress:
+                while pending:
+                    i, rendered = pending.popleft()
+                    page_img_bytes = rendered.result()
+                    render_next()
+                    entry = {'content': contents[i], 'source': sources[i],
+                             'image': hashlib.sha256(page_img_bytes).hexdigest()}
+                    old = manifest.get(i)
+                    if old is not None and old['content'] == entry['content'] and old['image'] == entry['image']:
+                        # the page source changed but renders the same, e.g. the PDF was just exported again
+                        entry['node_id'] = old['node_id']
+                    else:
+                        entry['node_id'] = upload_slide(api, i, t_out.slides[i], page_img_bytes, image_format)
+                        if old is not None:
+                            superseded.append(old['node_id'])
+                    # saved after every slide, so an interrupted run still skips what it uploaded
+                    manifest.set(i, entry)
+                    manifest.save()
+                    progress.update()
+
+    # the API can only add nodes, so replaced and deleted slides are left for you to remove,
+    # and a moved slide keeps its old place under the deck's node
+    for label, node_ids in [('Replaced', superseded),
+                            ('No longer in the deck', [e['node_id'] for e in manifest.removed])]:
+        for node_id in node_ids:
+            print(f'{label}: https://app.tana.inc?nodeid={node_id}')
+    manifest.removed = []
+    manifest.save()
 
     return {
         "statusCode": 200,
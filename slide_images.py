@@ -0,0 +1,106 @@
+import math
+from typing import TYPE_CHECKING, Optional
+
+from tana_helpers.TanaAPI import LargeFileError, base64_size
+
+if TYPE_CHECKING:
+    import fitz
+
+# a rendered slide encodes to about header + bytes_per_pixel * pixels; the rate is re-measured on every render
+IMAGE_FORMATS = {
+    # format: (file suffix, header bytes, starting bytes per pixel)
+    'png': ('.png', 100, 0.8),
+    'jpeg': ('.jpg', 600, 0.25),
+    'webp': ('.webp', 60, 0.15),
+}
+PROBE_QUALITY = 75
+MIN_QUALITY = 30
+MAX_QUALITY = 95
+# aim a little under the budget so an estimate that's slightly off still fits
+FILL_TARGET = 0.9
+# a first render that fits but uses less of the budget than this is worth rendering again, larger
+UNDERSHOOT = 0.6
+
+# bytes per pixel measured on this process's last render of each format, a better start than the priors
+_bytes_per_pixel: dict[str, float] = {}
+
+
+def image_byte_budget(max_len: int = LargeFileError.MAX_LEN) -> int:
+    """The most raw image bytes whose base64 is at most ``max_len`` characters.
+
+    The default, ``LargeFileError.MAX_LEN``, is the file field limit Tana
+    documents; at about 3.6 KB it only fits a thumbnail of a slide.
+    """
+    return max_len // 4 * 3
+
+
+def encode_pixmap(pix: "fitz.Pixmap", image_format: str, quality: int = PROBE_QUALITY) -> bytes:
+    if image_format == 'png':
+        return pix.tobytes('png')
+    if image_format == 'jpeg':
+        return pix.tobytes('jpeg', jpg_quality=quality)
+    return pix.pil_tobytes(format='WEBP', quality=quality)  # PyMuPDF hands WebP to Pillow
+
+
+def _best_quality(pix: "fitz.Pixmap", image_format: str, max_bytes: int) -> Optional[bytes]:
+    """The highest-quality encoding that fits, by binary search over the quality; no re-rendering."""
+    best, low, high = None, MIN_QUALITY, MAX_QUALITY
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode_pixmap(pix, image_format, quality)
+        if len(data) <= max_bytes:
+            best, low = data, quality + 1
+        else:
+            high = quality - 1
+    return best
+
+
+def fit_image(page: "fitz.Page", max_bytes: int, image_format: str = 'png', max_zoom: float = 1.0) -> bytes:
+    """Renders ``page`` about as large as fits in ``max_bytes``, rendering it at most twice.
+
+    The first zoom is predicted from the page's size and the bytes per pixel
+    of the last render. A second render only happens when that one is over
+    the budget, or well under it, and uses the bytes per pixel it measured.
+    The largest render that fits is kept, so a second render that overshoots
+    falls back to the first. Anything still over after that is fixed without
+    rendering again: by lowering the quality and then by halving the pixmap.
+    Lossy formats end up at the highest quality that fits.
+    """
+    _, header, prior = IMAGE_FORMATS[image_format]
+    page_pixels = page.rect.width * page.rect.height  # one pixel per point at zoom 1
+
+    def zoom_for(bytes_per_pixel: float) -> float:
+        pixels = max(max_bytes * FILL_TARGET - header, 1) / bytes_per_pixel
+        return min(max_zoom, math.sqrt(pixels / page_pixels))
+
+    zoom = zoom_for(_bytes_per_pixel.get(image_format, prior))
+    best = None
+    for _ in range(2):
+        pix = page.get_pixmap(matrix=(zoom, 0, 0, zoom, 0, 0))
+        data = encode_pixmap(pix, image_format)
+        measured = max(len(data) - header, 1) / max(pix.width * pix.height, 1)
+        _bytes_per_pixel[image_format] = measured
+        if len(data) <= max_bytes and (best is None or len(data) > len(best[1])):
+            best = (pix, data)
+        next_zoom = zoom_for(measured)
+        if len(data) <= max_bytes and (len(data) >= max_bytes * UNDERSHOOT or next_zoom <= zoom):
+            break
+        zoom = next_zoom
+    if best is not None:
+        pix, data = best
+
+    while True:
+        fitted = data if image_format == 'png' else _best_quality(pix, image_format, max_bytes)
+        if fitted is not None and len(fitted) <= max_bytes:
+            return fitted
+        if pix.width < 2 or pix.height < 2:
+            raise LargeFileError(base64_size(len(data)))
+        pix.shrink(1)
+        data = encode_pixmap(pix, image_format)
+
+
+def render_image(page: "fitz.Page", image_format: str = 'png', max_bytes: int = None) -> bytes:
+    """``page`` at zoom 1, as slides have always been uploaded, or sized by ``fit_image`` to ``max_bytes``."""
+    if max_bytes is None:
+        return encode_pixmap(page.get_pixmap(), image_format, MAX_QUALITY)
+    return fit_image(page, max_bytes, image_format)
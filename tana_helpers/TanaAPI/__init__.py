@@ -1,2 +1,53 @@
-from ._base import Tana
+import importlib
+
+from ._base import Tana, TanaBuilder, client_counters, get_tana_endpoint
+from ._builder import TreeBuilder
+from ._checkpoint import (Checkpoint, CheckpointStore, DynamoDBCheckpointStore, FileCheckpointStore, ResumableIngest,
+                          SQLiteCheckpointStore, get_default_checkpoint_store, plan_slices,
+                          set_default_checkpoint_store)
+from ._idempotency import (IdempotencyCache, IdempotencyStore, SQLiteIdempotencyStore, get_default_idempotency_cache,
+                           set_default_idempotency_cache, submission_key)
+from ._outline import OutlineBuilder, OutlineGrammar, build_outline
+from ._rate_limit import RateLimiter, RateLimitMetrics, TokenBucket, get_default_rate_limiter, set_default_rate_limiter
+from ._resolver import (NodeResolver, ResolverStore, SQLiteResolverStore, get_default_resolver,
+                        set_default_resolver)
+from ._result import SubmitResult
+from ._serialize import encode_nodes, encode_request, to_wire
+from ._transport import Transport, PooledTransport, TransportStats, get_default_transport, set_default_transport
 from ._supertag_models import *
+
+# Pulled in on first use: they drag in aiohttp, sqlite3 or http.server, which the
+# Lambda handlers mostly never touch and would otherwise pay for on every cold start.
+_LAZY_ATTRS = {
+    'AsyncTana': '._async',
+    'AsyncTransport': '._async',
+    'PendingNodeId': '._async',
+    'SubmitCoalescer': '._coalesce',
+    'AsyncEmulatorTransport': '._emulator',
+    'EmulatorConfig': '._emulator',
+    'EmulatorTransport': '._emulator',
+    'TanaEmulator': '._emulator',
+    'OutboxBackend': '._outbox',
+    'OutboxDrainer': '._outbox',
+    'OutboxEntry': '._outbox',
+    'SQLiteOutbox': '._outbox',
+    'SQSOutbox': '._outbox',
+    'drain_outbox': '._outbox',
+    'enqueue': '._outbox',
+    'get_default_outbox': '._outbox',
+    'set_default_outbox': '._outbox',
+}
+
+
+def __getattr__(name: str):
+    try:
+        module_name = _LAZY_ATTRS[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
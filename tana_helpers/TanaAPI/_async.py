@@ -0,0 +1,208 @@
+import asyncio
+import threading
+import time
+from typing import Any, Optional, Union
+
+import aiohttp
+
+from ._base import TanaBuilder, get_api_headers, get_tana_endpoint
+from ._chunking import MAX_NODES_PER_REQUEST, MAX_PAYLOAD_BYTES, ChunkedSubmission, count_nodes
+from ._nodes import Node
+from ._rate_limit import RateLimiter, get_default_rate_limiter
+from ._result import SubmitResult
+from ._transport import Body, Transport, TransportStats
+
+
+class AsyncResponse:
+    def __init__(self, status_code: int, headers: dict[str, str], data: Any, request_info, history):
+        self.status_code = status_code
+        self.headers = headers
+        self.data = data
+        self._request_info = request_info
+        self._history = history
+
+    def json(self) -> Any:
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise aiohttp.ClientResponseError(self._request_info, self._history, status=self.status_code,
+                                              message=str(self.data), headers=self.headers)
+
+
+class AsyncTransport:
+    """aiohttp counterpart of ``PooledTransport``; at most ``max_concurrency`` requests are in flight."""
+    def __init__(self, max_concurrency: int = 4, connect_timeout: float = 5.0, read_timeout: float = 60.0):
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.stats = TransportStats()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._stats_lock = threading.Lock()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def post(self, url: str, headers: dict[str, str], body: Body) -> AsyncResponse:
+        data = Transport.encode_body(body)
+        async with self._semaphore:
+            async with self._get_session().post(url, headers=headers, data=data) as resp:
+                payload = await resp.json(content_type=None) if resp.status < 400 else await resp.text()
+                result = AsyncResponse(resp.status, dict(resp.headers), payload, resp.request_info, resp.history)
+        with self._stats_lock:
+            self.stats.requests += 1
+            self.stats.bytes_sent += len(data)
+            self.stats.bytes_uncompressed += len(data)
+        return result
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> "AsyncTransport":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class PendingNodeId:
+    """The nodeId an ``AsyncTana`` submission will create at ``path`` (indices into the response tree)."""
+    def __init__(self, source: "AsyncTana", path: tuple[int, ...]):
+        self.source = source
+        self.path = path
+
+    async def resolve(self) -> str:
+        if self.source._task is None:
+            raise ValueError('The submission this nodeId depends on has not been started')
+        result = await asyncio.shield(self.source._task)
+        return result.node_id(*self.path)
+
+
+class AsyncTana(TanaBuilder):
+    """asyncio version of ``Tana``.
+
+    ``target_id`` may be a ``PendingNodeId`` from another ``AsyncTana``; the
+    request then waits for that submission, so parents are always created
+    before their children while unrelated targets go out concurrently.
+    """
+    def __init__(self, *children: Node, target_id: Union[str, PendingNodeId] = None,
+                 transport: AsyncTransport = None, rate_limiter: RateLimiter = None,
+                 max_nodes: int = MAX_NODES_PER_REQUEST, max_bytes: int = MAX_PAYLOAD_BYTES,
+                 endpoint: str = None):
+        super().__init__(*children, target_id=target_id, max_nodes=max_nodes, max_bytes=max_bytes,
+                         endpoint=endpoint)
+        self.transport = transport
+        self.rate_limiter = rate_limiter or get_default_rate_limiter()
+        self._task: Optional[asyncio.Future] = None
+
+    def node_id_at(self, *path: int) -> PendingNodeId:
+        return PendingNodeId(self, path)
+
+    async def _resolve_target(self) -> Optional[str]:
+        if isinstance(self.target_id, PendingNodeId):
+            return await self.target_id.resolve()
+        return self.target_id
+
+    def model_dump(self):
+        if isinstance(self.target_id, PendingNodeId):
+            data = super().model_dump()
+            del data['targetNodeId']
+            return data
+        return super().model_dump()
+
+    async def submit(self, clear_nodes=True, compact=False) -> Union[Node, SubmitResult]:
+        """Same as ``Tana.submit``: the validated ``Node`` tree, or a ``SubmitResult`` with ``compact``."""
+        self._task = asyncio.ensure_future(self._submit(clear_nodes))
+        result = await self._task
+        return result if compact else result.node
+
+    async def _submit(self, clear_nodes: bool) -> SubmitResult:
+        target_id = await self._resolve_target()
+        data = self.model_dump()
+
+        if self.transport is None:
+            async with AsyncTransport() as transport:
+                response = await self._send_all(transport, data['nodes'], target_id)
+        else:
+            response = await self._send_all(self.transport, data['nodes'], target_id)
+
+        result = SubmitResult(response, self.children)
+        if clear_nodes:
+            self.children = []
+        return result
+
+    async def _send_all(self, transport: AsyncTransport, nodes: list, target_id: Optional[str]) -> dict:
+        submission = ChunkedSubmission(nodes, target_id, self.max_nodes, self.max_bytes)
+        while True:
+            start = time.perf_counter()
+            request = submission.next_request()
+            transport.stats.serialize_seconds += time.perf_counter() - start
+            if request is None:
+                break
+            transport.stats.nodes_sent += count_nodes(request['nodes'])
+            resp = await self._post(transport, request)
+            resp.raise_for_status()
+            submission.record_response(resp.json())
+        return submission.response
+
+    async def _post(self, transport: AsyncTransport, data) -> AsyncResponse:
+        limiter = self.rate_limiter
+        url, headers = self.endpoint or get_tana_endpoint(), get_api_headers()
+        attempt = 0
+        while True:
+            await limiter.acquire_async()
+            start = time.perf_counter()
+            resp = await transport.post(url, headers, data)
+            limiter.record_send(time.perf_counter() - start)
+            limiter.on_response(resp.status_code)
+            retry_after = resp.headers.get('Retry-After')
+            if not limiter.should_retry(resp.status_code, attempt, retry_after):
+                return resp
+            limiter.backoff(attempt, retry_after)
+            attempt += 1
+
+    async def change_name(self, new_name: str) -> Node:
+        assert self.target_id is not None
+        target_id = await self._resolve_target()
+        data = {'targetNodeId': target_id, 'setName': new_name}
+        if self.transport is None:
+            async with AsyncTransport() as transport:
+                resp = await self._post(transport, data)
+        else:
+            resp = await self._post(self.transport, data)
+        resp.raise_for_status()
+        return Node.model_validate(resp.json())
+
+    @staticmethod
+    async def gather(*clients: "AsyncTana", clear_nodes=True, max_concurrency: int = 4) -> list[SubmitResult]:
+        """Submits every client concurrently and returns their results in order.
+
+        Clients without a transport share one for the duration of the call.
+        """
+        for client in clients:
+            seen = {id(client)}
+            target = client.target_id
+            while isinstance(target, PendingNodeId):
+                if id(target.source) in seen:
+                    raise ValueError('AsyncTana submissions depend on each other in a cycle')
+                seen.add(id(target.source))
+                target = target.source.target_id
+
+        async with AsyncTransport(max_concurrency=max_concurrency) as shared:
+            for client in clients:
+                if client.transport is None:
+                    client.transport = shared
+            try:
+                # every task exists before any of them runs, so PendingNodeId.resolve always finds its source
+                for client in clients:
+                    client._task = asyncio.ensure_future(client._submit(clear_nodes))
+                return list(await asyncio.gather(*(c._task for c in clients)))
+            finally:
+                for client in clients:
+                    if client.transport is shared:
+                        client.transport = None
@@ -1,72 +1,169 @@
 import os
 import time
+from typing import TYPE_CHECKING, Optional, Union
 
-import requests
+from typing_extensions import Self
 
+from ._builder import TreeBuilder
+from ._chunking import MAX_NODES_PER_REQUEST, MAX_PAYLOAD_BYTES, ChunkedSubmission, WireNode, count_nodes
+from ._idempotency import IdempotencyCache, submission_key
 from ._nodes import Node, PlainNode
+from . import _rate_limit, _transport
+from ._rate_limit import RateLimiter, get_default_rate_limiter
+from ._result import SubmitResult
+from ._serialize import encode_request, to_wire
+from ._transport import Transport, get_default_transport
+
+if TYPE_CHECKING:
+    from ._coalesce import SubmitCoalescer
 
-TANA_API_KEY = os.environ['TanaKey']
-API_HEADERS = {'Authorization': f'Bearer {TANA_API_KEY}', 'Content-Type': 'application/json'}
 TANA_ENDPOINT = 'https://europe-west1-tagr-prod.cloudfunctions.net/addToNodeV2'
+API_KEY_ENV = 'TanaKey'
+ENDPOINT_ENV = 'TanaEndpoint'
 
-LAST_CALL_TIME = 0
 
 def get_tana_endpoint() -> str:
-    global LAST_CALL_TIME
-    if LAST_CALL_TIME + 2 > time.time():
-        time.sleep(2)
+    return os.environ.get(ENDPOINT_ENV) or TANA_ENDPOINT
+
 
-    LAST_CALL_TIME = time.time()
-    return TANA_ENDPOINT
+def get_api_headers() -> dict[str, str]:
+    # read per call, so importing TanaAPI never needs credentials
+    try:
+        api_key = os.environ[API_KEY_ENV]
+    except KeyError:
+        raise RuntimeError(f'Set the {API_KEY_ENV} environment variable to a Tana API token') from None
+    return {'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'}
 
 
-class Tana:
-    def __init__(self, *children: Node, target_id: str = None):
+class TanaBuilder:
+    """Collects child nodes and a target; ``Tana`` and ``AsyncTana`` add the sending."""
+    def __init__(self, *children: Node, target_id: str = None, max_nodes: int = MAX_NODES_PER_REQUEST,
+                 max_bytes: int = MAX_PAYLOAD_BYTES, endpoint: str = None):
         self.target_id = target_id
         self.children = list(children)
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        self.endpoint = endpoint
 
-    def set_target_id(self, target_id: str) -> "Tana":
+    def set_target_id(self, target_id: str) -> Self:
         self.target_id = target_id
         return self
 
-    def target_inbox(self) -> "Tana":
+    def target_inbox(self) -> Self:
         return self.set_target_id('INBOX')
 
-    def target_schema(self) -> "Tana":
+    def target_schema(self) -> Self:
         return self.set_target_id('SCHEMA')
 
-    def add_children(self, *new_children: Node) -> "Tana":
+    def add_children(self, *new_children: Union[Node, WireNode, TreeBuilder]) -> Self:
         self.children += list(new_children)
         return self
 
-    def add_strings(self, *new_names: str) -> "Tana":
+    def add_strings(self, *new_names: str) -> Self:
         self.children += [PlainNode(name=n) for n in new_names]
         return self
 
-    def submit(self, clear_nodes=True) -> Node:
-        data = self.model_dump()
-
-        resp = requests.post(get_tana_endpoint(), headers=API_HEADERS, json=data)
-        if resp.status_code == 429:
-            time.sleep(5)
-            resp = requests.post(get_tana_endpoint(), headers=API_HEADERS, json=data)
-
-        resp.raise_for_status()
-        response_json = resp.json()
-        response_model = Node.model_validate(response_json)
-        if clear_nodes:
-            self.children = []
-        return response_model
-
     def model_dump(self):
-        data = {'nodes': [n.model_dump(exclude_none=True) for n in self.children]}
+        # plain dicts are nodes that are already in wire format (e.g. replayed from the outbox);
+        # TreeBuilders are expanded here, at submit time
+        data = {'nodes': to_wire(self.children)}
         if self.target_id:
             data['targetNodeId'] = self.target_id
         return data
 
+
+class Tana(TanaBuilder):
+    def __init__(self, *children: Node, target_id: str = None, transport: Transport = None,
+                 rate_limiter: RateLimiter = None, max_nodes: int = MAX_NODES_PER_REQUEST,
+                 max_bytes: int = MAX_PAYLOAD_BYTES, coalescer: "SubmitCoalescer" = None,
+                 endpoint: str = None, idempotency: IdempotencyCache = None):
+        super().__init__(*children, target_id=target_id, max_nodes=max_nodes, max_bytes=max_bytes,
+                         endpoint=endpoint)
+        self.transport = transport or get_default_transport()
+        self.rate_limiter = rate_limiter or get_default_rate_limiter()
+        self.coalescer = coalescer
+        self.idempotency = idempotency
+
+    def submit(self, clear_nodes=True, compact=False) -> Union[Node, SubmitResult]:
+        """Creates the children under the target, split into as many requests as the API limits need.
+
+        Oversized trees are sent parent-first: children that didn't fit are
+        re-targeted at the nodeIds returned for their parents, and the responses
+        are merged into one tree shaped like the submitted one. With an
+        ``idempotency`` cache, repeating a recent submission returns the cached
+        response instead of creating the nodes again.
+
+        Returns the validated ``Node`` tree, or with ``compact`` a
+        ``SubmitResult`` that skips validating the response and looks up the
+        created nodeIds on demand.
+        """
+        stats = self.transport.stats
+        encoded = None
+        start = time.perf_counter()
+        if self.idempotency is None and self.coalescer is None:
+            # the common case fits in one request, so write the body straight from the nodes
+            encoded = encode_request(self.children, self.target_id, self.max_nodes, self.max_bytes)
+
+        if encoded is not None:
+            stats.serialize_seconds += time.perf_counter() - start
+            stats.nodes_sent += encoded[1]
+            resp = self._post(encoded[0])
+            resp.raise_for_status()
+            response = resp.json()
+        else:
+            data = self.model_dump()
+            stats.serialize_seconds += time.perf_counter() - start
+            key = submission_key(self.target_id, data['nodes']) if self.idempotency is not None else None
+            response = self.idempotency.get(key) if key is not None else None
+            if response is None:
+                if self.coalescer is not None:
+                    response = self.coalescer.submit(self, self.target_id, data['nodes'])
+                else:
+                    response = self.send(data['nodes'], self.target_id)
+                if key is not None:
+                    self.idempotency.put(key, response)
+
+        result = SubmitResult(response, self.children)
+        if clear_nodes:
+            self.children = []
+        return result if compact else result.node
+
+    def send(self, nodes: list[WireNode], target_id: Optional[str] = None) -> WireNode:
+        """Sends already-serialized nodes and returns the merged response JSON."""
+        submission = ChunkedSubmission(nodes, target_id, self.max_nodes, self.max_bytes)
+        stats = self.transport.stats
+        while True:
+            start = time.perf_counter()
+            request = submission.next_request()
+            stats.serialize_seconds += time.perf_counter() - start
+            if request is None:
+                break
+            stats.nodes_sent += count_nodes(request['nodes'])
+            resp = self._post(request)
+            resp.raise_for_status()
+            submission.record_response(resp.json())
+        return submission.response
+
+    def _post(self, data):
+        limiter = self.rate_limiter
+        url, headers = self.endpoint or get_tana_endpoint(), get_api_headers()
+        attempt = 0
+        while True:
+            limiter.acquire()
+            start = time.perf_counter()
+            resp = self.transport.post(url, headers, data)
+            limiter.record_send(time.perf_counter() - start)
+            limiter.on_response(resp.status_code)
+            retry_after = resp.headers.get('Retry-After')
+            if not limiter.should_retry(resp.status_code, attempt, retry_after):
+                return resp
+            # backoff blocks the shared bucket, so the next acquire() does the waiting
+            limiter.backoff(attempt, retry_after)
+            attempt += 1
+
     def change_name(self, new_name: str) -> Node:
         assert self.target_id is not None
-        resp = requests.post(get_tana_endpoint(), headers=API_HEADERS, json={
+        resp = self._post({
             'targetNodeId': self.target_id,
             'setName': new_name
         })
@@ -74,6 +171,24 @@ class Tana:
         return Node.model_validate(resp.json())
 
 
+def client_counters() -> dict[str, float]:
+    """Running totals of the default transport and rate limiter, for diffing around a piece of work.
+
+    Doesn't create either default, so it's free when nothing has been sent.
+    """
+    counters = {}
+    transport, limiter = _transport._DEFAULT_TRANSPORT, _rate_limit._DEFAULT_RATE_LIMITER
+    if transport is not None:
+        stats = transport.stats
+        counters.update(requests=stats.requests, bytes_sent=stats.bytes_sent, nodes_sent=stats.nodes_sent,
+                        serialize_seconds=stats.serialize_seconds)
+    if limiter is not None:
+        metrics = limiter.metrics
+        counters.update(wait_seconds=metrics.wait_seconds, send_seconds=metrics.send_seconds,
+                        retries=metrics.retries, throttled=metrics.throttled)
+    return counters
+
+
 if __name__ == '__main__':
     tapi = Tana().target_inbox().add_children(PlainNode(name='hello again', description='huh?', children=['still good?']))
     print(tapi.submit())
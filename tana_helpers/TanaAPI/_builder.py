@@ -0,0 +1,242 @@
+from array import array
+from typing import Any, Iterable, Optional, Union
+
+from ._chunking import WireNode
+from ._nodes import (CheckboxNode, DateNode, DummyNode, FieldNode, Node, NodeType, PlainNode, ReferenceNode, SuperTag,
+                     URLNode)
+
+_PLAIN, _DUMMY, _CHECKBOX, _DATE, _URL, _FIELD, _REFERENCE, _MODEL = range(8)
+
+
+class TreeBuilder:
+    """Builds a node tree in flat arrays instead of one pydantic model per node.
+
+    Every ``add``-style method returns the new node's index, which is what
+    later nodes pass as ``parent`` (None puts a node at the top level).
+    Children keep the order they were added in. Nothing is validated or
+    turned into ``Node`` models until ``to_nodes`` or ``to_wire`` is called,
+    and ``Tana.add_children`` accepts the builder itself, so a tree handed to
+    ``Tana`` only becomes wire format at submit time.
+    """
+    __slots__ = ('_parents', '_kinds', '_names', '_attrs')
+
+    def __init__(self):
+        self._parents = array('l')
+        self._kinds = bytearray()
+        self._names: list[Optional[str]] = []
+        # sparse: only nodes with supertags, a description, a value, ... have an entry
+        self._attrs: dict[int, dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._kinds)
+
+    def _check_parent(self, parent: Optional[int]):
+        if parent is None:
+            return
+        if not 0 <= parent < len(self._kinds):
+            raise IndexError(f'No node {parent} to add a child to')
+        if self._kinds[parent] == _MODEL:
+            raise ValueError('Attached nodes are added as they are; give them their children before attaching')
+
+    def _add(self, kind: int, name: Optional[str], parent: Optional[int], **attrs) -> int:
+        index = len(self._kinds)
+        self._check_parent(parent)
+        self._parents.append(-1 if parent is None else parent)
+        self._kinds.append(kind)
+        self._names.append(name)
+        attrs = {k: v for k, v in attrs.items() if v}
+        if attrs:
+            self._attrs[index] = attrs
+        return index
+
+    def add(self, name: str, parent: int = None, supertags: Iterable[str] = (), description: str = None) -> int:
+        return self._add(_PLAIN, name, parent, supertags=list(supertags), description=description)
+
+    def extend(self, names: Iterable[str], parent: int = None):
+        """Adds a plain node for each of ``names``; the cheapest way to add many leaves."""
+        names = list(names)
+        self._check_parent(parent)
+        self._parents.extend([-1 if parent is None else parent] * len(names))
+        self._kinds.extend(bytes([_PLAIN]) * len(names))
+        self._names.extend(names)
+
+    def dummy(self, parent: int = None) -> int:
+        return self._add(_DUMMY, '', parent)
+
+    def checkbox(self, name: str, checked: bool = False, parent: int = None) -> int:
+        return self._add(_CHECKBOX, name, parent, value=checked)
+
+    def date(self, name: str, parent: int = None) -> int:
+        return self._add(_DATE, name, parent)
+
+    def url(self, url: str, name: str = '', parent: int = None) -> int:
+        return self._add(_URL, name, parent, url=url)
+
+    def field(self, attribute_id: str, parent: int = None) -> int:
+        return self._add(_FIELD, None, parent, attributeId=attribute_id)
+
+    def reference(self, node_id: str, parent: int = None) -> int:
+        return self._add(_REFERENCE, None, parent, nodeId=node_id)
+
+    def attach(self, node: Union[Node, str], parent: int = None) -> int:
+        """Adds an already built ``Node`` (or a plain string) as is."""
+        index = self._add(_MODEL, None, parent)
+        self._attrs[index] = {'model': node}
+        return index
+
+    def tag(self, index: int, *supertag_ids: str) -> int:
+        attrs = self._attrs.setdefault(index, {})
+        attrs['supertags'] = attrs.get('supertags', []) + list(supertag_ids)
+        return index
+
+    def root_count(self) -> int:
+        return self._parents.count(-1)
+
+    def paths(self) -> list[tuple[int, ...]]:
+        """Each node's path of child indices from the top level, in node order."""
+        paths: list[tuple[int, ...]] = []
+        child_counts: dict[int, int] = {}
+        for parent in self._parents:
+            position = child_counts.get(parent, 0)
+            child_counts[parent] = position + 1
+            paths.append((position,) if parent < 0 else paths[parent] + (position,))
+        return paths
+
+    def attached(self, index: int) -> Optional[Union[Node, str]]:
+        """The ``Node`` added with ``attach`` at ``index``, if that's what it is."""
+        return self._attrs[index]['model'] if self._kinds[index] == _MODEL else None
+
+    def _bottom_up(self, make) -> list:
+        """Calls ``make(index, children)`` from the last node to the first and returns the top-level results.
+
+        A parent always comes before its children, so every child is made before its parent.
+        """
+        roots, pending = [], {}
+        parents = self._parents
+        for index in range(len(self._kinds) - 1, -1, -1):
+            children = pending.pop(index, None)
+            if children is not None:
+                children.reverse()
+            made = make(index, children)
+            parent = parents[index]
+            (roots if parent < 0 else pending.setdefault(parent, [])).append(made)
+        roots.reverse()
+        return roots
+
+    def to_wire(self) -> list[WireNode]:
+        """The top-level nodes in wire format, the same as ``to_wire(self.to_nodes())``."""
+        kinds, names, all_attrs = self._kinds, self._names, self._attrs
+        empty = {}
+
+        def make(index: int, children: Optional[list[WireNode]]) -> WireNode:
+            kind = kinds[index]
+            attrs = all_attrs.get(index, empty)
+            if kind == _URL:
+                return {'type': 'field', 'attributeId': 'URLFieldId',
+                        'children': [{'dataType': 'url', 'name': attrs['url']}]}
+            if kind == _REFERENCE:
+                return {'dataType': 'reference', 'id': attrs['nodeId']}
+            if kind == _MODEL:
+                from ._serialize import to_wire
+                return to_wire([attrs['model']])[0]
+
+            data = {} if kind == _FIELD else {'name': names[index]}
+            if children:
+                data['children'] = children
+            if attrs:
+                if 'supertags' in attrs:
+                    data['supertags'] = [{'id': t} for t in attrs['supertags']]
+                if 'description' in attrs:
+                    data['description'] = attrs['description']
+            if kind == _CHECKBOX:
+                data['dataType'] = NodeType.boolean.value
+                data['value'] = attrs.get('value', False)
+            elif kind == _DATE:
+                data['dataType'] = NodeType.date.value
+            elif kind == _FIELD:
+                data['type'] = NodeType.field.value
+                data['attributeId'] = attrs.get('attributeId')
+            return data
+
+        return self._bottom_up(make)
+
+    def to_nodes(self) -> list[Node]:
+        """The top-level nodes as ``Node`` models."""
+        kinds, names, all_attrs = self._kinds, self._names, self._attrs
+        empty = {}
+
+        def make(index: int, children: Optional[list[Node]]) -> Node:
+            kind = kinds[index]
+            attrs = all_attrs.get(index, empty)
+            if kind == _MODEL:
+                return attrs['model']
+
+            fields = {'children': children} if children else {}
+            if 'supertags' in attrs:
+                fields['supertags'] = [SuperTag.model_construct(id=t) for t in attrs['supertags']]
+            if 'description' in attrs:
+                fields['description'] = attrs['description']
+            name = names[index]
+            if kind == _PLAIN:
+                return PlainNode.model_construct(name=name, **fields)
+            if kind == _DUMMY:
+                return DummyNode.model_construct(**fields)
+            if kind == _CHECKBOX:
+                return CheckboxNode.model_construct(name=name, value=attrs.get('value', False), **fields)
+            if kind == _DATE:
+                return DateNode.model_construct(name=name, **fields)
+            if kind == _URL:
+                return URLNode.model_construct(url=attrs['url'], name=name, **fields)
+            if kind == _FIELD:
+                return FieldNode.model_construct(attributeId=attrs.get('attributeId'), **fields)
+            return ReferenceNode.model_construct(target=PlainNode.model_construct(name='', nodeId=attrs['nodeId']),
+                                                 **fields)
+
+        return self._bottom_up(make)
+
+
+if __name__ == '__main__':
+    import sys
+    import timeit
+    import tracemalloc
+
+    from ._serialize import to_wire
+
+    def with_models(n_lines: int) -> list[Node]:
+        # the shape sembly_transcripts builds: speaker blocks of a few lines each
+        blocks = []
+        for i in range(0, n_lines, 4):
+            blocks.append(PlainNode(name=f'Speaker {i % 5}', children=[f'line {j} of the transcript'
+                                                                       for j in range(i, i + 3)]))
+            blocks.append(CheckboxNode(name=f'follow up {i}', value=bool(i % 8)))
+        return [PlainNode(name='Meeting', supertags=[SuperTag(id='tag')],
+                          children=[PlainNode(name='Transcript', children=blocks)])]
+
+    def with_builder(n_lines: int) -> TreeBuilder:
+        tree = TreeBuilder()
+        transcript = tree.add('Transcript', parent=tree.add('Meeting', supertags=['tag']))
+        for i in range(0, n_lines, 4):
+            tree.extend([f'line {j} of the transcript' for j in range(i, i + 3)],
+                        parent=tree.add(f'Speaker {i % 5}', parent=transcript))
+            tree.checkbox(f'follow up {i}', checked=bool(i % 8), parent=transcript)
+        return tree
+
+    def peak_kib(fn) -> float:
+        tracemalloc.start()
+        kept = fn()  # noqa: F841 - the result has to stay alive while it's measured
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak / 1024
+
+    for size in [int(a) for a in sys.argv[1:]] or [1_000, 10_000, 50_000]:
+        assert with_builder(size).to_wire() == to_wire(with_models(size))
+        runs = max(1, 20_000 // size)
+        print(f'{size:>7,} lines')
+        for label, models, builder in [
+            ('build', lambda: with_models(size), lambda: with_builder(size)),
+            ('build + to_wire', lambda: to_wire(with_models(size)), lambda: with_builder(size).to_wire()),
+        ]:
+            slow = min(timeit.repeat(models, number=runs, repeat=3)) / runs
+            fast = min(timeit.repeat(builder, number=runs, repeat=3)) / runs
+            print(f'  {label:16s} models {slow * 1000:8.1f} ms {peak_kib(models):9.0f} KiB   '
+                  f'TreeBuilder {fast * 1000:8.1f} ms {peak_kib(builder):9.0f} KiB   ({slow / fast:4.1f}x faster)')
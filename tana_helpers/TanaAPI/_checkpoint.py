@@ -0,0 +1,257 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from ._base import Tana
+from ._chunking import MAX_NODES_PER_REQUEST, MAX_PAYLOAD_BYTES, WireNode, _Packer
+
+CHECKPOINT_PATH_ENV = 'TanaCheckpointPath'
+CHECKPOINT_TABLE_ENV = 'TanaCheckpointTable'
+SQLITE_SUFFIXES = ('.sqlite3', '.sqlite', '.db')
+
+
+@dataclass
+class Checkpoint:
+    """How far a resumable ingestion got: ``committed`` of ``total`` items are under ``parent_id``."""
+    key: str
+    input_hash: str
+    total: int
+    parent_id: Optional[str] = None
+    committed: int = 0
+    slices: int = 0
+    updated_at: float = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.parent_id is not None and self.committed >= self.total
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Checkpoint':
+        return cls(**{k: data[k] for k in cls.__dataclass_fields__ if k in data})
+
+
+class CheckpointStore(ABC):
+    """Where checkpoints are kept between invocations; implement it to share them across containers."""
+    @abstractmethod
+    def get(self, key: str) -> Optional[Checkpoint]:
+        ...
+
+    @abstractmethod
+    def put(self, checkpoint: Checkpoint):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+
+class FileCheckpointStore(CheckpointStore):
+    """One JSON file per key, replaced atomically on every write."""
+    def __init__(self, directory: Union[Path, str]):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in key)
+        return self.directory / f'{safe}.json'
+
+    def get(self, key: str) -> Optional[Checkpoint]:
+        try:
+            with self._path(key).open(encoding='utf-8') as f:
+                return Checkpoint.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def put(self, checkpoint: Checkpoint):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(checkpoint.to_dict(), f)
+            os.replace(tmp_path, self._path(checkpoint.key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def delete(self, key: str):
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    """A local file: only shared between invocations that see the same file (e.g. on a mounted EFS volume)."""
+    def __init__(self, path: Union[Path, str]):
+        import sqlite3
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS checkpoints (
+                key TEXT PRIMARY KEY,
+                checkpoint TEXT NOT NULL
+            )''')
+
+    def get(self, key: str) -> Optional[Checkpoint]:
+        with self._lock:
+            row = self._conn.execute('SELECT checkpoint FROM checkpoints WHERE key = ?', (key,)).fetchone()
+        return Checkpoint.from_dict(json.loads(row[0])) if row else None
+
+    def put(self, checkpoint: Checkpoint):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO checkpoints (key, checkpoint) VALUES (?, ?)',
+                               (checkpoint.key, json.dumps(checkpoint.to_dict())))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM checkpoints WHERE key = ?', (key,))
+
+
+class DynamoDBCheckpointStore(CheckpointStore):
+    """A DynamoDB table keyed on a ``key`` string attribute, shared by every container; reads are consistent."""
+    def __init__(self, table_name: str, client=None):
+        if client is None:
+            import boto3
+            client = boto3.client('dynamodb')
+        self.table_name = table_name
+        self.client = client
+
+    def get(self, key: str) -> Optional[Checkpoint]:
+        item = self.client.get_item(TableName=self.table_name, Key={'key': {'S': key}}, ConsistentRead=True).get('Item')
+        return Checkpoint.from_dict(json.loads(item['checkpoint']['S'])) if item else None
+
+    def put(self, checkpoint: Checkpoint):
+        self.client.put_item(TableName=self.table_name, Item={'key': {'S': checkpoint.key},
+                                                              'checkpoint': {'S': json.dumps(checkpoint.to_dict())}})
+
+    def delete(self, key: str):
+        self.client.delete_item(TableName=self.table_name, Key={'key': {'S': key}})
+
+
+def plan_slices(nodes: list[WireNode], target_id: Optional[str], max_nodes: int = MAX_NODES_PER_REQUEST,
+                max_bytes: int = MAX_PAYLOAD_BYTES) -> list[int]:
+    """End index of each run of whole ``nodes`` that fits in one request.
+
+    A node too big for a request on its own gets a slice to itself (and is
+    split across requests when it's sent).
+    """
+    packer = _Packer(max_nodes, max_bytes)
+    ends, start = [], 0
+    while start < len(nodes):
+        batch = packer.next_batch(nodes[start:], target_id)[0]
+        if batch[-1] is not nodes[start + len(batch) - 1] and len(batch) > 1:
+            # the last node didn't fit whole, so it starts the next slice
+            start += len(batch) - 1
+        else:
+            start += len(batch)
+        ends.append(start)
+    return ends
+
+
+class ResumableIngest:
+    """Adds a long list of children under one new parent node across as many invocations as it takes.
+
+    The children go in slices of whole nodes that each fit in one request,
+    and ``store`` records the parent's nodeId and how many children are in
+    after every slice. Running again with the same ``key`` and ``input_hash``
+    picks up after the last committed slice; a different ``input_hash`` under
+    the same key starts over. At most the one slice in flight when an
+    invocation dies is sent twice.
+    """
+    def __init__(self, key: str, input_hash: str, nodes: list[WireNode], store: CheckpointStore = None,
+                 tana: Tana = None):
+        self.key = key
+        self.input_hash = input_hash
+        self.nodes = nodes
+        self.store = store or get_default_checkpoint_store()
+        self.tana = tana or Tana()
+
+    def checkpoint(self, resume_from: Union[Checkpoint, dict] = None) -> Checkpoint:
+        """The furthest known progress: the stored checkpoint, or ``resume_from`` (e.g. one handed to a follow-up)."""
+        candidates = [self.store.get(self.key), resume_from]
+        best = None
+        for candidate in candidates:
+            if isinstance(candidate, dict):
+                candidate = Checkpoint.from_dict(candidate)
+            if candidate is None or candidate.key != self.key or candidate.input_hash != self.input_hash:
+                continue
+            if candidate.total != len(self.nodes) or candidate.parent_id is None:
+                continue
+            if best is None or candidate.committed > best.committed:
+                best = candidate
+        return best or Checkpoint(self.key, self.input_hash, len(self.nodes))
+
+    def _save(self, checkpoint: Checkpoint):
+        checkpoint.updated_at = time.time()
+        self.store.put(checkpoint)
+
+    def run(self, create_parent: Callable[[], str], time_budget: float = None,
+            resume_from: Union[Checkpoint, dict] = None) -> Checkpoint:
+        """Sends slices until all are in or the next one might not finish within ``time_budget`` seconds.
+
+        ``create_parent`` is only called on a fresh start and returns the
+        nodeId the children go under. Check ``done`` on the result.
+        """
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        checkpoint = self.checkpoint(resume_from)
+        if checkpoint.done:
+            return checkpoint
+        if checkpoint.parent_id is None:
+            checkpoint.parent_id = create_parent()
+            self._save(checkpoint)
+
+        slowest = 0.0
+        for end in plan_slices(self.nodes, checkpoint.parent_id, self.tana.max_nodes, self.tana.max_bytes):
+            if end <= checkpoint.committed:
+                continue
+            started = time.monotonic()
+            if deadline is not None and started + slowest > deadline:
+                break
+            self.tana.send(self.nodes[checkpoint.committed:end], checkpoint.parent_id)
+            checkpoint.committed = end
+            checkpoint.slices += 1
+            self._save(checkpoint)
+            slowest = max(slowest, time.monotonic() - started)
+        return checkpoint
+
+
+_DEFAULT_CHECKPOINT_STORE: Optional[CheckpointStore] = None
+
+
+def get_default_checkpoint_store() -> CheckpointStore:
+    """The DynamoDB table ``TanaCheckpointTable``, or what ``TanaCheckpointPath`` names: a SQLite file, or a directory.
+
+    There's no temp-dir fallback: a follow-up invocation can land in another
+    container, and would start the transcript over.
+    """
+    global _DEFAULT_CHECKPOINT_STORE
+    if _DEFAULT_CHECKPOINT_STORE is None:
+        if os.environ.get(CHECKPOINT_TABLE_ENV):
+            _DEFAULT_CHECKPOINT_STORE = DynamoDBCheckpointStore(os.environ[CHECKPOINT_TABLE_ENV])
+        elif os.environ.get(CHECKPOINT_PATH_ENV):
+            path = Path(os.environ[CHECKPOINT_PATH_ENV])
+            if path.suffix in SQLITE_SUFFIXES:
+                _DEFAULT_CHECKPOINT_STORE = SQLiteCheckpointStore(path)
+            else:
+                _DEFAULT_CHECKPOINT_STORE = FileCheckpointStore(path)
+        else:
+            raise RuntimeError(f'No checkpoint store configured: set {CHECKPOINT_TABLE_ENV} or {CHECKPOINT_PATH_ENV}, '
+                               f'or call set_default_checkpoint_store()')
+    return _DEFAULT_CHECKPOINT_STORE
+
+
+def set_default_checkpoint_store(store: CheckpointStore) -> CheckpointStore:
+    global _DEFAULT_CHECKPOINT_STORE
+    _DEFAULT_CHECKPOINT_STORE = store
+    return store
@@ -0,0 +1,210 @@
+import json
+from collections import deque
+from typing import Any, Optional
+
+MAX_NODES_PER_REQUEST = 100
+MAX_PAYLOAD_BYTES = 5000
+
+WireNode = dict[str, Any]
+Path = tuple[int, ...]
+
+_CHILDREN_OVERHEAD = len(',"children":[]')
+_EMPTY_REQUEST = len('{"nodes":[]}')
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+
+def request_overhead(target_id: Optional[str]) -> int:
+    data = {'nodes': []}
+    if target_id:
+        data['targetNodeId'] = target_id
+    return len(_dumps(data).encode('utf-8'))
+
+
+def count_nodes(nodes: list[WireNode]) -> int:
+    count = 0
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.get('children') or [])
+    return count
+
+
+class _Packer:
+    """Fits serialized node trees into requests of at most ``max_nodes`` nodes and ``max_bytes`` bytes.
+
+    Subtrees that don't fit are truncated; the children left out are reported
+    as ``(path, children)`` so they can be sent once the node at ``path`` has an id.
+
+    A leaf too big for any request on its own, like a file, would only cost an
+    extra request if it were split from its parent, so it's counted as no bytes
+    and stays in its parent's request. A request carries the oversized leaves
+    of at most one top-level node.
+    """
+    def __init__(self, max_nodes: int, max_bytes: int):
+        self.max_nodes = max_nodes
+        self.max_bytes = max_bytes
+        # id(node) -> (node count, byte size, own byte size, oversized leaves)
+        self._sizes: dict[int, tuple[int, int, int, int]] = {}
+
+    def _measure(self, root: WireNode) -> tuple[int, int]:
+        """(node count, byte size) of ``root``, oversized leaves aside; also caches every subtree below it."""
+        if id(root) in self._sizes:
+            return self._sizes[id(root)][:2]
+
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if id(node) in self._sizes:
+                continue
+            children = node.get('children') or []
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((c, False) for c in children if isinstance(c, dict))
+                continue
+
+            own = len(_dumps({k: v for k, v in node.items() if k != 'children'}).encode('utf-8'))
+            count, size, oversized = 1, own, 0
+            if 'children' in node:
+                child_sizes = [self._sizes[id(c)] for c in children]
+                count += sum(c[0] for c in child_sizes)
+                size += _CHILDREN_OVERHEAD + sum(c[1] for c in child_sizes) + max(len(children) - 1, 0)
+                oversized = sum(c[3] for c in child_sizes)
+            elif own + _EMPTY_REQUEST > self.max_bytes:
+                size, oversized = 0, 1
+            self._sizes[id(node)] = (count, size, own, oversized)
+        return self._sizes[id(root)][:2]
+
+    def _take(self, node: WireNode, nodes_left: int, bytes_left: int, path: Path,
+              deferred: list[tuple[Path, list[WireNode]]], force: bool = False):
+        count, size = self._measure(node)
+        if count <= nodes_left and size <= bytes_left:
+            return node, count, size
+
+        own = self._sizes[id(node)][2]
+        children = node.get('children') or []
+        if not force and (nodes_left < 1 or own + _CHILDREN_OVERHEAD > bytes_left):
+            return None
+
+        head = {k: v for k, v in node.items() if k != 'children'}
+        nodes_left -= 1
+        bytes_left -= own + _CHILDREN_OVERHEAD
+        kept = []
+        kept_count, kept_size = 0, 0
+        remaining = []
+        for i, child in enumerate(children):
+            sep = 1 if kept else 0
+            taken = self._take(child, nodes_left, bytes_left - sep, path + (len(kept),), deferred)
+            if taken is None:
+                remaining = children[i:]
+                break
+            child_node, child_count, child_size = taken
+            kept.append(child_node)
+            kept_count += child_count
+            kept_size += child_size + sep
+            nodes_left -= child_count
+            bytes_left -= child_size + sep
+            if child_node is not child:
+                remaining = children[i + 1:]
+                break
+
+        if kept or ('children' in node and not remaining):
+            head['children'] = kept
+            size = own + _CHILDREN_OVERHEAD + kept_size
+        else:
+            size = own
+        if remaining:
+            deferred.append((path, remaining))
+        return head, 1 + kept_count, size
+
+    def next_batch(self, nodes: list[WireNode], target_id: Optional[str]):
+        """Returns ``(batch, deferred, rest)`` where ``rest`` still goes to ``target_id``."""
+        nodes_left = self.max_nodes
+        bytes_left = self.max_bytes - request_overhead(target_id)
+        batch: list[WireNode] = []
+        deferred: list[tuple[Path, list[WireNode]]] = []
+        oversized = False
+        for i, node in enumerate(nodes):
+            sep = 1 if batch else 0
+            self._measure(node)
+            if self._sizes[id(node)][3]:
+                if oversized:
+                    return batch, deferred, nodes[i:]
+                oversized = True
+            # a node that can't fit even on its own is sent alone and left to the API to judge
+            taken = self._take(node, nodes_left, bytes_left - sep, (len(batch),), deferred, force=not batch)
+            if taken is None:
+                return batch, deferred, nodes[i:]
+            cur_node, cur_count, cur_size = taken
+            batch.append(cur_node)
+            nodes_left -= cur_count
+            bytes_left -= cur_size + sep
+            if cur_node is not node:
+                return batch, deferred, nodes[i + 1:]
+        return batch, deferred, []
+
+
+def _node_at(created: list[WireNode], path: Path) -> WireNode:
+    node = {'children': created}
+    for index in path:
+        try:
+            node = node['children'][index]
+        except (KeyError, IndexError, TypeError):
+            raise ValueError(f'Tana response does not contain a node at {path}') from None
+    if not node.get('nodeId'):
+        raise ValueError(f'Tana response node at {path} has no nodeId')
+    return node
+
+
+class ChunkedSubmission:
+    """Drives a node tree through as many requests as it needs.
+
+    Call ``next_request`` for the next payload and hand its JSON response to
+    ``record_response``; children that didn't fit are re-targeted at the
+    nodeIds returned for their parents. ``response`` is the merged tree, shaped
+    as if everything had gone out in one request.
+    """
+    def __init__(self, nodes: list[WireNode], target_id: Optional[str] = None,
+                 max_nodes: int = MAX_NODES_PER_REQUEST, max_bytes: int = MAX_PAYLOAD_BYTES):
+        self.response: WireNode = {}
+        self.requests_sent = 0
+        self._packer = _Packer(max_nodes, max_bytes)
+        self._jobs = deque([(target_id, nodes, self.response)])
+        self._pending = None
+
+    def next_request(self) -> Optional[dict[str, Any]]:
+        assert self._pending is None, 'record_response() must be called for the previous request'
+        while self._jobs:
+            target_id, nodes, anchor = self._jobs[0]
+            if not nodes and self.requests_sent:
+                self._jobs.popleft()
+                continue
+
+            batch, deferred, rest = self._packer.next_batch(nodes, target_id)
+            self._jobs[0] = (target_id, rest, anchor)
+            self._pending = (anchor, deferred)
+            data = {'nodes': batch}
+            if target_id:
+                data['targetNodeId'] = target_id
+            return data
+        return None
+
+    def record_response(self, response_json: WireNode):
+        anchor, deferred = self._pending
+        self._pending = None
+        self.requests_sent += 1
+
+        created = response_json.get('children') or []
+        if anchor is self.response and not anchor:
+            # the first response for the original target keeps whatever else the API returned
+            anchor.update(response_json)
+            anchor['children'] = list(created)
+        else:
+            anchor.setdefault('children', []).extend(created)
+
+        for path, remaining in deferred:
+            parent = _node_at(created, path)
+            self._jobs.append((parent['nodeId'], remaining, parent))
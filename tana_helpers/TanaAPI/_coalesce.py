@@ -0,0 +1,83 @@
+import threading
+import time
+from typing import Optional
+
+from ._base import Tana
+from ._chunking import MAX_NODES_PER_REQUEST, WireNode, count_nodes
+
+
+class _Batch:
+    def __init__(self, opened_at: float):
+        self.opened_at = opened_at
+        self.nodes: list[WireNode] = []
+        self.node_count = 0
+        self.closed = False
+        self.done = threading.Event()
+        self.response: Optional[WireNode] = None
+        self.error: Optional[Exception] = None
+
+
+class SubmitCoalescer:
+    """Merges submissions to the same target that arrive within ``window`` seconds into one request.
+
+    The first caller for a target waits out the window (or until the batch
+    holds ``max_nodes`` nodes), sends everything collected so far with one
+    ``Tana.send`` and hands every caller back only the nodes it submitted.
+    Callers block until their batch has been sent; errors are re-raised in each.
+    The batch goes out through the first caller's client, so share one
+    coalescer only between clients with the same transport and endpoint.
+
+    It only sees callers in this process: it helps batch jobs that submit from
+    many threads, not Lambda invocations, which each run in their own container.
+    """
+    def __init__(self, window: float = 0.5, max_nodes: int = MAX_NODES_PER_REQUEST):
+        self.window = window
+        self.max_nodes = max_nodes
+        self._batches: dict[Optional[str], _Batch] = {}
+        self._cond = threading.Condition()
+
+    def submit(self, tana: Tana, target_id: Optional[str], nodes: list[WireNode]) -> WireNode:
+        size = count_nodes(nodes)
+        with self._cond:
+            batch = self._batches.get(target_id)
+            if batch is not None and batch.node_count + size > self.max_nodes:
+                self._close(target_id, batch)
+                batch = None
+
+            leader = batch is None
+            if leader:
+                batch = self._batches[target_id] = _Batch(time.monotonic())
+            start = len(batch.nodes)
+            batch.nodes.extend(nodes)
+            batch.node_count += size
+            if batch.node_count >= self.max_nodes:
+                self._close(target_id, batch)
+
+            if leader:
+                deadline = batch.opened_at + self.window
+                while not batch.closed and (remaining := deadline - time.monotonic()) > 0:
+                    self._cond.wait(remaining)
+                self._close(target_id, batch)
+
+        if leader:
+            try:
+                batch.response = tana.send(batch.nodes, target_id)
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        if batch.response is None:
+            raise RuntimeError(f'Submission to {target_id} was interrupted before it was sent')
+        created = batch.response.get('children') or []
+        return {'children': created[start:start + len(nodes)]}
+
+    def _close(self, target_id: Optional[str], batch: _Batch):
+        batch.closed = True
+        if self._batches.get(target_id) is batch:
+            del self._batches[target_id]
+        self._cond.notify_all()
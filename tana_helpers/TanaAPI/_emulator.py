@@ -0,0 +1,228 @@
+import argparse
+import gzip
+import itertools
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from ._chunking import MAX_NODES_PER_REQUEST, MAX_PAYLOAD_BYTES, WireNode, count_nodes
+from ._transport import Body, Transport
+
+ROOT_TARGETS = ('INBOX', 'SCHEMA', 'LIBRARY')
+
+
+@dataclass
+class EmulatorConfig:
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    rate_429: float = 0.0
+    retry_after: float = 1.0
+    error_rate: float = 0.0
+    max_nodes: Optional[int] = MAX_NODES_PER_REQUEST
+    max_bytes: Optional[int] = MAX_PAYLOAD_BYTES
+    seed: Optional[int] = None
+
+
+class TanaEmulator:
+    """In-memory stand-in for the ``addToNodeV2`` endpoint.
+
+    Accepts ``targetNodeId`` + ``nodes`` or ``targetNodeId`` + ``setName``,
+    assigns nodeIds, keeps the created nodes in ``graph`` and answers with the
+    created tree. Latency, 429s, 500s and the payload limits come from ``config``.
+    Use ``transport()`` (``async_transport()`` for ``AsyncTana``) to call it
+    in-process, or ``start()`` to serve it over HTTP.
+    """
+    def __init__(self, config: EmulatorConfig = None, **config_kwargs):
+        self.config = config or EmulatorConfig(**config_kwargs)
+        self.graph: dict[str, WireNode] = {t: {'nodeId': t, 'name': t, 'children': []} for t in ROOT_TARGETS}
+        self.requests: int = 0
+        self._ids = itertools.count(1)
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def handle(self, body: bytes, headers: dict[str, str]) -> tuple[int, dict[str, str], bytes]:
+        cfg = self.config
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            delay = cfg.latency + self._random.uniform(0, cfg.latency_jitter)
+        if delay:
+            time.sleep(delay)
+
+        headers = CaseInsensitiveDict(headers)
+        if not headers.get('Authorization', '').startswith('Bearer '):
+            return self._error(401, 'Missing bearer token')
+        if roll < cfg.rate_429:
+            return self._error(429, 'Too many requests', {'Retry-After': f'{cfg.retry_after:g}'})
+        if roll < cfg.rate_429 + cfg.error_rate:
+            return self._error(500, 'Injected failure')
+
+        if headers.get('Content-Encoding') == 'gzip':
+            try:
+                body = gzip.decompress(body)
+            except OSError:
+                return self._error(400, 'Body is not valid gzip')
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return self._error(400, 'Body is not JSON')
+        # the limit is on the JSON itself, however it was sent, and file data doesn't count towards it
+        if cfg.max_bytes is not None and (size := len(body) - _file_bytes(data.get('nodes'))) > cfg.max_bytes:
+            return self._error(400, f'Payload is {size} bytes, limit is {cfg.max_bytes}')
+
+        target_id = data.get('targetNodeId') or 'INBOX'
+        with self._lock:
+            target = self.graph.get(target_id)
+            if target is None:
+                return self._error(400, f'Unknown target node {target_id}')
+            if 'setName' in data:
+                target['name'] = data['setName']
+                return self._json(200, {'nodeId': target_id, 'name': target['name']})
+
+            nodes = data.get('nodes')
+            if not isinstance(nodes, list):
+                return self._error(400, 'nodes must be a list')
+            if cfg.max_nodes is not None and (n := count_nodes(nodes)) > cfg.max_nodes:
+                return self._error(400, f'Request creates {n} nodes, limit is {cfg.max_nodes}')
+            created = [self._create(n, target) for n in nodes]
+        return self._json(200, {'children': created})
+
+    def _create(self, node: WireNode, parent: WireNode) -> WireNode:
+        """Stores ``node`` (iteratively, so deep trees are fine) and returns its copy with nodeIds."""
+        root = None
+        stack = [(node, parent)]
+        while stack:
+            cur, cur_parent = stack.pop()
+            stored = {k: v for k, v in cur.items() if k != 'children'}
+            stored['nodeId'] = f'emu{next(self._ids)}'
+            stored['children'] = []
+            self.graph[stored['nodeId']] = stored
+            cur_parent.setdefault('children', []).append(stored)
+            root = root or stored
+            stack.extend((c, stored) for c in reversed(cur.get('children') or []))
+        return _copy_tree(root)
+
+    @staticmethod
+    def _json(status: int, data: Any, extra_headers: dict[str, str] = None) -> tuple[int, dict[str, str], bytes]:
+        headers = {'Content-Type': 'application/json', **(extra_headers or {})}
+        return status, headers, json.dumps(data).encode('utf-8')
+
+    def _error(self, status: int, message: str, extra_headers: dict[str, str] = None):
+        return self._json(status, {'error': message}, extra_headers)
+
+    def transport(self) -> "EmulatorTransport":
+        return EmulatorTransport(self)
+
+    def async_transport(self) -> "AsyncEmulatorTransport":
+        return AsyncEmulatorTransport(self)
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Serves the emulator on a background thread and returns its URL."""
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, headers, out = emulator.handle(body, dict(self.headers))
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f'http://{host}:{self._server.server_port}/addToNodeV2'
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _file_bytes(nodes) -> int:
+    """Characters of base64 file data in ``nodes``."""
+    total = 0
+    stack = list(nodes) if isinstance(nodes, list) else []
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if node.get('dataType') == 'file':
+                total += len(node.get('file') or '')
+            stack.extend(node.get('children') or [])
+    return total
+
+
+def _copy_tree(root: WireNode) -> WireNode:
+    out = {k: v for k, v in root.items() if k != 'children'}
+    stack = [(root, out)]
+    while stack:
+        src, dst = stack.pop()
+        if src['children']:
+            dst['children'] = []
+            for child in src['children']:
+                child_copy = {k: v for k, v in child.items() if k != 'children'}
+                dst['children'].append(child_copy)
+                stack.append((child, child_copy))
+    return out
+
+
+class EmulatorTransport(Transport):
+    """Calls a ``TanaEmulator`` directly, without sockets."""
+    def __init__(self, emulator: TanaEmulator):
+        super().__init__()
+        self.emulator = emulator
+
+    def post(self, url: str, headers: dict[str, str], body: Body) -> requests.Response:
+        data = self.encode_body(body)
+        status, resp_headers, out = self.emulator.handle(data, headers)
+        self.stats.requests += 1
+        self.stats.bytes_sent += len(data)
+        self.stats.bytes_uncompressed += len(data)
+
+        resp = requests.Response()
+        resp.status_code = status
+        resp.headers = CaseInsensitiveDict(resp_headers)
+        resp._content = out
+        resp.url = url
+        resp.encoding = 'utf-8'
+        return resp
+
+
+class AsyncEmulatorTransport(EmulatorTransport):
+    """``EmulatorTransport`` for ``AsyncTana``: the same in-process call, awaited."""
+    async def post(self, url: str, headers: dict[str, str], body: Body) -> requests.Response:
+        return super().post(url, headers, body)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Serve a local Tana API emulator')
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--latency', type=float, default=0.0)
+    arg_parser.add_argument('--latency-jitter', type=float, default=0.0)
+    arg_parser.add_argument('--rate-429', type=float, default=0.0)
+    arg_parser.add_argument('--error-rate', type=float, default=0.0)
+    args = arg_parser.parse_args()
+
+    emu = TanaEmulator(latency=args.latency, latency_jitter=args.latency_jitter, rate_429=args.rate_429,
+                       error_rate=args.error_rate)
+    print(f'Set TanaEndpoint={emu.start(port=args.port)}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        emu.stop()
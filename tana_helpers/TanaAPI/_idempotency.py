@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+from ._chunking import WireNode
+
+IDEMPOTENCY_PATH_ENV = 'TanaIdempotencyPath'
+
+
+def submission_key(target_id: Optional[str], nodes: list[WireNode]) -> str:
+    """Canonical hash of a submission: the same target and nodes always give the same key."""
+    canonical = json.dumps({'targetNodeId': target_id, 'nodes': nodes}, sort_keys=True, separators=(',', ':'),
+                           ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class IdempotencyStore(ABC):
+    """Persistent tier behind ``IdempotencyCache``."""
+    @abstractmethod
+    def get(self, key: str) -> Optional[tuple[float, WireNode]]:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, stored_at: float, response: WireNode):
+        ...
+
+    @abstractmethod
+    def purge(self, older_than: float):
+        ...
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    def __init__(self, path: Union[Path, str]):
+        import sqlite3
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS idempotency (
+                key TEXT PRIMARY KEY,
+                stored_at REAL NOT NULL,
+                response TEXT NOT NULL
+            )''')
+
+    def get(self, key: str) -> Optional[tuple[float, WireNode]]:
+        with self._lock:
+            row = self._conn.execute('SELECT stored_at, response FROM idempotency WHERE key = ?', (key,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put(self, key: str, stored_at: float, response: WireNode):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO idempotency (key, stored_at, response) VALUES (?, ?, ?)',
+                               (key, stored_at, json.dumps(response, separators=(',', ':'))))
+
+    def purge(self, older_than: float):
+        with self._lock:
+            self._conn.execute('DELETE FROM idempotency WHERE stored_at < ?', (older_than,))
+
+
+class IdempotencyCache:
+    """Remembers responses to recent submissions so replays within ``ttl`` seconds aren't sent again.
+
+    A bounded in-memory LRU sits in front of an optional persistent ``store``
+    that survives cold starts.
+    """
+    def __init__(self, ttl: float = 3600.0, maxsize: int = 512, store: IdempotencyStore = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, WireNode]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[WireNode]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.store is not None:
+            entry = self.store.get(key)
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is None or now - entry[0] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, response: WireNode):
+        entry = (time.time(), response)
+        self._remember(key, entry)
+        if self.store is not None:
+            self.store.put(key, *entry)
+            self.store.purge(entry[0] - self.ttl)
+
+    def _remember(self, key: str, entry: tuple[float, WireNode]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+_DEFAULT_CACHE: Optional[IdempotencyCache] = None
+
+
+def get_default_idempotency_cache() -> IdempotencyCache:
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        store_path = os.environ.get(IDEMPOTENCY_PATH_ENV)
+        _DEFAULT_CACHE = IdempotencyCache(store=SQLiteIdempotencyStore(store_path) if store_path else None)
+    return _DEFAULT_CACHE
+
+
+def set_default_idempotency_cache(cache: IdempotencyCache) -> IdempotencyCache:
+    global _DEFAULT_CACHE
+    _DEFAULT_CACHE = cache
+    return cache
@@ -1,13 +1,10 @@
 import base64
-import mimetypes
 from pathlib import Path
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Iterator, Union
 
-import tqdm.notebook
-from tqdm import tqdm
 from typing_extensions import Literal
 
-from pydantic import BaseModel, field_serializer, model_serializer
+from pydantic import BaseModel, PrivateAttr, field_serializer, model_serializer
 
 from enum import Enum
 
@@ -113,33 +110,112 @@ class ReferenceNode(Node):
                 'id': self.target.nodeId}
 
 
+def base64_size(n_bytes: int) -> int:
+    """Length of the base64 encoding of ``n_bytes`` bytes, without encoding anything."""
+    return -(-n_bytes // 3) * 4
+
+
 class LargeFileError(ValueError):
     MAX_LEN = 4900
 
-    def __init__(self, encoded_size):
+    def __init__(self, encoded_size, max_len: int = None):
         self.encoded_size = encoded_size
-        super().__init__(f'File data string is too long to post: {encoded_size} > {self.MAX_LEN}')
+        self.max_len = self.MAX_LEN if max_len is None else max_len
+        super().__init__(f'File data string is too long to post: {encoded_size} > {self.max_len}')
+
+
+class Attachment:
+    """File contents that are base64-encoded only when the request body is written.
+
+    Holds a path, or bytes / a memoryview without copying them. The encoded size
+    is known up front from the raw size; with a ``max_len`` (e.g.
+    ``LargeFileError.MAX_LEN``) it's checked both before and while encoding.
+    Without one nothing is enforced, as before: the request limits decide.
+    """
+    CHUNK = 3 * 16 * 1024  # a multiple of 3, so encoded chunks concatenate without padding
+
+    def __init__(self, source: Union[bytes, bytearray, memoryview, Path], max_len: int = None):
+        self.source = source if isinstance(source, Path) else memoryview(source).cast('B')
+        self.max_len = max_len
+
+    @property
+    def size(self) -> int:
+        return self.source.stat().st_size if isinstance(self.source, Path) else self.source.nbytes
+
+    @property
+    def encoded_size(self) -> int:
+        return base64_size(self.size)
+
+    def check(self, encoded_size: int = None):
+        if self.max_len is None:
+            return
+        encoded_size = self.encoded_size if encoded_size is None else encoded_size
+        if encoded_size > self.max_len:
+            raise LargeFileError(encoded_size, self.max_len)
+
+    def iter_base64(self) -> Iterator[bytes]:
+        self.check()
+        if isinstance(self.source, Path):
+            written = 0
+            with self.source.open('rb') as f:
+                while chunk := f.read(self.CHUNK):
+                    written += len(chunk)
+                    self.check(base64_size(written))  # the file may have grown since it was checked
+                    yield base64.b64encode(chunk)
+        else:
+            for start in range(0, self.source.nbytes, self.CHUNK):
+                yield base64.b64encode(self.source[start:start + self.CHUNK])
+
+    def encode(self) -> str:
+        return b''.join(self.iter_base64()).decode('ascii')
+
+    def __deepcopy__(self, memo):
+        # the contents are never modified, so copies of a FileNode can share them
+        return self
 
 
 class FileNode(Node):
     dataType: NodeType = NodeType.file
-    file: str
+    file: Optional[str] = None
     filename: str
     contentType: str
+    _attachment: Optional[Attachment] = PrivateAttr(default=None)
+
+    @model_serializer(mode='wrap')
+    def serializer(self, handler):
+        data = handler(self)
+        if self.file is not None or self._attachment is None:
+            return data
+        # "file" goes where the field is declared, just before "filename"
+        out = {}
+        for key, value in data.items():
+            if key == 'filename':
+                out['file'] = self._attachment.encode()
+            out[key] = value
+        return out
 
     @classmethod
-    def from_bytes(cls, file_data: bytes, file_name: str):
-        mime_type = mimetypes.guess_type(file_name)[0]
-        encoded_data = base64.b64encode(file_data)
-        tqdm.write(str(len(encoded_data)))
-        # if len(encoded_data) > LargeFileError.MAX_LEN:
-        #     raise LargeFileError(len(encoded_data))
-        return cls(file=encoded_data, filename=file_name, contentType=mime_type)
+    def from_attachment(cls, attachment: Attachment, file_name: str):
+        import mimetypes  # loads the system MIME tables, so only when a file is actually attached
+        attachment.check()
+        node = cls(filename=file_name, contentType=mimetypes.guess_type(file_name)[0])
+        node._attachment = attachment
+        return node
 
     @classmethod
-    def from_path(cls, path: Union[Path, str]):
+    def from_bytes(cls, file_data: Union[bytes, bytearray, memoryview], file_name: str, max_len: int = None):
+        """Attaches ``file_data`` without copying it; raises ``LargeFileError`` before encoding if it's over ``max_len``."""
+        return cls.from_attachment(Attachment(file_data, max_len), file_name)
+
+    @classmethod
+    def from_path(cls, path: Union[Path, str], max_len: int = None):
+        """Attaches the file at ``path``; it's checked now but only read when the request is written."""
         path = Path(path)
-        return cls.from_bytes(path.read_bytes(), path.name)
+        return cls.from_attachment(Attachment(path, max_len), path.name)
+
+    @property
+    def attachment(self) -> Optional[Attachment]:
+        return self._attachment
 
 
 class APIResponse(BaseModel):
@@ -0,0 +1,317 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from pydantic import BaseModel
+from requests import RequestException
+
+from ._base import Tana, TanaBuilder
+from ._idempotency import IdempotencyCache, get_default_idempotency_cache, submission_key
+
+OUTBOX_PATH_ENV = 'TanaOutboxPath'
+OUTBOX_QUEUE_ENV = 'TanaOutboxQueueUrl'
+DEFAULT_MESSAGE_GROUP = 'INBOX'
+SQS_BATCH_SIZE = 10
+SQS_MAX_WAIT_SECONDS = 20
+
+
+class OutboxEntry(BaseModel):
+    entry_id: Union[int, str]
+    target_id: Optional[str] = None
+    nodes: list[dict[str, Any]]
+    attempts: int = 0
+    created_at: float
+
+
+class OutboxBackend(ABC):
+    """A durable FIFO of pending submissions.
+
+    ``claim`` must never hand out an entry while an older entry for the same
+    target is still claimed or waiting to be retried, so each target sees its
+    submissions in order. It may wait up to ``wait_seconds`` for an entry
+    before returning none.
+    """
+    @abstractmethod
+    def put(self, target_id: Optional[str], nodes: list[dict[str, Any]]) -> Union[int, str]:
+        ...
+
+    @abstractmethod
+    def claim(self, limit: int, lease_seconds: float = 60.0, wait_seconds: float = 0.0) -> list[OutboxEntry]:
+        ...
+
+    @abstractmethod
+    def ack(self, entry_ids: list[Union[int, str]]):
+        ...
+
+    @abstractmethod
+    def fail(self, entry_ids: list[Union[int, str]], error: str, retry_in: float, max_attempts: int):
+        ...
+
+    @abstractmethod
+    def pending_count(self) -> int:
+        ...
+
+
+class SQLiteOutbox(OutboxBackend):
+    """A local file: durable across invocations only where the file is (e.g. a mounted EFS volume)."""
+    def __init__(self, path: Union[Path, str]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                target_id TEXT,
+                nodes TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                dead INTEGER NOT NULL DEFAULT 0
+            )''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS outbox_ready ON outbox (dead, available_at, id)')
+
+    def put(self, target_id: Optional[str], nodes: list[dict[str, Any]]) -> int:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                'INSERT INTO outbox (target_id, nodes, created_at, available_at) VALUES (?, ?, ?, ?)',
+                (target_id, json.dumps(nodes, separators=(',', ':')), now, now))
+            return cur.lastrowid
+
+    def claim(self, limit: int, lease_seconds: float = 60.0, wait_seconds: float = 0.0) -> list[OutboxEntry]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute('''
+                    SELECT id, target_id, nodes, attempts, created_at FROM outbox AS o
+                    WHERE dead = 0 AND available_at <= :now AND NOT EXISTS (
+                        SELECT 1 FROM outbox AS older
+                        WHERE older.target_id IS o.target_id AND older.id < o.id
+                          AND older.dead = 0 AND older.available_at > :now)
+                    ORDER BY id LIMIT :limit''', {'now': now, 'limit': limit}).fetchall()
+                self._conn.executemany('UPDATE outbox SET available_at = ? WHERE id = ?',
+                                       [(now + lease_seconds, row[0]) for row in rows])
+            except sqlite3.Error:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return [OutboxEntry(entry_id=r[0], target_id=r[1], nodes=json.loads(r[2]), attempts=r[3], created_at=r[4])
+                for r in rows]
+
+    def ack(self, entry_ids: list[int]):
+        with self._lock:
+            self._conn.executemany('DELETE FROM outbox WHERE id = ?', [(i,) for i in entry_ids])
+
+    def fail(self, entry_ids: list[int], error: str, retry_in: float, max_attempts: int):
+        with self._lock:
+            self._conn.executemany('''UPDATE outbox SET attempts = attempts + 1, last_error = ?, available_at = ?,
+                                      dead = (attempts + 1 >= ?) WHERE id = ?''',
+                                   [(error, time.time() + retry_in, max_attempts, i) for i in entry_ids])
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM outbox WHERE dead = 0').fetchone()[0]
+
+
+class SQSOutbox(OutboxBackend):
+    """An SQS FIFO queue shared by every container.
+
+    Each target is a message group, so SQS itself holds back a target's later
+    entries while an earlier one is in flight. Entries are identified by their
+    receipt handles. Giving up after ``max_attempts`` is the queue's redrive
+    policy (``maxReceiveCount`` into a dead-letter queue), not the drainer's.
+    Identical submissions within SQS's five minute deduplication window are
+    only queued once.
+    """
+    def __init__(self, queue_url: str, client=None):
+        if client is None:
+            import boto3
+            client = boto3.client('sqs')
+        self.queue_url = queue_url
+        self.client = client
+
+    def put(self, target_id: Optional[str], nodes: list[dict[str, Any]]) -> str:
+        body = {'target_id': target_id, 'nodes': nodes, 'created_at': time.time()}
+        resp = self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body, separators=(',', ':')),
+                                        MessageGroupId=target_id or DEFAULT_MESSAGE_GROUP,
+                                        MessageDeduplicationId=submission_key(target_id, nodes))
+        return resp['MessageId']
+
+    def claim(self, limit: int, lease_seconds: float = 60.0, wait_seconds: float = 0.0) -> list[OutboxEntry]:
+        entries = []
+        while len(entries) < limit:
+            # a short poll only asks some of the queue's servers and can come back empty while there are
+            # messages, so the first receive long-polls; topping up a batch that has messages needn't wait
+            wait = 0 if entries else min(int(wait_seconds), SQS_MAX_WAIT_SECONDS)
+            resp = self.client.receive_message(QueueUrl=self.queue_url, AttributeNames=['ApproximateReceiveCount'],
+                                               MaxNumberOfMessages=min(limit - len(entries), SQS_BATCH_SIZE),
+                                               VisibilityTimeout=int(lease_seconds), WaitTimeSeconds=wait)
+            messages = resp.get('Messages', [])
+            if not messages:
+                break
+            for message in messages:
+                body = json.loads(message['Body'])
+                attempts = int(message['Attributes']['ApproximateReceiveCount']) - 1
+                entries.append(OutboxEntry(entry_id=message['ReceiptHandle'], target_id=body['target_id'],
+                                           nodes=body['nodes'], attempts=attempts, created_at=body['created_at']))
+        return entries
+
+    def ack(self, entry_ids: list[str]):
+        for start in range(0, len(entry_ids), SQS_BATCH_SIZE):
+            batch = entry_ids[start:start + SQS_BATCH_SIZE]
+            self.client.delete_message_batch(QueueUrl=self.queue_url, Entries=[
+                {'Id': str(i), 'ReceiptHandle': handle} for i, handle in enumerate(batch)])
+
+    def fail(self, entry_ids: list[str], error: str, retry_in: float, max_attempts: int):
+        # the next receive counts as the next attempt; the redrive policy retires it after max receives
+        for handle in entry_ids:
+            self.client.change_message_visibility(QueueUrl=self.queue_url, ReceiptHandle=handle,
+                                                  VisibilityTimeout=min(int(retry_in), 43200))
+
+    def pending_count(self) -> int:
+        attributes = self.client.get_queue_attributes(
+            QueueUrl=self.queue_url,
+            AttributeNames=['ApproximateNumberOfMessages', 'ApproximateNumberOfMessagesNotVisible'])['Attributes']
+        return sum(int(v) for v in attributes.values())
+
+
+@dataclass
+class DrainStats:
+    delivered: int = 0
+    failed: int = 0
+    skipped: int = 0
+    requests: int = 0
+
+
+class OutboxDrainer:
+    """Delivers outbox entries to Tana.
+
+    Each entry is its own ``Tana.send`` and is acknowledged on its own, so a
+    failure only ever re-sends that entry. A failed entry is retried later with
+    exponential backoff, up to ``max_attempts``, and the rest of its target's
+    claimed entries wait behind it. Entries whose exact submission was already
+    delivered within the ``idempotency`` TTL (e.g. a replayed webhook) are
+    acknowledged without being sent. Each claim waits up to ``poll_wait``
+    seconds (within the time budget) for entries before the drain stops.
+    """
+    def __init__(self, outbox: OutboxBackend, tana: Tana = None, batch_size: int = 50,
+                 max_attempts: int = 5, retry_base: float = 5.0, lease_seconds: float = 120.0,
+                 idempotency: IdempotencyCache = None, poll_wait: float = SQS_MAX_WAIT_SECONDS):
+        self.outbox = outbox
+        self.tana = tana or Tana()
+        self.idempotency = idempotency
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.lease_seconds = lease_seconds
+        self.poll_wait = poll_wait
+
+    def drain(self, time_budget: float = None) -> DrainStats:
+        stats = DrainStats()
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        while deadline is None or (remaining := deadline - time.monotonic()) > 0:
+            wait = self.poll_wait if deadline is None else min(self.poll_wait, remaining)
+            entries = self.outbox.claim(self.batch_size, self.lease_seconds, wait)
+            if not entries:
+                break
+            # all of a target's entries in the batch, so one failure holds back every later one
+            by_target: dict[Optional[str], list[OutboxEntry]] = {}
+            for entry in entries:
+                by_target.setdefault(entry.target_id, []).append(entry)
+            done_before = stats.delivered + stats.skipped
+            for target_id, group in by_target.items():
+                self._deliver(target_id, group, stats)
+            if stats.delivered + stats.skipped == done_before:
+                break  # everything failed; leave it for the next drain rather than spin on it
+        return stats
+
+    def _deliver(self, target_id: Optional[str], entries: list[OutboxEntry], stats: DrainStats):
+        for index, entry in enumerate(entries):
+            if not self._deliver_one(target_id, entry, stats):
+                # later entries stay claimed until their lease runs out, and then queue behind this one
+                stats.failed += len(entries) - index - 1
+                return
+
+    def _deliver_one(self, target_id: Optional[str], entry: OutboxEntry, stats: DrainStats) -> bool:
+        key = submission_key(target_id, entry.nodes) if self.idempotency is not None else None
+        if key is not None and self.idempotency.get(key) is not None:
+            self.outbox.ack([entry.entry_id])
+            stats.skipped += 1
+            return True
+
+        requests_before = self.tana.transport.stats.requests
+        try:
+            response = self.tana.send(entry.nodes, target_id)
+        except (RequestException, ValueError) as err:
+            self.outbox.fail([entry.entry_id], repr(err), self.retry_base * 2 ** entry.attempts, self.max_attempts)
+            print(f'Outbox delivery to {target_id} failed (attempt {entry.attempts + 1}): {err!r}')
+            stats.failed += 1
+            return False
+        else:
+            self.outbox.ack([entry.entry_id])
+            stats.delivered += 1
+            if key is not None:
+                self.idempotency.put(key, response)
+            return True
+        finally:
+            stats.requests += self.tana.transport.stats.requests - requests_before
+
+
+_DEFAULT_OUTBOX: Optional[OutboxBackend] = None
+
+
+def get_default_outbox() -> OutboxBackend:
+    """The SQS queue at ``TanaOutboxQueueUrl``, or the SQLite file at ``TanaOutboxPath``.
+
+    There's deliberately no fallback: a queue only the current container can
+    see would look durable without being it.
+    """
+    global _DEFAULT_OUTBOX
+    if _DEFAULT_OUTBOX is None:
+        if os.environ.get(OUTBOX_QUEUE_ENV):
+            _DEFAULT_OUTBOX = SQSOutbox(os.environ[OUTBOX_QUEUE_ENV])
+        elif os.environ.get(OUTBOX_PATH_ENV):
+            _DEFAULT_OUTBOX = SQLiteOutbox(os.environ[OUTBOX_PATH_ENV])
+        else:
+            raise RuntimeError(f'No outbox configured: set {OUTBOX_QUEUE_ENV} or {OUTBOX_PATH_ENV}, '
+                               f'or call set_default_outbox()')
+    return _DEFAULT_OUTBOX
+
+
+def set_default_outbox(outbox: OutboxBackend) -> OutboxBackend:
+    global _DEFAULT_OUTBOX
+    _DEFAULT_OUTBOX = outbox
+    return outbox
+
+
+def enqueue(tana: TanaBuilder, outbox: OutboxBackend = None, clear_nodes=True) -> Union[int, str]:
+    """Persists ``tana``'s pending submission instead of sending it."""
+    data = tana.model_dump()
+    entry_id = (outbox or get_default_outbox()).put(data.get('targetNodeId'), data['nodes'])
+    if clear_nodes:
+        tana.children = []
+    return entry_id
+
+
+def drain_outbox(context=None, outbox: OutboxBackend = None, safety_margin: float = 10.0) -> DrainStats:
+    """Delivers queued submissions, stopping ``safety_margin`` seconds before the Lambda timeout.
+
+    Whatever isn't delivered stays queued for the next drain. Replays of
+    recently delivered submissions are dropped using the default idempotency
+    cache.
+    """
+    time_budget = None
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        time_budget = max(context.get_remaining_time_in_millis() / 1000 - safety_margin, 0)
+    drainer = OutboxDrainer(outbox or get_default_outbox(), idempotency=get_default_idempotency_cache())
+    return drainer.drain(time_budget)
@@ -0,0 +1,186 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+# submissions aren't idempotent: a 502/504 may come back after the nodes were created, so only
+# statuses that mean the request was refused are retried (503 only when it says when to come back)
+RETRY_STATUSES = {429}
+RETRY_AFTER_STATUSES = {503}
+
+
+@dataclass
+class RateLimitMetrics:
+    requests: int = 0
+    throttled: int = 0
+    retries: int = 0
+    wait_seconds: float = 0.0
+    send_seconds: float = 0.0
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of blocking under its lock.
+
+    ``reserve`` takes a token (letting the balance go negative) and returns how
+    long the caller must wait, so the same bucket can be shared by threads and
+    asyncio tasks without either one holding the lock while it sleeps.
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens: float = 1) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def block_for(self, seconds: float):
+        """Refuse to hand out tokens for ``seconds`` (e.g. from a Retry-After header)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def acquire(self) -> float:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        import asyncio
+
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Shared request budget for the Tana API.
+
+    Wraps a ``TokenBucket`` with bounded, jittered exponential backoff that
+    honours ``Retry-After``, and adapts the bucket rate: halved on every 429,
+    raised additively after ``increase_after`` consecutive successes, never
+    above ``max_rate`` or below ``min_rate``.
+    """
+    def __init__(self, rate: float = 0.5, burst: int = 1, max_retries: int = 4, backoff_base: float = 1.0,
+                 backoff_max: float = 30.0, min_rate: float = 0.05, max_rate: Optional[float] = None,
+                 decrease_factor: float = 0.5, increase_step: float = 0.05, increase_after: int = 10):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.increase_after = increase_after
+        self.metrics = RateLimitMetrics()
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def acquire(self) -> float:
+        wait = self.bucket.acquire()
+        self._record_wait(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        wait = await self.bucket.acquire_async()
+        self._record_wait(wait)
+        return wait
+
+    def _record_wait(self, wait: float):
+        with self._lock:
+            self.metrics.requests += 1
+            self.metrics.wait_seconds += wait
+
+    def record_send(self, seconds: float):
+        with self._lock:
+            self.metrics.send_seconds += seconds
+
+    def should_retry(self, status_code: int, attempt: int, retry_after: Optional[str] = None) -> bool:
+        if attempt >= self.max_retries:
+            return False
+        return status_code in RETRY_STATUSES or (status_code in RETRY_AFTER_STATUSES and bool(retry_after))
+
+    def backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Block the shared bucket until retry number ``attempt + 1`` may be sent and return the delay."""
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            ceiling = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+            delay = random.uniform(0, ceiling)
+        delay = min(delay, self.backoff_max)
+        self.bucket.block_for(delay)
+        with self._lock:
+            self.metrics.retries += 1
+        return delay
+
+    def on_response(self, status_code: int):
+        with self._lock:
+            if status_code == 429:
+                self.metrics.throttled += 1
+                self._successes = 0
+                new_rate = max(self.min_rate, self.bucket.rate * self.decrease_factor)
+            elif status_code < 400:
+                self._successes += 1
+                if self._successes < self.increase_after or self.bucket.rate >= self.max_rate:
+                    return
+                self._successes = 0
+                new_rate = min(self.max_rate, self.bucket.rate + self.increase_step)
+            else:
+                return
+        self.bucket.set_rate(new_rate)
+
+
+_DEFAULT_RATE_LIMITER: Optional[RateLimiter] = None
+_DEFAULT_RATE_LIMITER_LOCK = threading.Lock()
+
+
+def get_default_rate_limiter() -> RateLimiter:
+    global _DEFAULT_RATE_LIMITER
+    if _DEFAULT_RATE_LIMITER is None:
+        with _DEFAULT_RATE_LIMITER_LOCK:
+            if _DEFAULT_RATE_LIMITER is None:
+                _DEFAULT_RATE_LIMITER = RateLimiter()
+    return _DEFAULT_RATE_LIMITER
+
+
+def set_default_rate_limiter(rate_limiter: RateLimiter) -> RateLimiter:
+    global _DEFAULT_RATE_LIMITER
+    with _DEFAULT_RATE_LIMITER_LOCK:
+        _DEFAULT_RATE_LIMITER = rate_limiter
+    return rate_limiter
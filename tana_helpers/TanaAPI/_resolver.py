@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from ._base import Tana
+from ._nodes import FieldNode, PlainNode, ReferenceNode, SuperTag
+
+RESOLVER_PATH_ENV = 'TanaResolverPath'
+
+FIELD = 'field'
+SUPERTAG = 'supertag'
+REFERENCE = 'reference'
+
+# what a missing name is created as: the supertag that makes it a field/supertag definition, and where it goes
+CREATE_TAGS = {FIELD: 'SYS_T02', SUPERTAG: 'SYS_T01', REFERENCE: None}
+DEFAULT_TARGETS = {FIELD: 'SCHEMA', SUPERTAG: 'SCHEMA', REFERENCE: 'INBOX'}
+
+
+class ResolverStore(ABC):
+    """Persistent tier behind ``NodeResolver``."""
+    @abstractmethod
+    def get_many(self, kind: str, names: list[str]) -> dict[str, tuple[float, str]]:
+        ...
+
+    @abstractmethod
+    def put_many(self, kind: str, node_ids: dict[str, str], stored_at: float):
+        ...
+
+    @abstractmethod
+    def delete(self, kind: str, names: list[str]):
+        ...
+
+    @abstractmethod
+    def delete_kind(self, kind: str):
+        ...
+
+
+class SQLiteResolverStore(ResolverStore):
+    BATCH = 500  # stays under SQLite's bound-parameter limit
+
+    def __init__(self, path: Union[Path, str]):
+        import sqlite3
+
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS resolver (
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL,
+                node_id TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                PRIMARY KEY (kind, name)
+            )''')
+
+    def get_many(self, kind: str, names: list[str]) -> dict[str, tuple[float, str]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(names), self.BATCH):
+                batch = names[start:start + self.BATCH]
+                rows = self._conn.execute(
+                    f'SELECT name, stored_at, node_id FROM resolver WHERE kind = ? AND name IN '
+                    f'({",".join("?" * len(batch))})', (kind, *batch)).fetchall()
+                found.update((name, (stored_at, node_id)) for name, stored_at, node_id in rows)
+        return found
+
+    def put_many(self, kind: str, node_ids: dict[str, str], stored_at: float):
+        with self._lock:
+            self._conn.executemany('INSERT OR REPLACE INTO resolver (kind, name, node_id, stored_at) VALUES (?, ?, ?, ?)',
+                                   [(kind, name, node_id, stored_at) for name, node_id in node_ids.items()])
+
+    def delete(self, kind: str, names: list[str]):
+        with self._lock:
+            self._conn.executemany('DELETE FROM resolver WHERE kind = ? AND name = ?', [(kind, n) for n in names])
+
+    def delete_kind(self, kind: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM resolver WHERE kind = ?', (kind,))
+
+
+class NodeResolver:
+    """Maps names of fields, supertags and reference targets to their Tana nodeIds.
+
+    Lookups go to a bounded in-memory LRU, then to the optional persistent
+    ``store``; only names found in neither are created in Tana, all of them in
+    one submit. Memory entries older than ``ttl`` seconds are re-read from the
+    store, so changes made through a shared store are picked up without a
+    request to Tana; without a store they count as unknown again. ``seed``
+    pins ids that are already known, e.g. hardcoded ones; they never expire.
+    """
+    def __init__(self, tana: Tana = None, ttl: float = 3600.0, maxsize: int = 4096, store: ResolverStore = None,
+                 targets: dict[str, str] = None):
+        self.tana = tana
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.store = store
+        self.targets = {**DEFAULT_TARGETS, **(targets or {})}
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[float, str]] = OrderedDict()
+        self._seeded: dict[tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+
+    def seed(self, kind: str, node_ids: dict[str, str], persist=False):
+        with self._lock:
+            self._seeded.update(((kind, name), node_id) for name, node_id in node_ids.items())
+        if persist and self.store is not None:
+            self.store.put_many(kind, node_ids, time.time())
+
+    def get(self, kind: str, name: str) -> Optional[str]:
+        """The cached nodeId for ``name``, or None; never calls Tana."""
+        return self.prefetch(kind, [name]).get(name)
+
+    def prefetch(self, kind: str, names: Iterable[str]) -> dict[str, str]:
+        """Loads every known name into memory in one store query and returns the ones found."""
+        now = time.time()
+        found, stale = {}, []
+        with self._lock:
+            for name in dict.fromkeys(names):
+                if (kind, name) in self._seeded:
+                    found[name] = self._seeded[kind, name]
+                    continue
+                entry = self._entries.get((kind, name))
+                if entry is not None and now - entry[0] <= self.ttl:
+                    self._entries.move_to_end((kind, name))
+                    found[name] = entry[1]
+                else:
+                    stale.append(name)
+        stored = self.store.get_many(kind, stale) if stale and self.store is not None else {}
+        if stored:
+            # the memory TTL restarts when an entry is re-read
+            self._remember(kind, {name: node_id for name, (_, node_id) in stored.items()}, now)
+            found.update((name, node_id) for name, (_, node_id) in stored.items())
+        self.hits += len(found)
+        self.misses += len(stale) - len(stored)
+        return found
+
+    def resolve(self, kind: str, name: str, create=True) -> str:
+        return self.resolve_many(kind, [name], create)[name]
+
+    def resolve_many(self, kind: str, names: Iterable[str], create=True) -> dict[str, str]:
+        """nodeIds for all of ``names``; the missing ones are created together in a single submit."""
+        names = list(dict.fromkeys(names))
+        found = self.prefetch(kind, names)
+        missing = [n for n in names if n not in found]
+        if missing:
+            if not create:
+                raise KeyError(f'Unknown {kind} names: {", ".join(missing)}')
+            found.update(self._create(kind, missing))
+        return {name: found[name] for name in names}
+
+    def _create(self, kind: str, names: list[str]) -> dict[str, str]:
+        # one creator at a time, and re-check: another thread may have just created the same names
+        with self._create_lock:
+            found = self.prefetch(kind, names)
+            missing = [n for n in names if n not in found]
+            if not missing:
+                return found
+
+            tag = CREATE_TAGS[kind]
+            nodes = {name: PlainNode(name=name, supertags=[SuperTag(id=tag)] if tag else None) for name in missing}
+            base = self.tana or Tana()
+            client = Tana(*nodes.values(), target_id=self.targets[kind], transport=base.transport,
+                          rate_limiter=base.rate_limiter, endpoint=base.endpoint)
+            result = client.submit(compact=True)
+            created = {name: result.id_for(node) for name, node in nodes.items()}
+
+            now = time.time()
+            self._remember(kind, created, now)
+            if self.store is not None:
+                self.store.put_many(kind, created, now)
+            self.created += len(created)
+            return {**found, **created}
+
+    def invalidate(self, kind: str, names: Iterable[str] = None):
+        """Forgets ``names`` (or every name of ``kind``), in memory and in the store."""
+        names = set(names) if names is not None else None
+        with self._lock:
+            keys = [k for k in [*self._entries, *self._seeded] if k[0] == kind and (names is None or k[1] in names)]
+            for key in keys:
+                self._entries.pop(key, None)
+                self._seeded.pop(key, None)
+        if self.store is None:
+            return
+        if names is None:
+            self.store.delete_kind(kind)
+        else:
+            self.store.delete(kind, list(names))
+
+    def _remember(self, kind: str, node_ids: dict[str, str], stored_at: float):
+        with self._lock:
+            for name, node_id in node_ids.items():
+                self._entries[(kind, name)] = (stored_at, node_id)
+                self._entries.move_to_end((kind, name))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def field(self, name: str, create=True) -> FieldNode:
+        return FieldNode(attributeId=self.resolve(FIELD, name, create))
+
+    def supertag(self, name: str, create=True) -> SuperTag:
+        return SuperTag(id=self.resolve(SUPERTAG, name, create))
+
+    def reference(self, name: str, create=True) -> ReferenceNode:
+        return ReferenceNode(target=PlainNode(name=name, nodeId=self.resolve(REFERENCE, name, create)))
+
+
+_DEFAULT_RESOLVER: Optional[NodeResolver] = None
+
+
+def get_default_resolver() -> NodeResolver:
+    global _DEFAULT_RESOLVER
+    if _DEFAULT_RESOLVER is None:
+        store_path = os.environ.get(RESOLVER_PATH_ENV)
+        _DEFAULT_RESOLVER = NodeResolver(store=SQLiteResolverStore(store_path) if store_path else None)
+    return _DEFAULT_RESOLVER
+
+
+def set_default_resolver(resolver: NodeResolver) -> NodeResolver:
+    global _DEFAULT_RESOLVER
+    _DEFAULT_RESOLVER = resolver
+    return resolver
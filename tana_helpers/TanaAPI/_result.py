@@ -0,0 +1,97 @@
+from typing import Iterable, Optional, Union
+
+from ._builder import TreeBuilder
+from ._chunking import WireNode
+from ._nodes import Node, ReferenceNode, URLNode
+
+Path = tuple[int, ...]
+
+
+class SubmitResult:
+    """What a submission created, decoded only as far as it's used.
+
+    ``node_id(*path)`` follows indices into the submitted tree (the same
+    indices into the response), and ``id_for`` looks up the nodeId created for
+    a submitted ``Node``, wire dict or ``TreeBuilder`` node by identity. The raw
+    response JSON is in ``raw``; ``node`` validates it into a ``Node`` tree on
+    first access.
+    """
+    __slots__ = ('raw', '_submitted', '_paths', '_node')
+
+    def __init__(self, raw: WireNode, submitted: Iterable = ()):
+        self.raw = raw
+        self._submitted = list(submitted)
+        self._paths: Optional[dict[tuple[int, ...], Path]] = None
+        self._node: Optional[Node] = None
+
+    @property
+    def node(self) -> Node:
+        if self._node is None:
+            self._node = Node.model_validate(self.raw)
+        return self._node
+
+    @property
+    def children(self) -> list[WireNode]:
+        """The created top-level nodes, as raw JSON."""
+        return self.raw.get('children') or []
+
+    def node_id(self, *path: int) -> str:
+        node = self.raw
+        for index in path:
+            try:
+                node = node['children'][index]
+            except (KeyError, IndexError, TypeError):
+                raise KeyError(f'Tana response has no node at {path}') from None
+        try:
+            return node['nodeId']
+        except KeyError:
+            raise KeyError(f'Tana response node at {path} has no nodeId') from None
+
+    def path_of(self, local: Union[Node, WireNode, TreeBuilder], index: int = None) -> Path:
+        """Where ``local`` (or node ``index`` of a ``TreeBuilder``) sits in the submitted tree."""
+        if self._paths is None:
+            self._paths = self._index_submitted()
+        key = (id(local),) if index is None else (id(local), index)
+        try:
+            return self._paths[key]
+        except KeyError:
+            raise KeyError(f'This {type(local).__name__} was not part of this submission') from None
+
+    def id_for(self, local: Union[Node, WireNode, TreeBuilder], index: int = None) -> str:
+        """The nodeId created for ``local``, or for node ``index`` when ``local`` is a ``TreeBuilder``."""
+        return self.node_id(*self.path_of(local, index))
+
+    def _index_submitted(self) -> dict[tuple[int, ...], Path]:
+        # mirrors how to_wire lays the submitted objects out, without building anything
+        paths: dict[tuple[int, ...], Path] = {}
+        stack: list[tuple[object, Path]] = []
+        top = 0
+        for local in self._submitted:
+            if isinstance(local, TreeBuilder):
+                for index, path in enumerate(local.paths()):
+                    path = (top + path[0],) + path[1:]
+                    paths[(id(local), index)] = path
+                    attached = local.attached(index)
+                    if attached is not None:
+                        stack.append((attached, path))
+                top += local.root_count()
+            else:
+                stack.append((local, (top,)))
+                top += 1
+
+        while stack:
+            local, path = stack.pop()
+            if isinstance(local, str):
+                continue
+            paths[(id(local),)] = path
+            if isinstance(local, dict):
+                children = local.get('children') or []
+            elif not isinstance(local, Node) or isinstance(local, (URLNode, ReferenceNode)):
+                continue
+            else:
+                children = [c for c in local.children or [] if isinstance(c, (Node, str))]
+            stack.extend((child, path + (i,)) for i, child in enumerate(children))
+        return paths
+
+    def __repr__(self) -> str:
+        return f'SubmitResult({len(self.children)} top-level nodes)'
@@ -0,0 +1,384 @@
+import io
+import json
+from typing import Any, Iterable, Optional, Union
+
+from ._builder import TreeBuilder
+from ._chunking import WireNode, count_nodes
+from ._nodes import Attachment, FileNode, Node, NodeType, ReferenceNode, SuperTag, URLNode
+
+try:
+    from json.encoder import c_encode_basestring as _encode_str
+except ImportError:  # pragma: no cover - pure-python json
+    from json.encoder import py_encode_basestring as _encode_str
+
+NodeLike = Union[Node, str, WireNode, TreeBuilder]
+
+_SCALAR, _ENUM, _CHILDREN, _SUPERTAGS, _FILE = range(5)
+_FIELD_KINDS = {'children': _CHILDREN, 'supertags': _SUPERTAGS, 'dataType': _ENUM, 'type': _ENUM}
+_BASE_SERIALIZERS = {d.func for d in Node.__pydantic_decorators__.field_serializers.values()}
+_JSON_LITERALS = {True: 'true', False: 'false'}
+# classes Node.serialize_children keeps; isinstance against pydantic models is slow, so remember them
+_CHILD_TYPES = {str}
+
+# per class: ('fields', ((field, '"field":', kind), ...)), ('url', ()), ('reference', ()) or None
+_PLANS: dict[type, Optional[tuple[str, tuple[tuple[str, str, int], ...]]]] = {}
+_dumps = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+
+class _Unsupported(Exception):
+    """A node holds something only pydantic knows how to serialize."""
+
+
+def _model_serializer_func(cls: type):
+    serializers = cls.__pydantic_decorators__.model_serializers
+    return next(iter(serializers.values())).func if serializers else None
+
+
+_SPECIAL_SERIALIZERS = {_model_serializer_func(URLNode): 'url', _model_serializer_func(ReferenceNode): 'reference',
+                        _model_serializer_func(FileNode): 'file'}
+
+
+def _plan(cls: type):
+    """How to serialize instances of ``cls``; None for anything that isn't a node we can mirror exactly."""
+    try:
+        return _PLANS[cls]
+    except KeyError:
+        pass
+    plan = None
+    if isinstance(cls, type) and issubclass(cls, Node):
+        custom = _model_serializer_func(cls)
+        extra_serializers = {d.func for d in cls.__pydantic_decorators__.field_serializers.values()} - _BASE_SERIALIZERS
+        if extra_serializers:
+            pass
+        elif custom is not None and _SPECIAL_SERIALIZERS.get(custom) != 'file':
+            plan = (_SPECIAL_SERIALIZERS[custom], ()) if custom in _SPECIAL_SERIALIZERS else None
+        else:
+            # FileNode's serializer only fills in "file" from its attachment, which _FILE fields do too
+            kinds = dict(_FIELD_KINDS, file=_FILE) if custom is not None else _FIELD_KINDS
+            plan = ('fields', tuple((name, f'"{name}":', kinds.get(name, _SCALAR)) for name in cls.model_fields))
+    _PLANS[cls] = plan
+    return plan
+
+
+def _is_child(child) -> bool:
+    if type(child) in _CHILD_TYPES:
+        return True
+    if isinstance(child, Node):
+        _CHILD_TYPES.add(type(child))
+        return True
+    return False
+
+
+def _scalar(value):
+    if type(value) in (str, bool, int, float):
+        return value
+    raise _Unsupported
+
+
+def _node_items(node: Node, plan) -> tuple[dict[str, Any], list[Union[Node, str]]]:
+    """The dict ``node.model_dump()`` would give, minus the children, and the children to expand into it."""
+    kind, fields = plan
+    if kind == 'url':
+        return {'type': 'field', 'attributeId': 'URLFieldId',
+                'children': [{'dataType': 'url', 'name': node.url}]}, []
+    if kind == 'reference':
+        return {'dataType': 'reference', 'id': node.target.nodeId}, []
+
+    values = node.__dict__
+    data, kids = {}, []
+    for name, _, field_kind in fields:
+        value = values[name]
+        if value is None:
+            if field_kind == _FILE and node.attachment is not None:
+                data[name] = node.attachment.encode()
+            continue
+        if field_kind == _SCALAR or field_kind == _FILE:
+            data[name] = _scalar(value)
+        elif field_kind == _CHILDREN:
+            kids = value if all(type(c) in _CHILD_TYPES for c in value) else [c for c in value if _is_child(c)]
+            data[name] = None  # keeps the key in place; replaced by the list once there are children
+        elif field_kind == _ENUM:
+            data[name] = value.value if type(value) is NodeType else _scalar(value)
+        else:
+            if any(type(t) is not SuperTag for t in value):
+                raise _Unsupported
+            data[name] = [{'id': t.id} for t in value]
+    return data, kids
+
+
+def _expand(nodes: Iterable[NodeLike]) -> list[Union[Node, str, WireNode]]:
+    """Replaces each ``TreeBuilder`` with its top-level nodes."""
+    out = []
+    for node in nodes:
+        if isinstance(node, TreeBuilder):
+            out.extend(node.to_wire())
+        else:
+            out.append(node)
+    return out
+
+
+def to_wire(nodes: Iterable[NodeLike]) -> list[WireNode]:
+    """``[n.model_dump() for n in nodes]``, built iteratively without going through pydantic.
+
+    Dicts are taken to be in wire format already and passed through.
+    """
+    out: list[WireNode] = []
+    stack = [(n, out) for n in reversed(_expand(nodes))]
+    while stack:
+        node, dest = stack.pop()
+        cls = type(node)
+        if cls is str:
+            dest.append({'name': node})
+            continue
+        if isinstance(node, dict):
+            dest.append(node)
+            continue
+        plan = _PLANS[cls] if cls in _PLANS else _plan(cls)
+        try:
+            if plan is None:
+                raise _Unsupported
+            data, kids = _node_items(node, plan)
+        except _Unsupported:
+            dest.append(node.model_dump())
+            continue
+        if kids:
+            data['children'] = children = []
+            stack.extend((c, children) for c in reversed(kids))
+        dest.append(data)
+    return out
+
+
+class _LimitExceeded(Exception):
+    pass
+
+
+def _encode_scalar(value) -> str:
+    cls = type(value)
+    if cls is str:
+        return _encode_str(value)
+    if cls is bool:
+        return _JSON_LITERALS[value]
+    if cls is int or cls is float:
+        return _dumps(value)
+    raise _Unsupported
+
+
+def _node_json(node: Node, plan) -> tuple[str, str, list[Union[Node, str]]]:
+    """``node`` as JSON text split around its children: (text before, text after, children)."""
+    kind, fields = plan
+    if kind == 'url':
+        return ('{"type":"field","attributeId":"URLFieldId","children":[{"dataType":"url","name":'
+                + _encode_str(node.url) + '}]}'), '', []
+    if kind == 'reference':
+        return '{"dataType":"reference","id":' + _encode_scalar_or_null(node.target.nodeId) + '}', '', []
+
+    values = node.__dict__
+    head, tail, kids = [], None, []
+    for name, prefix, field_kind in fields:
+        value = values[name]
+        if value is None:
+            if field_kind == _FILE and node.attachment is not None:
+                (head if tail is None else tail).append((prefix, node.attachment))
+            continue
+        if field_kind == _SCALAR or field_kind == _FILE:
+            text = prefix + (_encode_str(value) if type(value) is str else _encode_scalar(value))
+        elif field_kind == _CHILDREN:
+            kids = value if all(type(c) in _CHILD_TYPES for c in value) else [c for c in value if _is_child(c)]
+            if kids:
+                head.append(prefix + '[')
+                tail = []
+                continue
+            text = prefix + 'null'
+        elif field_kind == _ENUM:
+            text = prefix + _encode_scalar(value.value if type(value) is NodeType else value)
+        else:
+            if any(type(t) is not SuperTag for t in value):
+                raise _Unsupported
+            text = prefix + '[' + ','.join('{"id":' + _encode_str(t.id) + '}' for t in value) + ']'
+        (head if tail is None else tail).append(text)
+    if tail is None:
+        return _join(head, '{', '}'), '', kids
+    return _join(head, '{', ''), _join(tail, '],', '}') if tail else ']}', kids
+
+
+def _join(fields: list, opening: str, closing: str) -> Union[str, list]:
+    """``opening + ','.join(fields) + closing``; a list of text and attachments when a field is an attachment.
+
+    Attachment fields are ``(prefix, attachment)`` pairs; the attachment stays
+    unencoded until the body is assembled.
+    """
+    if all(type(f) is str for f in fields):
+        return opening + ','.join(fields) + closing
+    pieces, text = [], opening
+    for i, field in enumerate(fields):
+        if i:
+            text += ','
+        if type(field) is tuple:
+            pieces += [text + field[0] + '"', field[1]]
+            text = '"'
+        else:
+            text += field
+    pieces.append(text + closing)
+    return pieces
+
+
+def _piece_len(piece: Union[str, Attachment]) -> int:
+    return len(piece) if type(piece) is str else piece.encoded_size
+
+
+def _assemble(parts: list[Union[str, Attachment]]) -> bytes:
+    """Joins the writer's output into the UTF-8 body, base64-encoding attachments straight into it."""
+    if all(type(p) is str for p in parts):
+        return ''.join(parts).encode('utf-8')
+    body, run = io.BytesIO(), []
+    for part in parts:
+        if type(part) is str:
+            run.append(part)
+            continue
+        body.write(''.join(run).encode('utf-8'))
+        run = []
+        for chunk in part.iter_base64():
+            body.write(chunk)
+    body.write(''.join(run).encode('utf-8'))
+    return body.getvalue()
+
+
+def _encode_scalar_or_null(value) -> str:
+    return 'null' if value is None else _encode_scalar(value)
+
+
+def _push_children(stack: list[Any], children: list[NodeLike]) -> int:
+    """Pushes ``children`` and their separators so they pop in order; returns how many were plain strings.
+
+    Plain string children go on as their finished JSON text, which the writer
+    treats like any other literal.
+    """
+    strings = 0
+    for i, child in enumerate(reversed(children)):
+        if type(child) is str:
+            child = '{"name":' + _encode_str(child) + '}'
+            strings += 1
+        stack.extend((',', child) if i else (child,))
+    return strings
+
+
+def _write_nodes(nodes: Iterable[NodeLike], parts: list[Union[str, Attachment]], max_nodes: Optional[int],
+                 max_chars: Optional[int]) -> int:
+    """Appends the JSON array of ``nodes`` to ``parts`` and returns how many nodes it holds.
+
+    File attachments go into ``parts`` unencoded, counted at their encoded size.
+    Raises ``_LimitExceeded`` as soon as either limit is passed.
+    """
+    stack: list[Any] = [']']
+    count = _push_children(stack, _expand(nodes))
+    stack.append('[')
+    chars = 0
+    while stack:
+        item = stack.pop()
+        cls = type(item)
+        if cls is not str and cls is not list:
+            plan = _PLANS[cls] if cls in _PLANS else _plan(cls)
+            try:
+                if plan is None:
+                    raise _Unsupported
+                item, tail, kids = _node_json(item, plan)
+            except _Unsupported:
+                data = item if isinstance(item, dict) else item.model_dump()
+                item, tail, kids, plan = _dumps(data), '', [], None
+                count += count_nodes([data]) - 1
+            count += 1
+            if kids:
+                stack.append(tail)
+                count += _push_children(stack, kids)
+            elif plan is not None and plan[0] == 'url':
+                count += 1  # the url value node inside the field
+        if type(item) is list:
+            parts.extend(item)
+            chars += sum(_piece_len(p) for p in item)
+        else:
+            parts.append(item)
+            chars += len(item)
+        if (max_nodes is not None and count > max_nodes) or (max_chars is not None and chars > max_chars):
+            raise _LimitExceeded
+    return count
+
+
+def encode_nodes(nodes: Iterable[NodeLike]) -> bytes:
+    """UTF-8 JSON of ``to_wire(nodes)``, written directly, compact and with non-ASCII kept as is."""
+    parts = []
+    _write_nodes(nodes, parts, None, None)
+    return _assemble(parts)
+
+
+def encode_request(nodes: Iterable[NodeLike], target_id: Optional[str] = None, max_nodes: int = None,
+                   max_bytes: int = None) -> Optional[tuple[bytes, int]]:
+    """The ``addToNodeV2`` body for ``nodes`` and its node count.
+
+    Byte-for-byte what sending ``TanaBuilder.model_dump()`` produces. Returns
+    None, without finishing the encoding, once the request is over ``max_nodes``
+    nodes or ``max_bytes`` bytes.
+    """
+    parts = ['{"nodes":']
+    try:
+        count = _write_nodes(nodes, parts, max_nodes, max_bytes)
+    except _LimitExceeded:
+        return None
+    if target_id:
+        parts.append(f',"targetNodeId":{_encode_str(target_id)}')
+    parts.append('}')
+    if max_bytes is not None and sum(_piece_len(p) for p in parts) > max_bytes:
+        return None
+    body = _assemble(parts)
+    if max_bytes is not None and len(body) > max_bytes:
+        return None
+    return body, count
+
+
+if __name__ == '__main__':
+    import random
+    import sys
+    import timeit
+
+    from ._nodes import CheckboxNode, DateNode, FieldNode, PlainNode
+
+    def build_tree(n_nodes: int, seed: int = 0) -> list[Node]:
+        rng = random.Random(seed)
+        roots: list[Node] = []
+        parents: list[Node] = []
+        for i in range(n_nodes):
+            kind = rng.random()
+            if kind < 0.6:
+                node = PlainNode(name=f'line {i} – “quoted” ✓', description='d' if i % 7 == 0 else None,
+                                 supertags=[{'id': 'tag'}] if i % 11 == 0 else None)
+            elif kind < 0.7:
+                node = CheckboxNode(name=f'todo {i}', value=bool(i % 2))
+            elif kind < 0.8:
+                node = URLNode(url=f'https://example.com/{i}')
+            elif kind < 0.9:
+                node = DateNode(name=f'[[date:2024-01-{i % 28 + 1:02d}]]')
+            else:
+                node = FieldNode(attributeId='attr')(f'value {i}')
+            parent = rng.choice(parents) if parents and rng.random() < 0.9 else None
+            if parent is None:
+                roots.append(node)
+            else:
+                parent.children.append(node)
+            if node.children is None and isinstance(node, PlainNode):
+                node.children = []
+                parents.append(node)
+        return roots
+
+    def via_pydantic(nodes):
+        return json.dumps({'nodes': [n.model_dump(exclude_none=True) for n in nodes], 'targetNodeId': 'INBOX'},
+                          separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    for size in [int(a) for a in sys.argv[1:]] or [100, 1_000, 10_000]:
+        tree = build_tree(size)
+        assert encode_request(tree, 'INBOX')[0] == via_pydantic(tree)
+        runs = max(1, 20_000 // size)
+        slow = min(timeit.repeat(lambda: via_pydantic(tree), number=runs, repeat=3)) / runs
+        wire = min(timeit.repeat(lambda: _dumps({'nodes': to_wire(tree), 'targetNodeId': 'INBOX'}).encode('utf-8'),
+                                 number=runs, repeat=3)) / runs
+        fast = min(timeit.repeat(lambda: encode_request(tree, 'INBOX'), number=runs, repeat=3)) / runs
+        print(f'{size:>7,} nodes   model_dump+json {slow * 1000:8.2f} ms   to_wire+json {wire * 1000:8.2f} ms '
+              f'({slow / wire:4.1f}x)   encode_request {fast * 1000:8.2f} ms ({slow / fast:4.1f}x)')
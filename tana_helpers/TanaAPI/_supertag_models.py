@@ -1,12 +1,19 @@
+from typing import TYPE_CHECKING
+
 from pydantic_core import ValidationError
 
 from ._nodes import *
 
+if TYPE_CHECKING:
+    from ._resolver import NodeResolver
+
 
 class SupertagField:
-    def __init__(self, field_id: str, field_type: NodeType = NodeType.plain):
+    def __init__(self, field_id: str, field_type: NodeType = NodeType.plain, resolver: "NodeResolver" = None):
         self.type = field_type
         self.node = FieldNode(attributeId=field_id)
+        # with a resolver, string references are names rather than nodeIds
+        self.resolver = resolver
 
     def __set_name__(self, owner, name):
         self.private_name = f'_field_{name}'
@@ -23,7 +30,7 @@ class SupertagField:
             self.__set__(instance, [])
             return getattr(instance, self.private_name)
 
-    def _make_child(self, value):
+    def _make_child(self, value, references: dict[str, str] = None):
         match (self.type, value):
             case (NodeType.plain, str()):
                 return PlainNode(name=value)
@@ -31,6 +38,8 @@ class SupertagField:
                 return value
             case (NodeType.plain, _):
                 return PlainNode(name=str(value))
+            case (NodeType.reference, str()) if references is not None:
+                return ReferenceNode(target=PlainNode(name=value, nodeId=references[value]))
             case (NodeType.reference, str()):
                 return ReferenceNode(target=PlainNode(nodeId=value, name=''))
             case (NodeType.reference, Node()):
@@ -39,7 +48,13 @@ class SupertagField:
                 return PlainNode(name=value, dataType=self.type.value)
 
     def resolve_field(self, instance) -> FieldNode:
-        self.node.children = [self._make_child(v) for v in getattr(instance, self.private_name, [])]
+        values = getattr(instance, self.private_name, [])
+        references = None
+        if self.type == NodeType.reference and self.resolver is not None:
+            # every named reference in one lookup, and any new ones in one submit
+            from ._resolver import REFERENCE
+            references = self.resolver.resolve_many(REFERENCE, [v for v in values if isinstance(v, str)])
+        self.node.children = [self._make_child(v, references) for v in values]
         return self.node
 
 
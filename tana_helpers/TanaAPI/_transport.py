@@ -0,0 +1,131 @@
+import gzip
+import json
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, Union
+
+if TYPE_CHECKING:
+    import requests
+
+Body = Union[dict, bytes]
+
+
+@dataclass
+class TransportStats:
+    requests: int = 0
+    new_connections: int = 0
+    bytes_sent: int = 0
+    bytes_uncompressed: int = 0
+    # filled in by the clients, which know what the bodies hold and how long they took to build
+    nodes_sent: int = 0
+    serialize_seconds: float = 0.0
+
+    @property
+    def reused_connections(self) -> int:
+        return max(self.requests - self.new_connections, 0)
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused_connections / self.requests if self.requests else 0.0
+
+
+class Transport(ABC):
+    """Sends a JSON body to the Tana API and returns the raw response.
+
+    Subclass this to plug in a different HTTP stack; ``Tana`` only ever calls ``post``.
+    """
+    def __init__(self):
+        self.stats = TransportStats()
+
+    @abstractmethod
+    def post(self, url: str, headers: dict[str, str], body: Body) -> "requests.Response":
+        ...
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def encode_body(body: Body) -> bytes:
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            return bytes(body)
+        return json.dumps(body, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class PooledTransport(Transport):
+    """A keep-alive ``requests.Session`` with a bounded connection pool.
+
+    The session lives as long as the transport, so a module-level instance is
+    reused across warm Lambda invocations and skips the TCP/TLS handshake.
+    """
+    def __init__(self, pool_connections: int = 2, pool_maxsize: int = 10, connect_timeout: float = 5.0,
+                 read_timeout: float = 60.0, gzip_body: bool = False, gzip_min_size: int = 1024):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        super().__init__()
+        self.timeout = (connect_timeout, read_timeout)
+        self.gzip_body = gzip_body
+        self.gzip_min_size = gzip_min_size
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                    max_retries=0, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self._stats_lock = threading.Lock()
+        self._count_new_connections()
+
+    def _count_new_connections(self):
+        # count connections as urllib3 opens them, so threads sharing the transport can't see each other's
+        poolmanager = self._adapter.poolmanager
+        stats, lock = self.stats, self._stats_lock
+
+        def counting(pool_cls):
+            class CountingPool(pool_cls):
+                def _new_conn(self):
+                    with lock:
+                        stats.new_connections += 1
+                    return super()._new_conn()
+            return CountingPool
+
+        poolmanager.pool_classes_by_scheme = {scheme: counting(pool_cls)
+                                              for scheme, pool_cls in poolmanager.pool_classes_by_scheme.items()}
+
+    def post(self, url: str, headers: dict[str, str], body: Body) -> "requests.Response":
+        data = self.encode_body(body)
+        raw_size = len(data)
+        headers = dict(headers)
+        if self.gzip_body and raw_size >= self.gzip_min_size:
+            data = gzip.compress(data, compresslevel=6)
+            headers['Content-Encoding'] = 'gzip'
+
+        resp = self.session.post(url, headers=headers, data=data, timeout=self.timeout)
+
+        with self._stats_lock:
+            self.stats.requests += 1
+            self.stats.bytes_sent += len(data)
+            self.stats.bytes_uncompressed += raw_size
+        return resp
+
+    def close(self):
+        self.session.close()
+
+
+_DEFAULT_TRANSPORT: Optional[Transport] = None
+_DEFAULT_TRANSPORT_LOCK = threading.Lock()
+
+
+def get_default_transport() -> Transport:
+    global _DEFAULT_TRANSPORT
+    if _DEFAULT_TRANSPORT is None:
+        with _DEFAULT_TRANSPORT_LOCK:
+            if _DEFAULT_TRANSPORT is None:
+                _DEFAULT_TRANSPORT = PooledTransport()
+    return _DEFAULT_TRANSPORT
+
+
+def set_default_transport(transport: Transport) -> Transport:
+    global _DEFAULT_TRANSPORT
+    with _DEFAULT_TRANSPORT_LOCK:
+        _DEFAULT_TRANSPORT = transport
+    return transport
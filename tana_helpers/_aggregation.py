@@ -0,0 +1,209 @@
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Optional
+
+from _helper_fxns import PASTE_FIELD, PASTE_PLAIN, PasteToken, iter_paste_outline, paste_token
+
+OPERATIONS = ('sum', 'count', 'mean', 'min', 'max')
+GROUP_PARENT = 'parent'
+GROUP_SUPERTAG_PREFIX = 'supertag:'
+MEAN_PLACES = Decimal('0.0001')
+
+# an optional minus, up to three characters of currency ("-$", "USD "), then the number with thousands separators
+_NUMBER = re.compile(r'(-)?[^\d.\-]{0,3}?(\d[\d,]*(?:\.\d+)?|\.\d+)')
+
+
+def parse_number(text: str) -> Optional[Decimal]:
+    match = _NUMBER.search(text)
+    if match is None:
+        return None
+    try:
+        number = Decimal(match[2].replace(',', ''))
+    except InvalidOperation:
+        return None
+    return -number if match[1] else number
+
+
+def format_number(number: Decimal) -> str:
+    text = f'{number:f}'
+    return text.rstrip('0').rstrip('.') if '.' in text else text
+
+
+class Aggregate:
+    """Running totals for one field within one group."""
+    __slots__ = ('count', 'numbers', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.numbers = 0
+        self.total = Decimal(0)
+        self.min: Optional[Decimal] = None
+        self.max: Optional[Decimal] = None
+
+    def add(self, number: Optional[Decimal]):
+        self.count += 1
+        if number is None:
+            return
+        self.numbers += 1
+        self.total += number
+        if self.min is None or number < self.min:
+            self.min = number
+        if self.max is None or number > self.max:
+            self.max = number
+
+    def result(self, operation: str) -> Optional[Decimal]:
+        if operation == 'sum':
+            return self.total
+        if operation == 'count':
+            return Decimal(self.count)
+        if operation == 'mean':
+            return (self.total / self.numbers).quantize(MEAN_PLACES) if self.numbers else None
+        if operation == 'min':
+            return self.min
+        if operation == 'max':
+            return self.max
+        raise ValueError(f'Unknown operation: {operation}')
+
+
+def aggregate(lines: Iterable[str], fields: Iterable[str], group_by: str = None) -> dict[str, dict[str, Aggregate]]:
+    """Aggregates the values of ``fields`` in Tana Paste ``lines``, in one pass.
+
+    A field's values are its inline value and the nodes directly under it;
+    ``count`` counts all of them and the other operations the ones that hold a
+    number. ``group_by`` is None for a single group named '', ``'parent'`` to
+    group by the name of the node each field is on (its direct parent, e.g.
+    each PO line, not the order the line is under), or ``'supertag:<tag>'`` to
+    group by the nearest ancestor with that supertag (by name or id), leaving
+    out values that have none; use the latter to roll values up to a
+    higher-level node. Only the running totals and the stack of current
+    ancestors are kept while reading.
+    """
+    fields = set(fields)
+    by_parent = group_by == GROUP_PARENT
+    tag, top_group = None, ''
+    if group_by is not None and not by_parent:
+        if not group_by.startswith(GROUP_SUPERTAG_PREFIX):
+            raise ValueError(f'Unknown grouping: {group_by}')
+        tag, top_group = group_by[len(GROUP_SUPERTAG_PREFIX):], None
+
+    groups: dict[str, dict[str, Aggregate]] = {}
+    parent_names: dict[str, str] = {}
+
+    def add(group: Optional[str], field: str, value: PasteToken):
+        if group is None:
+            return
+        if by_parent:
+            # parent lines are only tokenized once a value turns up under them
+            name = parent_names.get(group)
+            if name is None:
+                name = parent_names[group] = paste_token(0, group).name
+            group = name
+        totals = groups.setdefault(group, {})
+        running = totals.get(field)
+        if running is None:
+            running = totals[field] = Aggregate()
+        running.add(parse_number(value.name) if value.kind == PASTE_PLAIN else None)
+
+    # (indent, group, field) for each ancestor of the current line; field is set on lines of watched fields.
+    # Lines are only tokenized when they can be a field, a value or a group.
+    stack: list[tuple[int, Optional[str], Optional[str]]] = []
+    for indent, text in iter_paste_outline(lines):
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        parent_indent, group, parent_field = stack[-1] if stack else (-1, top_group, None)
+
+        if parent_field is not None:
+            add(group, parent_field, paste_token(indent, text))
+        if '::' in text:
+            token = paste_token(indent, text)
+            if token.kind == PASTE_FIELD:
+                field = token.name if token.name in fields else token.node_id if token.node_id in fields else None
+                if field is not None and token.value is not None:
+                    add(group, field, token.value)
+                stack.append((indent, group, field))
+                continue
+
+        if by_parent:
+            group = text
+        elif tag is not None and '#' in text:
+            token = paste_token(indent, text)
+            if any(tag in (name, node_id) for name, node_id, _ in token.supertags):
+                group = token.name
+        stack.append((indent, group, None))
+    return groups
+
+
+def parse_query(params: dict[str, list[str]]) -> tuple[dict[str, list[str]], Optional[str]]:
+    """Reads ``?sum=Total&mean=Unit Price,Quantity&group=parent`` (API Gateway's multiValueQueryStringParameters)."""
+    fields: dict[str, list[str]] = {}
+    for operation in OPERATIONS:
+        for value in params.get(operation) or []:
+            for field in value.split(','):
+                field = field.strip()
+                if field and operation not in fields.setdefault(field, []):
+                    fields[field].append(operation)
+    if not fields:
+        raise ValueError(f'Name at least one field to aggregate, e.g. ?sum=Total; operations: {", ".join(OPERATIONS)}')
+    group_by = (params.get('group') or [None])[-1]
+    if group_by is not None and group_by != GROUP_PARENT and not group_by.startswith(GROUP_SUPERTAG_PREFIX):
+        raise ValueError(f'group must be {GROUP_PARENT} or {GROUP_SUPERTAG_PREFIX}<name>, not {group_by}')
+    return fields, group_by
+
+
+def to_paste(groups: dict[str, dict[str, Aggregate]], fields: dict[str, list[str]], grouped=True) -> str:
+    lines = ['%%tana%%']
+    indent = '  ' if grouped else ''
+    for group, totals in groups.items():
+        if grouped:
+            lines.append(f'- {group}')
+        for field, operations in fields.items():
+            running = totals.get(field)
+            if running is None:
+                continue
+            for operation in operations:
+                result = running.result(operation)
+                if result is not None:
+                    lines.append(f'{indent}- {field} ({operation}):: {format_number(result)}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import random
+    import sys
+    import time
+    import tracemalloc
+
+    from _helper_fxns import iter_event_lines
+
+    def synthetic_body(n_orders: int) -> str:
+        # the shape Tana sends for a purchase-order view, escaped the way it arrives in the event
+        rng = random.Random(0)
+        lines = []
+        for order in range(n_orders):
+            lines.append(f'- Purchase Order #{order} (Supplier {order % 37}) #[[purchase order]]')
+            lines.append(f'  - Supplier:: [[Supplier {order % 37}^id{order % 37}]]')
+            lines.append(f'  - Date:: [[date:2024-04-{order % 28 + 1:02d}]]')
+            lines.append('  - Lines')
+            for line in range(rng.randrange(1, 6)):
+                quantity, price = rng.randrange(1, 20), rng.randrange(100, 500_000) / 100
+                lines.append(f'    - Item {line} #[[po line]]')
+                lines.append(f'      - Quantity:: {quantity}')
+                lines.append(f'      - Unit Price:: ${price:,.2f}')
+                lines.append(f'      - Total:: ${quantity * price:,.2f}')
+        return '"' + '\\n'.join(lines) + '\\n"'
+
+    fields = {'Total': list(OPERATIONS), 'Quantity': ['sum', 'mean'], 'Unit Price': ['min', 'max']}
+    for n_orders in [int(a) for a in sys.argv[1:]] or [5_000, 20_000]:
+        event = {'body': synthetic_body(n_orders)}
+        size_mb = len(event['body']) / 1e6
+        for group_by in [None, GROUP_PARENT, 'supertag:purchase order']:
+            start = time.perf_counter()
+            groups = aggregate(iter_event_lines(event), fields, group_by)
+            elapsed = time.perf_counter() - start
+            tracemalloc.start()
+            aggregate(iter_event_lines(event), fields, group_by)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'{size_mb:5.1f} MB  group {str(group_by):25s} {elapsed:6.2f} s  {size_mb / elapsed:5.2f} MB/s  '
+                  f'{len(groups):>6,} groups  peak {peak / 1024:8.0f} KiB')
+        print(to_paste(aggregate(iter_event_lines(event), fields), fields, grouped=False))
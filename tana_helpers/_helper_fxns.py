@@ -1,46 +1,323 @@
-from TanaAPI import Node, FieldNode, SuperTag, CheckboxNode, ReferenceNode, URLNode, DateNode, DummyNode
+import re
+from typing import TYPE_CHECKING, Iterable, Iterator, NamedTuple, Optional, Union
+
+if TYPE_CHECKING:
+    from TanaAPI import Node, NodeResolver
+
+# PasteToken kinds, named after the dataType of the node each one becomes
+PASTE_PLAIN = 'plain'
+PASTE_FIELD = 'field'
+PASTE_CHECKBOX = 'boolean'
+PASTE_DATE = 'date'
+PASTE_REFERENCE = 'reference'
+PASTE_URL = 'url'
+
+# line breaks in a Lambda event body arrive escaped once or twice
+_EVENT_LINE_BREAK = re.compile(r'\\\\n|\\n|\n')
+_TAG_WORD = re.compile(r'[\w-]+')
+_URL_TEXT = re.compile(r'\[([^\]]*)\]\(([^)\s]+)\)')
 
 
 def format_event_body(event) -> str:
     return event['body'].strip('"').replace(r'\\n', '\n').replace(r'\n', '\n')
 
 
-def _node_to_markup_formatter(root_node: Node, tag_field_names: dict[str, str]) -> list[str]:
-    out_lines = []
-    child_offset = '  '
-    if isinstance(root_node, ReferenceNode):
+def iter_event_lines(event) -> Iterator[str]:
+    """The lines of ``format_event_body(event)``, found in a single scan of the body instead of copying it."""
+    body = event['body']
+    start, end = 0, len(body)
+    while start < end and body[start] == '"':
+        start += 1
+    while end > start and body[end - 1] == '"':
+        end -= 1
+    for match in _EVENT_LINE_BREAK.finditer(body, start, end):
+        yield body[start:match.start()]
+        start = match.end()
+    yield body[start:end]
+
+
+def iter_markup_lines(root_node: "Node", tag_field_names: dict[str, str]) -> Iterator[str]:
+    """Yields the markup for ``root_node`` line by line, depth first, without recursing."""
+    # imported here so handlers that only need format_event_body (po_sums) never load pydantic
+    from TanaAPI import Node, FieldNode, CheckboxNode, ReferenceNode, URLNode, DateNode, DummyNode
+
+    indents = ['']
+    stack = [(root_node, 0)]
+    while stack:
+        node, depth = stack.pop()
+        child_depth = depth + 1
+        if isinstance(node, ReferenceNode):
+            line = f'- [[{node.name or ""}^{node.target}]]'
+        elif isinstance(node, CheckboxNode):
+            line = f'- [{"x" if node.value else " "}] {node.name}'
+        elif isinstance(node, FieldNode):
+            line = f'- [[{tag_field_names.get(node.attributeId, "")}^{node.attributeId}]]::'
+        elif isinstance(node, URLNode):
+            line = f'- [{node.name or node.url}]({node.url})'
+        elif isinstance(node, DateNode):
+            line = f'- [[date:{node.name}]]'
+        elif isinstance(node, DummyNode):
+            line = ''
+            child_depth = depth
+        elif isinstance(node, Node):
+            line = f'- {node.name}'
+        else:
+            raise ValueError(f'Unknown node type: {type(node)}')
+
+        for cur_supertag in node.supertags or []:
+            supertag_name = tag_field_names.get(cur_supertag.id, '')
+            line = f'{line} #[[{supertag_name}^{cur_supertag.id}]]'
+
+        if line:
+            yield indents[depth] + line
+
+        children = node.children
+        if children:
+            if child_depth == len(indents):
+                indents.append(indents[-1] + '  ')
+            stack.extend((child, child_depth) for child in reversed(children))
+
+
+def node_to_markup(root_node: "Node", tag_field_names: dict[str, str], include_tana=False) -> str:
+    lines = iter_markup_lines(root_node, tag_field_names)
+    if include_tana:
+        return '\n'.join(['%%tana%%', *lines])
+    else:
+        return '\n'.join(lines)
+
+
+class PasteToken(NamedTuple):
+    """One line of Tana Paste.
+
+    ``indent`` is the line's raw indentation width. ``node_id`` is the
+    ``^nodeId`` of a field or reference, and ``value`` is a checkbox's state, a
+    URL, or the token for a field's inline value. ``supertags`` holds a
+    ``(name, node_id, text)`` triple for each trailing tag.
+    """
+    indent: int
+    kind: str
+    name: str
+    node_id: Optional[str] = None
+    value: Union[bool, str, 'PasteToken', None] = None
+    supertags: tuple[tuple[str, Optional[str], str], ...] = ()
+
+
+def iter_paste_lines(source: Union[str, Iterable[str]]) -> Iterator[str]:
+    """Splits text, or text arriving in chunks of any size (a file, a response stream), into lines."""
+    if isinstance(source, str):
+        source = (source,)
+    pending = []
+    for chunk in source:
+        lines = chunk.split('\n')
+        if len(lines) == 1:
+            pending.append(chunk)
+            continue
+        pending.append(lines[0])
+        yield ''.join(pending)
+        yield from lines[1:-1]
+        pending = [lines[-1]]
+    yield ''.join(pending)
+
+
+def _split_ref(text: str) -> tuple[str, Optional[str]]:
+    name, sep, node_id = text.rpartition('^')
+    return (name, node_id) if sep else (text, None)
+
+
+def _split_supertags(text: str) -> tuple[str, tuple[tuple[str, Optional[str], str], ...]]:
+    tags = []
+    while True:
+        if text.endswith(']]'):
+            start = text.rfind(' #[[')
+            if start < 0 or ']]' in text[start + 4:-2]:
+                break
+            tags.append((*_split_ref(text[start + 4:-2]), text[start + 1:]))
+        else:
+            start = text.rfind(' #')
+            if start < 0 or not _TAG_WORD.fullmatch(text, start + 2):
+                break
+            tags.append((text[start + 2:], None, text[start + 1:]))
+        text = text[:start].rstrip()
+    tags.reverse()
+    return text, tuple(tags)
+
+
+def paste_token(indent: int, text: str) -> PasteToken:
+    """The token for one line's ``text``, with its indentation and bullet already removed."""
+    field_name, sep, value = text.partition('::')
+    if sep and field_name and not value[:1].strip():
+        name, node_id = (_split_ref(field_name[2:-2]) if field_name.startswith('[[') and field_name.endswith(']]')
+                         else (field_name, None))
+        value = value.strip()
+        return PasteToken(indent, PASTE_FIELD, name, node_id, paste_token(indent, value) if value else None)
+
+    text, supertags = _split_supertags(text)
+    if text[:1] == '[':
+        if text[:3] in ('[ ]', '[x]', '[X]') and text[3:4] in ('', ' '):
+            return PasteToken(indent, PASTE_CHECKBOX, text[4:], value=text[1] != ' ', supertags=supertags)
+        if text.startswith('[[') and text.find(']]') == len(text) - 2:
+            inner = text[2:-2]
+            if inner.startswith('date:'):
+                return PasteToken(indent, PASTE_DATE, inner[5:], supertags=supertags)
+            return PasteToken(indent, PASTE_REFERENCE, *_split_ref(inner), supertags=supertags)
+        url = _URL_TEXT.fullmatch(text)
+        if url:
+            return PasteToken(indent, PASTE_URL, url[1], value=url[2], supertags=supertags)
+    return PasteToken(indent, PASTE_PLAIN, text, supertags=supertags)
+
+
+def iter_paste_outline(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
+    """``(indent, text)`` for each Tana Paste line, without its bullet; blank lines and ``%%tana%%`` headers are skipped."""
+    for line in lines:
+        text = line.lstrip()
+        if not text:
+            continue
+        indent = len(line) - len(text)
+        text = text.rstrip()
+        if text == '%%tana%%':
+            continue
+        if text.startswith('- '):
+            text = text[2:]
+        elif text == '-':
+            text = ''
+        yield indent, text
+
+
+def iter_paste_tokens(lines: Iterable[str]) -> Iterator[PasteToken]:
+    """Tokenizes Tana Paste a line at a time."""
+    for indent, text in iter_paste_outline(lines):
+        yield paste_token(indent, text)
+
+
+def parse_tana_paste(source: Union[str, Iterable[str]], resolver: "NodeResolver" = None,
+                     create=False) -> list["Node"]:
+    """Builds the node trees written in Tana Paste ``source``, text or an iterable of text chunks.
+
+    Fields, supertags and references written with a ``^nodeId`` keep it. The
+    ones written by name alone are looked up in ``resolver``, all names of a
+    kind at once, and created in Tana when ``create`` is set. Names that stay
+    unknown are kept as text: ``Name::`` nodes, ``[[Name]]`` nodes and ``#tag``
+    at the end of the name.
+    """
+    from TanaAPI import (CheckboxNode, DateNode, FieldNode, PlainNode, ReferenceNode, SuperTag, URLNode,
+                         build_outline)
+    from TanaAPI._resolver import FIELD, REFERENCE, SUPERTAG
+
+    tokens = iter_paste_tokens(iter_paste_lines(source))
+    known = {FIELD: {}, SUPERTAG: {}, REFERENCE: {}}
+    if resolver is not None:
+        tokens = list(tokens)
+        wanted = {FIELD: {}, SUPERTAG: {}, REFERENCE: {}}
+        for token in tokens:
+            while token is not None:
+                if token.kind in (PASTE_FIELD, PASTE_REFERENCE) and token.node_id is None:
+                    wanted[FIELD if token.kind == PASTE_FIELD else REFERENCE][token.name] = None
+                wanted[SUPERTAG].update((name, None) for name, node_id, _ in token.supertags if node_id is None)
+                token = token.value if token.kind == PASTE_FIELD else None
+        for kind, names in wanted.items():
+            if names:
+                known[kind] = resolver.resolve_many(kind, names) if create else resolver.prefetch(kind, names)
+
+    def make(token: PasteToken) -> "Node":
+        name, fields = token.name, {}
+        for tag_name, tag_id, tag_text in token.supertags:
+            tag_id = tag_id or known[SUPERTAG].get(tag_name)
+            if tag_id:
+                fields.setdefault('supertags', []).append(SuperTag.model_construct(id=tag_id))
+            else:
+                name = f'{name} {tag_text}'
+
+        kind = token.kind
+        if kind == PASTE_FIELD:
+            if token.value is not None:
+                fields['children'] = [make(token.value)]
+            attribute_id = token.node_id or known[FIELD].get(name)
+            if attribute_id:
+                return FieldNode.model_construct(attributeId=attribute_id, **fields)
+            return PlainNode.model_construct(name=f'{name}::', **fields)
+        if kind == PASTE_REFERENCE:
+            node_id = token.node_id or known[REFERENCE].get(name)
+            if node_id:
+                return ReferenceNode.model_construct(target=PlainNode.model_construct(name=name, nodeId=node_id),
+                                                     **fields)
+            return PlainNode.model_construct(name=f'[[{name}]]', **fields)
+        if kind == PASTE_CHECKBOX:
+            return CheckboxNode.model_construct(name=name, value=token.value, **fields)
+        if kind == PASTE_DATE:
+            return DateNode.model_construct(name=name, **fields)
+        if kind == PASTE_URL:
+            return URLNode.model_construct(url=token.value, name=name, **fields)
+        return PlainNode.model_construct(name=name, **fields)
+
+    # raw indentation widths work as levels: a line goes under the nearest line indented less than it
+    return build_outline(tokens, lambda token: (token.indent, make(token)))
+
+
+if __name__ == '__main__':
+    import sys
+    import timeit
+
+    import TanaAPI as tapi
+
+    def recursive_markup(root_node, tag_field_names) -> list[str]:
+        # the previous renderer: one call per node, re-prefixing every descendant line at every level
+        child_offset = '  '
+        if isinstance(root_node, tapi.ReferenceNode):
             line = f'- [[{root_node.name or ""}^{root_node.target}]]'
-    elif isinstance(root_node, CheckboxNode):
+        elif isinstance(root_node, tapi.CheckboxNode):
             line = f'- [{"x" if root_node.value else " "}] {root_node.name}'
-    elif isinstance(root_node, FieldNode):
+        elif isinstance(root_node, tapi.FieldNode):
             line = f'- [[{tag_field_names.get(root_node.attributeId, "")}^{root_node.attributeId}]]::'
-    elif isinstance(root_node, URLNode):
-        line = f'- [{root_node.name or root_node.url}]({root_node.url})'
-    elif isinstance(root_node, DateNode):
-        line = f'- [[date:{root_node.name}]]'
-    elif isinstance(root_node, DummyNode):
-        line = ''
-        child_offset = ''
-    elif isinstance(root_node, Node):
+        elif isinstance(root_node, tapi.URLNode):
+            line = f'- [{root_node.name or root_node.url}]({root_node.url})'
+        elif isinstance(root_node, tapi.DateNode):
+            line = f'- [[date:{root_node.name}]]'
+        elif isinstance(root_node, tapi.DummyNode):
+            line, child_offset = '', ''
+        else:
             line = f'- {root_node.name}'
-    else:
-        raise ValueError(f'Unknown node type: {type(root_node)}')
+        for cur_supertag in root_node.supertags or []:
+            line = f'{line} #[[{tag_field_names.get(cur_supertag.id, "")}^{cur_supertag.id}]]'
+        out_lines = [line] if line else []
+        for child_node in root_node.children or []:
+            out_lines.extend([child_offset + l for l in recursive_markup(child_node, tag_field_names)])
+        return out_lines
 
-    for cur_supertag in root_node.supertags or []:
-        supertag_name = tag_field_names.get(cur_supertag.id, '')
-        line = f'{line} #[[{supertag_name}^{cur_supertag.id}]]'
+    def deep_tree(depth: int) -> tapi.Node:
+        root = cur = tapi.PlainNode(name='level 0', children=[])
+        for i in range(1, depth):
+            cur.children.append(nxt := tapi.PlainNode(name=f'level {i}', children=[]))
+            cur.children.append(tapi.CheckboxNode(name=f'todo {i}', value=bool(i % 2)))
+            cur = nxt
+        return root
 
-    if line:
-        out_lines.append(line)
+    def wide_tree(width: int) -> tapi.Node:
+        return tapi.PlainNode(name='root', supertags=[tapi.SuperTag(id='tag')], children=[
+            tapi.PlainNode(name=f'item {i}', children=[tapi.DateNode(name='2024-01-01'), tapi.DummyNode(children=[
+                tapi.PlainNode(name=f'detail {i}')])]) for i in range(width)])
 
-    for child_node in root_node.children or []:
-        child_lines = [child_offset + l for l in _node_to_markup_formatter(child_node, tag_field_names)]
-        out_lines.extend(child_lines)
+    sys.setrecursionlimit(10_000)
+    for label, tree in [('deep 500', deep_tree(500)), ('deep 2,000', deep_tree(2_000)),
+                        ('wide 10,000', wide_tree(10_000))]:
+        assert node_to_markup(tree, {}) == '\n'.join(recursive_markup(tree, {}))
+        old = min(timeit.repeat(lambda: recursive_markup(tree, {}), number=3, repeat=3)) / 3
+        new = min(timeit.repeat(lambda: node_to_markup(tree, {}), number=3, repeat=3)) / 3
+        print(f'{label:12s} recursive {old * 1000:8.1f} ms   iterative {new * 1000:8.1f} ms   ({old / new:5.1f}x)')
 
-    return out_lines
+    sys.setrecursionlimit(1_000)
+    too_deep = deep_tree(5_000)
+    try:
+        recursive_markup(too_deep, {})
+    except RecursionError:
+        print(f'deep 5,000   recursive RecursionError   iterative '
+              f'{len(node_to_markup(too_deep, {}).splitlines()):,} lines')
 
-def node_to_markup(root_node: Node, tag_field_names: dict[str, str], include_tana=False) -> str:
-    if include_tana:
-        return '\n'.join(['%%tana%%'] + _node_to_markup_formatter(root_node, tag_field_names))
-    else:
-        return '\n'.join(_node_to_markup_formatter(root_node, tag_field_names))
+    for size in [2_500, 10_000]:
+        markup = node_to_markup(wide_tree(size), {'tag': 'Tag'}, include_tana=True)
+        assert node_to_markup(parse_tana_paste(markup)[0], {'tag': 'Tag'}, include_tana=True) == markup
+        tokenize = min(timeit.repeat(lambda: sum(1 for _ in iter_paste_tokens(iter_paste_lines(markup))),
+                                     number=1, repeat=3))
+        parse = min(timeit.repeat(lambda: parse_tana_paste(markup), number=1, repeat=3))
+        lines = markup.count('\n') + 1
+        print(f'paste {lines:>7,} lines   tokenize {tokenize * 1000:7.1f} ms   parse {parse * 1000:7.1f} ms   '
+              f'({parse / lines * 1e6:.1f} us/line)')
@@ -0,0 +1,150 @@
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+NAMESPACE_ENV = 'TanaMetricsNamespace'
+PAYLOAD_SAMPLE_ENV = 'TanaPayloadSampleRate'
+DEBUG_ENV = 'TanaDebug'
+DEFAULT_NAMESPACE = 'TanaHelpers'
+
+MILLISECONDS = 'Milliseconds'
+COUNT = 'Count'
+BYTES = 'Bytes'
+
+# client counter -> (metric, unit, scale), diffed around each invocation
+_CLIENT_METRICS = {
+    'requests': ('Requests', COUNT, 1),
+    'nodes_sent': ('NodesSent', COUNT, 1),
+    'bytes_sent': ('BytesSent', BYTES, 1),
+    'serialize_seconds': ('RequestSerializeTime', MILLISECONDS, 1000),
+    'wait_seconds': ('RateLimitWaitTime', MILLISECONDS, 1000),
+    'send_seconds': ('NetworkTime', MILLISECONDS, 1000),
+    'retries': ('Retries', COUNT, 1),
+    'throttled': ('Throttled', COUNT, 1),
+}
+
+_CURRENT: ContextVar[Optional['Metrics']] = ContextVar('tana_metrics', default=None)
+_cold_start = True
+
+
+class Metrics:
+    """Timings and counts for one invocation, written out as one CloudWatch Embedded Metric Format line."""
+    def __init__(self, handler: str, namespace: str = None):
+        self.handler = handler
+        self.namespace = namespace or os.environ.get(NAMESPACE_ENV, DEFAULT_NAMESPACE)
+        self.values: dict[str, float] = {}
+        self.units: dict[str, str] = {}
+        self.properties: dict[str, object] = {}
+
+    def add(self, name: str, value: float, unit: str = COUNT):
+        self.values[name] = self.values.get(name, 0) + value
+        self.units[name] = unit
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000, MILLISECONDS)
+
+    def to_emf(self) -> dict:
+        return {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [['Handler']],
+                    'Metrics': [{'Name': name, 'Unit': self.units[name]} for name in self.values],
+                }],
+            },
+            'Handler': self.handler,
+            **self.properties,
+            **{name: round(value, 3) for name, value in self.values.items()},
+        }
+
+
+def current_metrics() -> Optional[Metrics]:
+    return _CURRENT.get()
+
+
+def span(name: str):
+    """Times the block into the current invocation's metrics, if there are any."""
+    metrics = _CURRENT.get()
+    return metrics.span(name) if metrics is not None else nullcontext()
+
+
+def add(name: str, value: float, unit: str = COUNT):
+    metrics = _CURRENT.get()
+    if metrics is not None:
+        metrics.add(name, value, unit)
+
+
+def _client_counters() -> dict[str, float]:
+    # only if a handler already loaded the client: light handlers never import it
+    tapi = sys.modules.get('TanaAPI') or sys.modules.get('tana_helpers.TanaAPI')
+    return tapi.client_counters() if tapi is not None else {}
+
+
+def should_log_payload() -> bool:
+    """Full payloads are only logged with ``TanaDebug`` set, or for a ``TanaPayloadSampleRate`` share of calls."""
+    if os.environ.get(DEBUG_ENV):
+        return True
+    try:
+        rate = float(os.environ.get(PAYLOAD_SAMPLE_ENV) or 0)
+    except ValueError:
+        return False
+    if rate <= 0:
+        return False
+    import random
+    return random.random() < rate
+
+
+def instrumented(handler: Callable) -> Callable:
+    """Wraps a ``lambda_handler`` so each call prints one EMF line with its timings and Tana client usage.
+
+    Handlers add their own stages with ``span('Decode')`` etc.
+    """
+    name = handler.__module__
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        global _cold_start
+        metrics = Metrics(name)
+        metrics.add('ColdStart', int(_cold_start))
+        _cold_start = False
+        request_id = getattr(context, 'aws_request_id', None)
+        if request_id:
+            metrics.properties['RequestId'] = request_id
+        if should_log_payload():
+            print(json.dumps({'Handler': name, 'RequestId': request_id, 'Payload': event}, default=str))
+
+        token = _CURRENT.set(metrics)
+        before = _client_counters()
+        try:
+            with metrics.span('Duration'):
+                response = handler(event, context)
+            if isinstance(response, dict) and 'statusCode' in response:
+                metrics.properties['StatusCode'] = response['statusCode']
+            return response
+        except Exception:
+            metrics.add('Errors', 1)
+            raise
+        finally:
+            _CURRENT.reset(token)
+            after = _client_counters()
+            for counter, (metric, unit, scale) in _CLIENT_METRICS.items():
+                if counter in after:
+                    metrics.add(metric, (after[counter] - before.get(counter, 0)) * scale, unit)
+            requests = metrics.values.get('Requests')
+            if requests:
+                metrics.add('NodesPerRequest', metrics.values['NodesSent'] / requests)
+                metrics.add('BytesPerRequest', metrics.values['BytesSent'] / requests, BYTES)
+            print(json.dumps(metrics.to_emf()))
+
+    return wrapper
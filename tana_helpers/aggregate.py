@@ -0,0 +1,32 @@
+from _aggregation import aggregate, parse_query, to_paste
+from _helper_fxns import iter_event_lines
+from _metrics import instrumented, span
+
+
+@instrumented
+def lambda_handler(event, context):
+    """Aggregates fields of the Tana Paste body, e.g. ``/aggregate?sum=Total&mean=Unit Price&group=parent``.
+
+    Operations are sum, count, mean, min and max, each naming one or more
+    comma-separated fields. ``group=parent`` groups by the node each field is
+    on; ``group=supertag:<name>`` groups by the nearest ancestor with that
+    supertag, e.g. ``supertag:purchase order`` for totals per order rather than
+    per line. The result comes back as Tana Paste.
+    """
+
+    try:
+        fields, group_by = parse_query(event.get('multiValueQueryStringParameters') or {})
+    except ValueError as e:
+        return {
+            "statusCode": 400,
+            "body": str(e),
+        }
+
+    with span('Aggregate'):
+        groups = aggregate(iter_event_lines(event), fields, group_by)
+    with span('Serialize'):
+        body = to_paste(groups, fields, grouped=group_by is not None)
+    return {
+        "statusCode": 200,
+        "body": body,
+    }
@@ -1,8 +1,11 @@
 import json
 from pprint import pformat
+
+from _metrics import instrumented
 # import requests
 
 
+@instrumented
 def lambda_handler(event, context):
     """Sample pure Lambda function
 
@@ -1,8 +1,10 @@
 import json
 import re
-from enum import Enum
+from typing import Iterator
+
 import TanaAPI as tapi
 from _helper_fxns import node_to_markup
+from _metrics import instrumented, span
 
 MEETING_SUPERTAG = tapi.SuperTag(id='fSSZ0t72ib5W')
 SUMMARY_FIELD = tapi.FieldNode(attributeId='rc9RrqE67ogA')
@@ -16,92 +18,188 @@ tag_names = {
     TRANSCRIPT_FIELD.attributeId: 'Transcript',
 }
 
-class LineType(Enum):
-    root = 0
-    bullet = 1
-    numbered = 2
-    topic = 3
-    action = 4
-    text = 5
-    empty = 6
 
+_PY_SCALAR = re.compile(r'[^,}\s]+')
+_PY_BRACKETS = {'{': '}', '[': ']', '(': ')'}
+_PY_ESCAPE = re.compile(r'\\(x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|.)', re.DOTALL)
+_PY_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v'}
+# inside a note, an escaped backslash followed by n (a literal "\n" in the note) or a newline, escaped or not, ends a
+# line; any other escape is consumed as a pair so the scan never starts in the middle of one
+_NOTE_ESCAPE = re.compile(r'\\\\n|\\n|\\.|\n', re.DOTALL)
 
-def lambda_handler(event, context):
-    """
-    """
-    body = event['body'].strip("\"- \n")
-    body_dict = dict(re.findall(r"'(.*?)':\s+'(.*?)'", body))
-    start_date = body_dict['event_start'].split('T')[0]
-
-    # parse the lines
-    cur_indent = -1
-    root_node = tapi.PlainNode(name=body_dict['title'], supertags=[MEETING_SUPERTAG], children=[
-        DATE_FIELD(tapi.DateNode(name=start_date)),
-        tapi.URLNode(url=body_dict['fellow_url'], name=f'Link to Fellow Meeting: {body_dict["title"]} on {start_date}'),
-    ])
-    last_indent_node: dict[int, tapi.Node] = {-1: root_node, -2: root_node}
-    for i, cur_line in enumerate(['root'] + body_dict['note_text'].replace('\\\\n','\n').splitlines()):
-        if i == 0:
-            continue
-        elif cur_line == '':
-            continue
-        elif m := re.match(r'^(\s*)\([\sxX]\) (.*)', cur_line):
-            # process the pattern
-            spaces, text = m.groups()
-            cur_type = LineType.topic
-            extra_indent = 1
-        elif m := re.match(r'^(\s*)•\s+(.*)', cur_line):
-            # process the pattern
-            spaces, text = m.groups()
-            cur_type = LineType.bullet
-            extra_indent = 1
-        elif m := re.match(r'^(\s*)\[([\sxX])] (.*)', cur_line):
-            spaces, checked, text = m.groups()
-            cur_type = LineType.action
-            extra_indent = 2
-        elif m := re.match(r'^(\s*)(.*)', cur_line):
-            spaces, text = m.groups()
-            cur_type = LineType.text
-            extra_indent = 0
-        else:
+
+def _unescape(raw: str) -> str:
+    if '\\' not in raw:
+        return raw
+
+    def replace(m: re.Match) -> str:
+        code = m[1]
+        if len(code) > 1:
+            return chr(int(code[1:], 16))
+        return _PY_ESCAPES.get(code, code)
+
+    text = _PY_ESCAPE.sub(replace, raw)
+    if '\\ud' in raw or '\\uD' in raw:
+        # JSON writes characters outside the BMP as a pair of \u surrogates; join them into one character
+        text = text.encode('utf-16', 'surrogatepass').decode('utf-16')
+    return text
+
+
+def _string_end(body: str, pos: int) -> int:
+    """Where the Python string literal starting at ``pos`` ends, or -1 if there isn't one."""
+    quote = body[pos:pos + 1]
+    if quote not in ('"', "'"):
+        return -1
+    start = pos + 1
+    while True:
+        end = body.find(quote, start)
+        if end < 0:
+            raise ValueError(f'Unterminated string at {pos} of the Fellow payload')
+        # an odd run of backslashes escapes the quote
+        escapes = end
+        while body[escapes - 1] == '\\':
+            escapes -= 1
+        if (end - escapes) % 2 == 0:
+            return end + 1
+        start = end + 1
+
+
+def _container_end(body: str, pos: int) -> int:
+    """Where the dict, list or tuple literal starting at ``pos`` ends, or -1 if there isn't one."""
+    if body[pos:pos + 1] not in _PY_BRACKETS:
+        return -1
+    closing = [_PY_BRACKETS[body[pos]]]
+    pos += 1
+    while closing:
+        if pos >= len(body):
+            raise ValueError('Unterminated dict or list in the Fellow payload')
+        char = body[pos]
+        if char in '"\'':
+            pos = _string_end(body, pos)
             continue
+        if char in _PY_BRACKETS:
+            closing.append(_PY_BRACKETS[char])
+        elif char == closing[-1]:
+            closing.pop()
+        pos += 1
+    return pos
+
 
+class FellowPayload:
+    """The dict in a Fellow webhook body, which arrives written as a Python literal.
+
+    The body is scanned once to find where each value is; values are only
+    unescaped when they're read, and ``iter_lines`` decodes one at a time,
+    without ever copying the whole of a long ``note_text``. Numbers, constants
+    and nested dicts or lists are skipped over and read back as their source text.
+    """
+    def __init__(self, body: str):
+        self.body = body
+        # key -> (start, end) of the value's literal, quotes excluded for strings
+        self._spans: dict[str, tuple[int, int]] = {}
+        self._strings: set[str] = set()
+        self._scan()
+
+    def _skip(self, pos: int, chars: str = ' \t\r\n') -> int:
+        while pos < len(self.body) and self.body[pos] in chars:
+            pos += 1
+        return pos
+
+    def _scan(self):
+        body = self.body
+        pos = body.find('{')
+        if pos < 0:
+            raise ValueError('Fellow payload has no {...} dict')
+        pos = self._skip(pos + 1)
+        while pos < len(body) and body[pos] != '}':
+            key_end = _string_end(body, pos)
+            if key_end < 0:
+                raise ValueError(f'Expected a quoted key at {pos} of the Fellow payload')
+            name = _unescape(body[pos + 1:key_end - 1])
+            pos = self._skip(key_end)
+            if body[pos:pos + 1] != ':':
+                raise ValueError(f'Expected ":" at {pos} of the Fellow payload')
+            pos = self._skip(pos + 1)
+            value_end = _string_end(body, pos)
+            if value_end >= 0:
+                self._spans[name] = (pos + 1, value_end - 1)
+                self._strings.add(name)
+            elif (value_end := _container_end(body, pos)) >= 0:
+                self._spans[name] = (pos, value_end)
+            else:
+                value = _PY_SCALAR.match(body, pos)
+                if value is None:
+                    raise ValueError(f'Unsupported value for {name!r} in the Fellow payload')
+                value_end = value.end()
+                self._spans[name] = (pos, value_end)
+            pos = self._skip(value_end, ' \t\r\n,')
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._spans
+
+    def __getitem__(self, key: str) -> str:
+        start, end = self._spans[key]
+        raw = self.body[start:end]
+        return _unescape(raw) if key in self._strings else raw
+
+    def iter_lines(self, key: str = 'note_text') -> Iterator[str]:
+        """The lines of a string value, decoded one at a time."""
+        start, end = self._spans[key]
+        body = self.body
+        for m in _NOTE_ESCAPE.finditer(body, start, end):
+            if m.end() - m.start() == 2 and m[0] != '\\n':
+                continue
+            yield _unescape(body[start:m.start()])
+            start = m.end()
+        yield _unescape(body[start:end])
+
+
+def _note_line(extra_indent: int, make_node):
+    def make(m: re.Match):
+        spaces, text = m.group(f'{m.lastgroup}_spaces', f'{m.lastgroup}_text')
         node_name = text.strip(' •')
         if node_name == '':
-            continue
+            return None
+        return len(spaces) + extra_indent, make_node(node_name, m)
+    return make
+
+
+# tried in order; the first one that matches decides the line's type
+NOTE_GRAMMAR = tapi.OutlineGrammar(
+    ('topic', r'(?P<topic_spaces>\s*)\([\sxX]\) (?P<topic_text>.*)',
+     _note_line(1, lambda name, m: tapi.PlainNode(name=f'**{name}**'))),
+    ('bullet', r'(?P<bullet_spaces>\s*)•\s+(?P<bullet_text>.*)',
+     _note_line(1, lambda name, m: tapi.PlainNode(name=name))),
+    ('action', r'(?P<action_spaces>\s*)\[(?P<checked>[\sxX])] (?P<action_text>.*)',
+     _note_line(2, lambda name, m: tapi.CheckboxNode(name=name, value=m['checked'] != ' '))),
+    ('text', r'(?P<text_spaces>\s*)(?P<text_text>.*)',
+     _note_line(0, lambda name, m: tapi.PlainNode(name=name))),
+)
+
+
+@instrumented
+def lambda_handler(event, context):
+    """
+    """
+    with span('Decode'):
+        payload = FellowPayload(event['body'])
+        title = payload['title']
+        start_date = payload['event_start'].split('T')[0]
 
-        if cur_type == LineType.action:
-            cur_node = tapi.CheckboxNode(name=node_name, value=False if checked == ' ' else True)
-        elif cur_type == LineType.topic:
-            cur_node = tapi.PlainNode(name=f'**{node_name}**')
-        else:
-            cur_node = tapi.PlainNode(name=node_name)
-
-        # figure out the indentation
-        line_indent = len(spaces) + extra_indent
-        parent_indent = line_indent - 1
-        line_offset = 0
-        while parent_indent > cur_indent:
-            last_indent_node[line_indent] = cur_node
-            cur_node = tapi.DummyNode(children=[cur_node])
-            line_indent -= 1
-            parent_indent -= 1
-            line_offset += 1
-        line_indent = parent_indent + 1
-
-        # place in the graph
-        parent_node = last_indent_node[parent_indent]
-        if parent_node.children is None:
-            parent_node.children = [cur_node]
-        else:
-            parent_node.children.append(cur_node)
-
-        cur_indent = line_indent + line_offset
-        last_indent_node[line_indent] = cur_node
+    # note lines are decoded as the outline is built, so their decoding counts towards Build
+    with span('Build'):
+        root_node = tapi.PlainNode(name=title, supertags=[MEETING_SUPERTAG], children=[
+            DATE_FIELD(tapi.DateNode(name=start_date)),
+            tapi.URLNode(url=payload['fellow_url'], name=f'Link to Fellow Meeting: {title} on {start_date}'),
+        ])
+        # a line more than one level deeper than the one before it gets DummyNodes for the levels in between
+        tapi.build_outline(payload.iter_lines('note_text'), NOTE_GRAMMAR, root_node, placeholder=tapi.DummyNode)
 
+    with span('Serialize'):
+        body = node_to_markup(root_node, tag_names)
     return {
         "statusCode": 200,
-        "body": node_to_markup(root_node, tag_names),
+        "body": body,
     }
 
 if __name__ == '__main__':
@@ -0,0 +1,19 @@
+import TanaAPI as tapi
+from _metrics import instrumented
+
+
+@instrumented
+def lambda_handler(event, context):
+    """Delivers submissions queued by the webhook handlers; runs on a schedule.
+    """
+    stats = tapi.drain_outbox(context)
+    pending = tapi.get_default_outbox().pending_count()
+
+    return {
+        "statusCode": 200,
+        "body": f"delivered {stats.delivered}, failed {stats.failed}, pending {pending}",
+    }
+
+
+if __name__ == '__main__':
+    print(lambda_handler({}, None)['body'])
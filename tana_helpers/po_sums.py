@@ -1,15 +1,18 @@
 import re
 
-from _helper_fxns import format_event_body
+from _helper_fxns import iter_event_lines
+from _metrics import instrumented, span
 
+TOTAL_RE = re.compile(r'- Total:: (\d+)')
 
+
+@instrumented
 def lambda_handler(event, context):
     """
     """
 
-    body = format_event_body(event)
-    total_re = re.compile(r'- Total:: (\d+)')
-    total = sum(map(int, total_re.findall(body)))
+    with span('Aggregate'):
+        total = sum(int(m) for line in iter_event_lines(event) for m in TOTAL_RE.findall(line))
 
     return {
         "statusCode": 200,
@@ -1,56 +1,103 @@
+import hashlib
 import json
-import re
 
-from requests import HTTPError
-
-from _helper_fxns import format_event_body
 import TanaAPI as tapi
+from _metrics import instrumented, span
 
 MEETING_SUPERTAG = tapi.SuperTag(id='fSSZ0t72ib5W')
 SUMMARY_FIELD = tapi.FieldNode(attributeId='rc9RrqE67ogA')
 DATE_FIELD = tapi.FieldNode(attributeId='SYS_A90')
 TRANSCRIPT_FIELD = tapi.FieldNode(attributeId='PjRWf5Mcrz_m')
+TRANSCRIPT_NAME = 'Sembly Transcript'
 
+# stop this long before the Lambda timeout and hand the rest to a follow-up invocation
+SAFETY_MARGIN = 15.0
+CHECKPOINT_EVENT_KEY = 'tanaCheckpoint'
 
-def lambda_handler(event, context):
-    """
-    """
 
-    body = json.loads(event['body'])
-    print(body)
-    transcript_blocks = []
-    for cur_block in body['meeting_transcription'].split('\n\n'):
+def transcript_blocks(transcription: str) -> list[dict]:
+    # a transcript can run to thousands of lines, so build it flat and only make nodes at submit time
+    tree = tapi.TreeBuilder()
+    for cur_block in transcription.split('\n\n'):
         if not cur_block:
             continue
 
-        # print(repr(cur_block))
         speaker, *text = [l.strip() for l in cur_block.splitlines()]
         if len(text) > 1:
-            s_node = tapi.PlainNode(name=speaker, children=text)
+            tree.extend(text, parent=tree.add(speaker))
         else:
-            s_node = tapi.PlainNode(name=f'**{speaker}:** {text[0]}')
+            tree.add(f'**{speaker}:** {text[0]}')
+    return tree.to_wire()
+
+
+def find_node_id(node: dict, name: str) -> str:
+    """The nodeId of the first node named ``name`` below ``node`` in a Tana response.
+
+    Searched by name rather than by path, so it doesn't matter whether the
+    response lists the field nodes between ``node`` and the one we want.
+    """
+    stack = list(reversed(node.get('children') or []))
+    while stack:
+        cur = stack.pop()
+        if cur.get('name') == name and cur.get('nodeId'):
+            return cur['nodeId']
+        stack.extend(reversed(cur.get('children') or []))
+    raise ValueError(f'Tana response has no node named {name!r}')
+
+
+def schedule_continuation(event: dict, context, checkpoint: tapi.Checkpoint):
+    """Invokes this function again, asynchronously, with the checkpoint riding along in the event."""
+    import boto3  # in the Lambda runtime, not in requirements.txt
 
-        transcript_blocks.append(s_node)
+    payload = dict(event, **{CHECKPOINT_EVENT_KEY: checkpoint.to_dict()})
+    boto3.client('lambda').invoke(FunctionName=context.invoked_function_arn, InvocationType='Event',
+                                  Payload=json.dumps(payload).encode('utf-8'))
 
-    tx_node = tapi.PlainNode(name='Sembly Transcript', children=transcript_blocks[:90])
-    t = tapi.Tana().target_inbox().add_children(n := tapi.PlainNode(name=body['meeting_title'],
-                                                                    # supertags=[MEETING_SUPERTAG],
-                                                                    children=[
-                                                                        TRANSCRIPT_FIELD(tx_node)
-                                                                    ]))
+
+@instrumented
+def lambda_handler(event, context):
+    """
+    """
+
+    with span('Decode'):
+        body = json.loads(event['body'])
+    with span('Build'):
+        blocks = transcript_blocks(body['meeting_transcription'])
+    input_hash = hashlib.sha256(event['body'].encode('utf-8')).hexdigest()
+    key = f"sembly-transcript:{body.get('meeting_id') or input_hash}"
+
+    def create_parent() -> str:
+        tree = tapi.TreeBuilder()
+        meeting = tree.add(body['meeting_title'])  # , supertags=[MEETING_SUPERTAG.id]
+        tree.add(TRANSCRIPT_NAME, parent=tree.field(TRANSCRIPT_FIELD.attributeId, parent=meeting))
+        result = tapi.Tana().target_inbox().add_children(tree).submit(compact=True)
+        return find_node_id(result.raw['children'][0], TRANSCRIPT_NAME)
+
+    time_budget = None
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        time_budget = max(context.get_remaining_time_in_millis() / 1000 - SAFETY_MARGIN, 0)
+
+    resume_from = event.get(CHECKPOINT_EVENT_KEY)
+    ingest = tapi.ResumableIngest(key, input_hash, blocks)
     try:
-        out_node = t.submit(clear_nodes=True)
-        print(out_node.model_dump())
-        transcript_node_id = out_node.children[0].children[0].nodeId
-        t.set_target_id(transcript_node_id)
-        while len(transcript_blocks) > 90:
-            transcript_blocks = transcript_blocks[90:]
-            t.add_children(*transcript_blocks[:90])
-            t.submit()
-
-    except HTTPError:
-        print(t.model_dump())
-        raise
+        checkpoint = ingest.run(create_parent, time_budget, resume_from=resume_from)
+    except (OSError, ValueError) as err:  # requests' errors are OSErrors
+        # progress is checkpointed, so a retry carries on from the last slice: have the sender
+        # retry a webhook call, and Lambda retry a continuation (it only does so when it raises)
+        print(f'Transcript upload stopped: {err!r}')
+        if resume_from is not None:
+            raise
+        return {
+            "statusCode": 502,
+            "body": "transcript upload interrupted; resend to resume",
+        }
+
+    if not checkpoint.done:
+        schedule_continuation(event, context, checkpoint)
+        return {
+            "statusCode": 202,
+            "body": f"in progress: {checkpoint.committed} of {checkpoint.total} blocks",
+        }
 
     return {
         "statusCode": 200,
@@ -0,0 +1,34 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+HANDLER_DIR = Path(__file__).parents[2] / 'tana_helpers'
+
+# the handlers import TanaAPI as a top-level package, as they do in Lambda
+sys.path.insert(0, str(HANDLER_DIR))
+os.environ.setdefault('TanaKey', 'test-key')
+
+import TanaAPI as tapi  # noqa: E402
+
+
+@pytest.fixture()
+def emulator():
+    return tapi.TanaEmulator()
+
+
+@pytest.fixture()
+def rate_limiter():
+    return tapi.RateLimiter(rate=1000, burst=1000)
+
+
+@pytest.fixture()
+def tana(emulator, rate_limiter):
+    """A client that sends to ``emulator`` without waiting on the rate limiter."""
+    return tapi.Tana(transport=emulator.transport(), rate_limiter=rate_limiter)
+
+
+def children_of(emulator, node_id: str) -> list[str]:
+    """Names of the nodes the emulator holds under ``node_id``, in order."""
+    return [child['name'] for child in emulator.graph[node_id]['children']]
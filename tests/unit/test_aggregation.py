@@ -0,0 +1,98 @@
+from decimal import Decimal
+
+import pytest
+
+import aggregate as aggregate_handler
+from _aggregation import aggregate, format_number, parse_number, parse_query, to_paste
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('12', Decimal('12')),
+    ('$1,234.56', Decimal('1234.56')),
+    ('-$1,234.56', Decimal('-1234.56')),
+    ('USD 2,000', Decimal('2000')),
+    ('€ 3.5', Decimal('3.5')),
+    ('1,000,000', Decimal('1000000')),
+    ('.5', Decimal('0.5')),
+    ('-7', Decimal('-7')),
+    ('3 items', Decimal('3')),
+    ('0.10', Decimal('0.10')),
+    ('n/a', None),
+    ('', None),
+])
+def test_parse_number(text, expected):
+    assert parse_number(text) == expected
+
+
+def test_decimal_totals_are_exact():
+    assert sum(parse_number(t) for t in ['$0.10', '$0.20']) == Decimal('0.30')
+    assert format_number(Decimal('1234.5000')) == '1234.5'
+    assert format_number(Decimal('100')) == '100'
+
+
+ORDERS = '''%%tana%%
+- PO 1 #[[purchase order]]
+  - Lines
+    - Widget #[[po line]]
+      - Quantity:: 2
+      - Total:: $1,000.50
+    - Gadget #[[po line]]
+      - Quantity:: 1
+      - Total::
+        - $20
+        - n/a
+- PO 2 #[[purchase order]]
+  - Bolt #[[po line]]
+    - Total:: 3.25
+- Loose line
+  - Total:: 99
+'''
+
+
+def test_grouped_by_supertag():
+    groups = aggregate(ORDERS.splitlines(), ['Total', 'Quantity'], 'supertag:purchase order')
+
+    assert list(groups) == ['PO 1', 'PO 2']  # the loose line has no purchase order, so it's left out
+    po1 = groups['PO 1']
+    assert po1['Total'].result('sum') == Decimal('1020.50')
+    assert po1['Total'].result('count') == 3  # 'n/a' counts, but isn't a number
+    assert po1['Total'].result('mean') == Decimal('510.2500')
+    assert (po1['Total'].result('min'), po1['Total'].result('max')) == (Decimal('20'), Decimal('1000.50'))
+    assert po1['Quantity'].result('sum') == 3
+    assert groups['PO 2']['Total'].result('sum') == Decimal('3.25')
+
+
+def test_grouped_by_parent_and_ungrouped():
+    by_parent = aggregate(ORDERS.splitlines(), ['Total'], 'parent')
+    assert {g: t['Total'].result('sum') for g, t in by_parent.items()} == {
+        'Widget': Decimal('1000.50'), 'Gadget': Decimal('20'), 'Bolt': Decimal('3.25'), 'Loose line': Decimal('99')}
+
+    everything = aggregate(ORDERS.splitlines(), ['Total'])
+    assert everything['']['Total'].result('sum') == Decimal('1122.75')
+
+
+def test_parse_query():
+    fields, group_by = parse_query({'sum': ['Total,Quantity'], 'mean': ['Total'], 'group': ['parent']})
+    assert fields == {'Total': ['sum', 'mean'], 'Quantity': ['sum']}
+    assert group_by == 'parent'
+
+    with pytest.raises(ValueError):
+        parse_query({})
+    with pytest.raises(ValueError):
+        parse_query({'sum': ['Total'], 'group': ['grandparent']})
+
+
+def test_handler():
+    event = {'body': '"' + ORDERS.replace('\n', '\\n') + '"',
+             'multiValueQueryStringParameters': {'sum': ['Total'], 'group': ['supertag:purchase order']}}
+    response = aggregate_handler.lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert response['body'] == '%%tana%%\n- PO 1\n  - Total (sum):: 1020.5\n- PO 2\n  - Total (sum):: 3.25'
+    assert aggregate_handler.lambda_handler({'body': ''}, None)['statusCode'] == 400
+
+
+def test_to_paste_ungrouped():
+    groups = aggregate(ORDERS.splitlines(), ['Total'])
+    assert to_paste(groups, {'Total': ['count', 'max']}, grouped=False) == \
+        '%%tana%%\n- Total (count):: 5\n- Total (max):: 1000.5'
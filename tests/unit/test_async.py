@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+import TanaAPI as tapi
+
+from .conftest import children_of
+
+
+@pytest.fixture()
+def async_client(emulator, rate_limiter):
+    def make(*children, target_id=None) -> tapi.AsyncTana:
+        return tapi.AsyncTana(*children, target_id=target_id, transport=emulator.async_transport(),
+                              rate_limiter=rate_limiter)
+    return make
+
+
+def test_child_waits_for_parents_node_id(async_client, emulator):
+    parent = async_client(tapi.PlainNode(name='parent'), target_id='INBOX')
+    # listed first, so it only lands under the parent if it really waits for it
+    child = async_client(tapi.PlainNode(name='child'), target_id=parent.node_id_at(0))
+    other = async_client(tapi.PlainNode(name='other'), target_id='LIBRARY')
+
+    child_result, parent_result, _ = asyncio.run(tapi.AsyncTana.gather(child, parent, other))
+
+    parent_id = parent_result.node_id(0)
+    assert children_of(emulator, parent_id) == ['child']
+    assert emulator.graph[child_result.node_id(0)]['name'] == 'child'
+    assert children_of(emulator, 'LIBRARY') == ['other']
+
+
+def test_cycle_is_refused(async_client, emulator):
+    first = async_client(tapi.PlainNode(name='a'))
+    second = async_client(tapi.PlainNode(name='b'), target_id=first.node_id_at(0))
+    first.set_target_id(second.node_id_at(0))
+
+    with pytest.raises(ValueError):
+        asyncio.run(tapi.AsyncTana.gather(first, second))
+    assert emulator.requests == 0
+
+
+def test_clients_share_a_transport_for_the_call(emulator, rate_limiter):
+    url = emulator.start()
+    try:
+        clients = [tapi.AsyncTana(tapi.PlainNode(name=f'n{i}'), target_id='INBOX', endpoint=url,
+                                  rate_limiter=rate_limiter) for i in range(3)]
+        asyncio.run(tapi.AsyncTana.gather(*clients))
+    finally:
+        emulator.stop()
+
+    assert sorted(children_of(emulator, 'INBOX')) == ['n0', 'n1', 'n2']
+    assert all(client.transport is None for client in clients)  # the shared one was closed and handed back
@@ -0,0 +1,62 @@
+import base64
+import copy
+import json
+
+import pytest
+
+import TanaAPI as tapi
+from TanaAPI._nodes import Attachment, FileNode, LargeFileError, base64_size
+
+# not a multiple of the chunk size, so the last chunk is short and padded
+DATA = bytes(range(256)) * (3 * Attachment.CHUNK // 256) + b'tail'
+
+
+def test_path_encodes_like_b64encode(tmp_path):
+    path = tmp_path / 'slide.png'
+    path.write_bytes(DATA)
+    attachment = Attachment(path)
+
+    chunks = list(attachment.iter_base64())
+    assert len(chunks) == 4
+    assert b''.join(chunks) == base64.b64encode(DATA)
+    assert attachment.encoded_size == len(base64.b64encode(DATA)) == base64_size(len(DATA))
+
+
+def test_bytes_and_path_serialize_the_same(tmp_path):
+    path = tmp_path / 'slide.png'
+    path.write_bytes(DATA)
+    from_path, from_bytes = FileNode.from_path(path), FileNode.from_bytes(memoryview(DATA), 'slide.png')
+
+    assert from_path.model_dump() == from_bytes.model_dump()
+    assert json.loads(tapi.encode_nodes([from_path]))[0]['file'] == base64.b64encode(DATA).decode('ascii')
+    assert copy.deepcopy(from_path).attachment is from_path.attachment
+
+
+def test_over_max_len_raises_before_reading(tmp_path):
+    path = tmp_path / 'slide.png'
+    path.write_bytes(DATA)
+    with pytest.raises(LargeFileError):
+        FileNode.from_path(path, max_len=1000)
+
+    attachment = Attachment(path, max_len=1000)
+    with pytest.raises(LargeFileError):
+        next(attachment.iter_base64())  # nothing is read: the size is known from the file
+
+
+def test_file_growing_while_read_stops_mid_stream(tmp_path):
+    path = tmp_path / 'slide.png'
+    path.write_bytes(DATA[:Attachment.CHUNK])
+    chunks = Attachment(path, max_len=base64_size(Attachment.CHUNK)).iter_base64()
+
+    assert next(chunks) == base64.b64encode(DATA[:Attachment.CHUNK])
+    with path.open('ab') as f:
+        f.write(DATA[Attachment.CHUNK:])
+    with pytest.raises(LargeFileError):
+        next(chunks)
+
+
+def test_size_limit_is_opt_in():
+    data = b'x' * 10_000
+    FileNode.from_bytes(data, 'big.png')
+    with pytest.raises(LargeFileError):
+        FileNode.from_bytes(data, 'big.png', max_len=LargeFileError.MAX_LEN)
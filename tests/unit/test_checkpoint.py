@@ -0,0 +1,118 @@
+import pytest
+import requests
+
+import TanaAPI as tapi
+from TanaAPI import _checkpoint
+from TanaAPI._chunking import MAX_NODES_PER_REQUEST, MAX_PAYLOAD_BYTES
+
+from .conftest import children_of
+
+
+class FailingTransport(tapi.Transport):
+    """Passes ``ok`` requests through to ``inner``, then fails every one after them."""
+    def __init__(self, inner: tapi.Transport, ok: int):
+        super().__init__()
+        self.inner = inner
+        self.ok = ok
+
+    def post(self, url, headers, body):
+        if self.ok <= 0:
+            raise requests.ConnectionError('connection dropped')
+        self.ok -= 1
+        return self.inner.post(url, headers, body)
+
+
+def blocks(n: int) -> list[dict]:
+    return [{'name': f'block {i} ' + 'word ' * (i % 30)} for i in range(n)]
+
+
+def parent_factory(tana: tapi.Tana, calls: list):
+    def create_parent() -> str:
+        calls.append(1)
+        parent = tapi.PlainNode(name='Transcript')
+        client = tapi.Tana(parent, target_id='INBOX', transport=tana.transport, rate_limiter=tana.rate_limiter)
+        return client.submit(compact=True).id_for(parent)
+    return create_parent
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return tapi.SQLiteCheckpointStore(tmp_path / 'checkpoints.sqlite3')
+
+
+def test_slices_fit_one_request_each():
+    nodes = blocks(500)
+    ends = tapi.plan_slices(nodes, 'parent-id')
+
+    assert ends[-1] == len(nodes)
+    start = 0
+    for end in ends:
+        body = tapi.encode_request(nodes[start:end], 'parent-id', MAX_NODES_PER_REQUEST, MAX_PAYLOAD_BYTES)
+        assert body is not None
+        start = end
+
+
+def test_runs_to_completion(tana, emulator, store):
+    calls = []
+    checkpoint = tapi.ResumableIngest('k', 'h', blocks(300), store, tana).run(parent_factory(tana, calls))
+
+    assert checkpoint.done and calls == [1]
+    assert children_of(emulator, checkpoint.parent_id) == [b['name'] for b in blocks(300)]
+    assert store.get('k').committed == 300
+
+
+def test_resumes_after_time_budget(tana, emulator, store):
+    calls = []
+    first = tapi.ResumableIngest('k', 'h', blocks(300), store, tana).run(parent_factory(tana, calls), time_budget=0)
+    assert not first.done
+    assert store.get('k').parent_id == first.parent_id  # saved as soon as the parent exists
+
+    second = tapi.ResumableIngest('k', 'h', blocks(300), store, tana).run(parent_factory(tana, calls))
+    assert second.done and calls == [1]
+    assert children_of(emulator, second.parent_id) == [b['name'] for b in blocks(300)]
+
+
+def test_resumes_after_failure_without_duplicates(tana, emulator, store):
+    calls = []
+    flaky = tapi.Tana(transport=FailingTransport(tana.transport, ok=4), rate_limiter=tana.rate_limiter)
+    with pytest.raises(requests.ConnectionError):
+        tapi.ResumableIngest('k', 'h', blocks(400), store, flaky).run(parent_factory(flaky, calls))
+    assert 0 < store.get('k').committed < 400
+
+    checkpoint = tapi.ResumableIngest('k', 'h', blocks(400), store, tana).run(parent_factory(tana, calls))
+    assert checkpoint.done and calls == [1]
+    assert children_of(emulator, checkpoint.parent_id) == [b['name'] for b in blocks(400)]
+
+
+def test_new_input_starts_over(tana, store):
+    calls = []
+    first = tapi.ResumableIngest('k', 'h1', blocks(10), store, tana).run(parent_factory(tana, calls))
+    second = tapi.ResumableIngest('k', 'h2', blocks(10), store, tana).run(parent_factory(tana, calls))
+
+    assert calls == [1, 1]
+    assert first.parent_id != second.parent_id
+
+
+@pytest.mark.parametrize('make_store', [
+    lambda path: tapi.FileCheckpointStore(path / 'checkpoints'),
+    lambda path: tapi.SQLiteCheckpointStore(path / 'checkpoints.sqlite3'),
+])
+def test_store_round_trip(tmp_path, make_store):
+    store = make_store(tmp_path)
+    checkpoint = tapi.Checkpoint('sembly:1', 'hash', total=5, parent_id='p', committed=3, slices=2)
+    store.put(checkpoint)
+
+    assert store.get('sembly:1') == checkpoint
+    store.delete('sembly:1')
+    assert store.get('sembly:1') is None
+
+
+def test_default_store_must_be_configured(monkeypatch, tmp_path):
+    monkeypatch.setattr(_checkpoint, '_DEFAULT_CHECKPOINT_STORE', None)
+    monkeypatch.delenv(_checkpoint.CHECKPOINT_TABLE_ENV, raising=False)
+    monkeypatch.delenv(_checkpoint.CHECKPOINT_PATH_ENV, raising=False)
+    with pytest.raises(RuntimeError):
+        tapi.get_default_checkpoint_store()
+
+    monkeypatch.setenv(_checkpoint.CHECKPOINT_PATH_ENV, str(tmp_path / 'checkpoints.sqlite3'))
+    assert isinstance(tapi.get_default_checkpoint_store(), tapi.SQLiteCheckpointStore)
@@ -0,0 +1,80 @@
+import json
+
+import TanaAPI as tapi
+from TanaAPI._chunking import MAX_NODES_PER_REQUEST, MAX_PAYLOAD_BYTES, ChunkedSubmission, count_nodes
+
+from .conftest import children_of
+
+
+def drive(submission: ChunkedSubmission, tana: tapi.Tana) -> list[dict]:
+    """Runs ``submission`` through ``tana`` and returns every request it made."""
+    requests = []
+    while (request := submission.next_request()) is not None:
+        requests.append(request)
+        resp = tana._post(request)
+        resp.raise_for_status()
+        submission.record_response(resp.json())
+    return requests
+
+
+def test_splits_at_node_limit(tana, emulator):
+    nodes = [{'name': f'n{i}'} for i in range(250)]
+    response = tana.send(nodes, 'INBOX')
+
+    assert emulator.requests == 3
+    assert children_of(emulator, 'INBOX') == [f'n{i}' for i in range(250)]
+    assert [c['name'] for c in response['children']] == [f'n{i}' for i in range(250)]
+    assert all(c['nodeId'] for c in response['children'])
+
+
+def test_splits_at_byte_limit(tana, emulator):
+    nodes = [{'name': f'{i:03d}' + 'x' * 300} for i in range(60)]
+    requests = drive(ChunkedSubmission(nodes, 'INBOX'), tana)
+
+    assert len(requests) > 1
+    for request in requests:
+        assert count_nodes(request['nodes']) <= MAX_NODES_PER_REQUEST
+        assert len(json.dumps(request, separators=(',', ':')).encode('utf-8')) <= MAX_PAYLOAD_BYTES
+    assert children_of(emulator, 'INBOX') == [n['name'] for n in nodes]
+
+
+def test_retargets_children_that_did_not_fit(tana, emulator):
+    parent = {'name': 'parent', 'children': [{'name': f'c{i}'} for i in range(150)]}
+    requests = drive(ChunkedSubmission([parent], 'INBOX'), tana)
+
+    assert len(requests) == 2
+    parent_id = emulator.graph['INBOX']['children'][0]['nodeId']
+    assert requests[1]['targetNodeId'] == parent_id
+    assert children_of(emulator, parent_id) == [f'c{i}' for i in range(150)]
+
+
+def test_response_merged_as_one_tree(tana, emulator):
+    deep = tapi.PlainNode(name='deep')
+    tree = tapi.PlainNode(name='root', children=[
+        tapi.PlainNode(name=f'branch{b}', children=[tapi.PlainNode(name=f'leaf{b}-{i}') for i in range(40)])
+        for b in range(4)
+    ] + [tapi.PlainNode(name='last', children=[deep])])
+    result = tana.target_inbox().add_children(tree).submit(compact=True)
+
+    assert emulator.requests > 1
+    merged = result.raw['children'][0]
+    assert [c['name'] for c in merged['children']] == ['branch0', 'branch1', 'branch2', 'branch3', 'last']
+    assert all(len(c['children']) == 40 for c in merged['children'][:4])
+    assert emulator.graph[result.id_for(deep)]['name'] == 'deep'
+    assert result.node_id(0, 2, 39) == merged['children'][2]['children'][39]['nodeId']
+
+
+def test_file_stays_in_its_parents_request(tana, emulator):
+    slides = [
+        tapi.PlainNode(name=f'slide{i}', children=[
+            tapi.FieldNode(attributeId='image', children=[tapi.FileNode.from_bytes(bytes(20_000), f's{i}.png')]),
+            tapi.FieldNode(attributeId='notes', children=[tapi.PlainNode(name='note')]),
+        ])
+        for i in range(2)
+    ]
+    requests = drive(ChunkedSubmission(tapi.to_wire(slides), 'INBOX'), tana)
+
+    # one request per slide: a file never fits a request, so splitting it off would only add one
+    assert len(requests) == 2
+    assert [count_nodes(r['nodes']) for r in requests] == [5, 5]
+    assert children_of(emulator, 'INBOX') == ['slide0', 'slide1']
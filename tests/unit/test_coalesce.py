@@ -0,0 +1,30 @@
+import threading
+
+import TanaAPI as tapi
+
+
+def test_concurrent_submits_share_one_post(emulator, rate_limiter):
+    coalescer = tapi.SubmitCoalescer(window=0.5)
+    transport = emulator.transport()
+    barrier = threading.Barrier(8)
+    results = {}
+
+    def submit(i: int):
+        # callers send different numbers of nodes, so a wrong offset hands out someone else's ids
+        names = [f't{i}-{j}' for j in range(i + 1)]
+        tana = tapi.Tana(*(tapi.PlainNode(name=n) for n in names), target_id='INBOX', transport=transport,
+                         rate_limiter=rate_limiter, coalescer=coalescer)
+        barrier.wait()
+        results[i] = (names, tana.submit(compact=True))
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert emulator.requests == 1
+    for names, result in results.values():
+        ids = [result.node_id(j) for j in range(len(names))]
+        assert [emulator.graph[node_id]['name'] for node_id in ids] == names
+        assert len(result.raw['children']) == len(names)
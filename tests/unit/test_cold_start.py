@@ -0,0 +1,57 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+HANDLER_DIR = Path(__file__).parents[2] / 'tana_helpers'
+
+# seconds to import each Lambda handler module in a fresh interpreter
+IMPORT_BUDGETS = {
+    'aggregate': 0.1,
+    'event_json': 0.1,
+    'po_sums': 0.1,
+    'fellow_to_tana': 1.0,
+    'sembly_notes': 1.0,
+    'sembly_transcripts': 1.0,
+    'outbox_drain': 1.0,
+}
+
+# nothing on the Lambda import path should load these
+FORBIDDEN_MODULES = ['tqdm', 'aiohttp', 'requests', 'sqlite3', 'http.server', 'mimetypes', 'IPython']
+
+_PROBE = '''
+import json, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'modules': sorted(set(sys.modules) - before)}}))
+'''
+
+
+def measure_import(module: str) -> dict:
+    """Imports ``module`` in a fresh interpreter without credentials and reports time and newly loaded modules."""
+    env = {'PATH': '', 'PYTHONPATH': str(HANDLER_DIR)}
+    out = subprocess.run([sys.executable, '-c', _PROBE.format(module=module)], cwd=HANDLER_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize('module', sorted(IMPORT_BUDGETS))
+def test_handler_import_budget(module):
+    result = measure_import(module)
+    # best of three, so a noisy neighbour doesn't fail the build
+    seconds = min([result['seconds']] + [measure_import(module)['seconds'] for _ in range(2)])
+    assert seconds < IMPORT_BUDGETS[module], f'{module} took {seconds:.3f}s to import'
+
+    loaded = set(result['modules'])
+    forbidden = [m for m in FORBIDDEN_MODULES if m in loaded]
+    assert not forbidden, f'{module} imports {forbidden} at load time'
+
+
+if __name__ == '__main__':
+    for handler in sorted(IMPORT_BUDGETS):
+        times = [measure_import(handler)['seconds'] for _ in range(5)]
+        print(f'{handler:20s} best {min(times) * 1000:7.1f} ms   budget {IMPORT_BUDGETS[handler] * 1000:6.0f} ms')
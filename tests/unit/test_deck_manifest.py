@@ -0,0 +1,72 @@
+from pathlib import Path
+
+from deck_manifest import DeckManifest
+
+
+def entry(content: str, source: str = None) -> dict:
+    return {'content': content, 'source': source or f'page-{content}', 'image': f'img-{content}',
+            'node_id': f'node-{content}'}
+
+
+def manifest_of(tmp_path: Path, *contents: str) -> DeckManifest:
+    manifest = DeckManifest(tmp_path / 'deck.json')
+    manifest.reset('target', 'png')
+    for index, content in enumerate(contents):
+        manifest.set(index, entry(content))
+    return manifest
+
+
+def rematched(manifest: DeckManifest, *contents: str) -> list:
+    manifest.rematch(list(contents), [f'page-{c}' for c in contents])
+    return [e and e['node_id'] for e in manifest.slides]
+
+
+def test_inserted_slide_shifts_nothing(tmp_path):
+    manifest = manifest_of(tmp_path, 'a', 'b', 'c')
+    assert rematched(manifest, 'new', 'a', 'b', 'c') == [None, 'node-a', 'node-b', 'node-c']
+    assert manifest.removed == []
+
+
+def test_deleted_slide_is_removed(tmp_path):
+    manifest = manifest_of(tmp_path, 'a', 'b', 'c')
+    assert rematched(manifest, 'a', 'c') == ['node-a', 'node-c']
+    assert [e['node_id'] for e in manifest.removed] == ['node-b']
+
+
+def test_reordered_slides_keep_their_entries(tmp_path):
+    manifest = manifest_of(tmp_path, 'a', 'b', 'c')
+    assert rematched(manifest, 'c', 'a', 'b') == ['node-c', 'node-a', 'node-b']
+
+
+def test_edited_slide_takes_the_entry_at_its_position(tmp_path):
+    # its old entry is what the new upload supersedes
+    manifest = manifest_of(tmp_path, 'a', 'b', 'c')
+    assert rematched(manifest, 'a', 'b2', 'c') == ['node-a', 'node-b', 'node-c']
+    assert manifest.removed == []
+
+
+def test_duplicate_content_prefers_the_same_page(tmp_path):
+    manifest = DeckManifest(tmp_path / 'deck.json')
+    manifest.set(0, dict(entry('same', 'page-1'), node_id='first'))
+    manifest.set(1, dict(entry('same', 'page-2'), node_id='second'))
+
+    manifest.rematch(['same', 'same'], ['page-2', 'page-1'])
+    assert [e['node_id'] for e in manifest.slides] == ['second', 'first']
+
+
+def test_saved_and_loaded(tmp_path):
+    manifest = manifest_of(tmp_path, 'a', 'b')
+    rematched(manifest, 'b')
+    manifest.save()
+
+    loaded = DeckManifest(tmp_path / 'deck.json')
+    assert (loaded.target_node_id, loaded.image_format) == ('target', 'png')
+    assert loaded.slides == manifest.slides
+    assert [e['node_id'] for e in loaded.removed] == ['node-a']
+
+
+def test_each_deck_path_has_its_own_manifest(tmp_path):
+    first = DeckManifest.for_deck(tmp_path / 'one' / 'deck.pptx', tmp_path)
+    assert first.path.parent == tmp_path and first.path.name.startswith('deck-')
+    assert DeckManifest.for_deck(tmp_path / 'one' / 'deck.pptx', tmp_path).path == first.path
+    assert DeckManifest.for_deck(tmp_path / 'two' / 'deck.pptx', tmp_path).path != first.path
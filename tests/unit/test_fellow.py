@@ -0,0 +1,60 @@
+import ast
+import json
+
+import pytest
+
+from fellow_to_tana import FellowPayload
+
+PAYLOADS = [
+    {'title': 'Weekly "sync"', 'event_start': '2024-04-01T10:00:00Z', 'fellow_url': 'https://fellow.app/m/1',
+     'note_text': '(x) Topic\n  • bullet\n  [ ] action'},
+    {'title': "It's a back\\slash, a tab\tand a quote '", 'note_text': 'one\n\ntwo\r\nthree'},
+    {'title': 'Café ünïcødé 会议 😀', 'note_text': 'naïve • résumé\n😀 line'},
+    {'title': 'nested', 'attendees': [{'name': 'Ann', 'tags': ['}', '{', '"]']}, {'name': 'Bob'}],
+     'meta': {'count': 2, 'ok': True, 'inner': {'text': "a ' } b"}}, 'note_text': 'after the nested values',
+     'duration': 30, 'recorded': None},
+]
+
+
+def string_values(data: dict) -> dict:
+    return {k: v for k, v in data.items() if isinstance(v, str)}
+
+
+def scanned(body: str, data: dict) -> dict:
+    payload = FellowPayload(body)
+    assert all(key in payload for key in data)
+    return {k: payload[k] for k in string_values(data)}
+
+
+@pytest.mark.parametrize('data', PAYLOADS)
+@pytest.mark.parametrize('ensure_ascii', [True, False])
+def test_matches_json_loads(data, ensure_ascii):
+    body = json.dumps(data, ensure_ascii=ensure_ascii)
+    expected = json.loads(body)
+
+    assert scanned(body, data) == string_values(expected)
+    assert list(FellowPayload(body).iter_lines()) == expected['note_text'].split('\n')
+
+
+@pytest.mark.parametrize('data', PAYLOADS)
+def test_matches_python_literal(data):
+    # Fellow sends the dict as Python writes it
+    body = repr(data)
+    expected = ast.literal_eval(body)
+
+    assert scanned(body, data) == string_values(expected)
+    assert list(FellowPayload(body).iter_lines()) == expected['note_text'].split('\n')
+
+
+def test_nested_and_scalar_values_read_as_source():
+    payload = FellowPayload(json.dumps(PAYLOADS[3]))
+
+    assert json.loads(payload['attendees']) == PAYLOADS[3]['attendees']
+    assert json.loads(payload['meta']) == PAYLOADS[3]['meta']
+    assert (payload['duration'], payload['recorded']) == ('30', 'null')
+
+
+@pytest.mark.parametrize('body', ['no dict here', "{'title': 'unterminated}", "{'list': [1, 2}"])
+def test_malformed_payloads(body):
+    with pytest.raises(ValueError):
+        FellowPayload(body)
@@ -0,0 +1,47 @@
+import TanaAPI as tapi
+
+from .conftest import children_of
+
+
+def submit_note(tana: tapi.Tana, cache: tapi.IdempotencyCache, name: str = 'note') -> tapi.SubmitResult:
+    client = tapi.Tana(tapi.PlainNode(name=name), target_id='INBOX', transport=tana.transport,
+                       rate_limiter=tana.rate_limiter, idempotency=cache)
+    return client.submit(compact=True)
+
+
+def test_replay_skips_the_post(tana, emulator):
+    cache = tapi.IdempotencyCache()
+    first = submit_note(tana, cache)
+    replay = submit_note(tana, cache)
+
+    assert emulator.requests == 1
+    assert replay.raw == first.raw
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    submit_note(tana, cache, 'other note')
+    assert emulator.requests == 2
+    assert children_of(emulator, 'INBOX') == ['note', 'other note']
+
+
+def test_expired_entries_are_sent_again(tana, emulator):
+    cache = tapi.IdempotencyCache(ttl=-1)  # everything is already expired
+    submit_note(tana, cache)
+    submit_note(tana, cache)
+
+    assert emulator.requests == 2
+
+
+def test_store_survives_a_new_cache(tana, emulator, tmp_path):
+    path = tmp_path / 'idempotency.sqlite3'
+    first = submit_note(tana, tapi.IdempotencyCache(store=tapi.SQLiteIdempotencyStore(path)))
+    # a new cache and connection, as after a cold start
+    replay = submit_note(tana, tapi.IdempotencyCache(store=tapi.SQLiteIdempotencyStore(path)))
+
+    assert emulator.requests == 1
+    assert replay.raw == first.raw
+
+
+def test_key_ignores_dict_order():
+    assert tapi.submission_key('INBOX', [{'name': 'a', 'description': 'b'}]) == \
+        tapi.submission_key('INBOX', [{'description': 'b', 'name': 'a'}])
+    assert tapi.submission_key('INBOX', [{'name': 'a'}]) != tapi.submission_key('LIBRARY', [{'name': 'a'}])
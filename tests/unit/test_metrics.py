@@ -0,0 +1,69 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import TanaAPI as tapi
+from TanaAPI import _rate_limit, _transport
+import _metrics
+from _metrics import instrumented, span
+
+
+@pytest.fixture()
+def default_client(monkeypatch, emulator, rate_limiter):
+    """The default transport and rate limiter, pointed at the emulator for this test."""
+    monkeypatch.setattr(_transport, '_DEFAULT_TRANSPORT', emulator.transport())
+    monkeypatch.setattr(_rate_limit, '_DEFAULT_RATE_LIMITER', rate_limiter)
+    monkeypatch.delenv(_metrics.DEBUG_ENV, raising=False)
+    monkeypatch.delenv(_metrics.PAYLOAD_SAMPLE_ENV, raising=False)
+
+
+@instrumented
+def handler(event, context):
+    with span('Build'):
+        tana = tapi.Tana().target_inbox().add_strings(*event['names'])
+    tana.submit()
+    return {"statusCode": 200, "body": "success"}
+
+
+def printed(capsys) -> list[dict]:
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_prints_one_emf_line(default_client, capsys):
+    handler({'names': ['a', 'b']}, SimpleNamespace(aws_request_id='req-1'))
+    line, = printed(capsys)
+
+    directive, = line['_aws']['CloudWatchMetrics']
+    assert directive['Dimensions'] == [['Handler']] and line['Handler'] == __name__
+    names = [metric['Name'] for metric in directive['Metrics']]
+    assert all(isinstance(line[name], (int, float)) for name in names)
+    assert {'Duration', 'Build', 'ColdStart', 'Requests', 'NodesSent', 'BytesSent', 'NodesPerRequest'} <= set(names)
+    assert (line['Requests'], line['NodesSent'], line['NodesPerRequest']) == (1, 2, 2)
+    assert (line['RequestId'], line['StatusCode']) == ('req-1', 200)
+    assert 'Errors' not in line
+
+
+def test_errors_are_counted(default_client, emulator, capsys):
+    emulator.config.error_rate = 1.0
+    with pytest.raises(requests.HTTPError):
+        handler({'names': ['a']}, None)
+    line, = printed(capsys)
+
+    assert line['Errors'] == 1 and 'StatusCode' not in line
+
+
+def test_payload_logged_with_debug(default_client, monkeypatch, capsys):
+    monkeypatch.setenv(_metrics.DEBUG_ENV, '1')
+    handler({'names': ['a']}, None)
+    payload, emf = printed(capsys)
+
+    assert payload['Payload'] == {'names': ['a']}
+    assert '_aws' in emf
+
+
+@pytest.mark.parametrize('rate, logged', [('1', True), ('0', False), ('', False), ('often', False)])
+def test_payload_sample_rate(default_client, monkeypatch, rate, logged):
+    monkeypatch.setenv(_metrics.PAYLOAD_SAMPLE_ENV, rate)
+    assert _metrics.should_log_payload() is logged
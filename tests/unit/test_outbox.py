@@ -0,0 +1,107 @@
+import pytest
+
+import TanaAPI as tapi
+from TanaAPI import _outbox
+
+from .conftest import children_of
+
+
+@pytest.fixture()
+def outbox(tmp_path):
+    return tapi.SQLiteOutbox(tmp_path / 'outbox.sqlite3')
+
+
+def enqueue_names(outbox, *names: str, target_id: str = 'INBOX'):
+    for name in names:
+        tapi.enqueue(tapi.TanaBuilder().set_target_id(target_id).add_children(tapi.PlainNode(name=name)), outbox)
+
+
+def drainer(outbox, tana, **kwargs) -> tapi.OutboxDrainer:
+    # no backoff or lease, so anything that failed is claimable again on the next drain
+    return tapi.OutboxDrainer(outbox, tana, **{'retry_base': 0, 'lease_seconds': 0, **kwargs})
+
+
+def test_delivers_each_entry_in_order(outbox, tana, emulator):
+    enqueue_names(outbox, 'a', 'b', 'c')
+    stats = drainer(outbox, tana).drain()
+
+    assert (stats.delivered, stats.failed, stats.requests) == (3, 0, 3)
+    assert children_of(emulator, 'INBOX') == ['a', 'b', 'c']
+    assert outbox.pending_count() == 0
+
+
+def test_failed_entry_holds_back_its_target(outbox, tana, emulator):
+    enqueue_names(outbox, 'a', 'b', 'c')
+    emulator.config.error_rate = 1.0
+    stats = drainer(outbox, tana).drain()
+
+    assert (stats.delivered, stats.failed) == (0, 3)
+    assert emulator.requests == 1  # b and c wait behind a instead of going out of order
+    assert outbox.pending_count() == 3
+
+    emulator.config.error_rate = 0.0
+    stats = drainer(outbox, tana).drain()
+    assert stats.delivered == 3
+    assert children_of(emulator, 'INBOX') == ['a', 'b', 'c']
+
+
+def test_gives_up_after_max_attempts(outbox, tana, emulator):
+    enqueue_names(outbox, 'a')
+    emulator.config.error_rate = 1.0
+    for _ in range(2):
+        drainer(outbox, tana, max_attempts=2).drain()
+
+    assert outbox.pending_count() == 0
+    assert emulator.requests == 2
+
+
+def test_skips_replayed_submissions(outbox, tana, emulator):
+    enqueue_names(outbox, 'a', 'a')
+    stats = drainer(outbox, tana, idempotency=tapi.IdempotencyCache()).drain()
+
+    assert (stats.delivered, stats.skipped) == (1, 1)
+    assert children_of(emulator, 'INBOX') == ['a']
+
+
+def test_default_outbox_must_be_configured(monkeypatch, tmp_path):
+    monkeypatch.setattr(_outbox, '_DEFAULT_OUTBOX', None)
+    monkeypatch.delenv(_outbox.OUTBOX_QUEUE_ENV, raising=False)
+    monkeypatch.delenv(_outbox.OUTBOX_PATH_ENV, raising=False)
+    with pytest.raises(RuntimeError):
+        tapi.get_default_outbox()
+
+    monkeypatch.setenv(_outbox.OUTBOX_PATH_ENV, str(tmp_path / 'outbox.sqlite3'))
+    assert isinstance(tapi.get_default_outbox(), tapi.SQLiteOutbox)
+
+
+class ShortPollMissClient:
+    """A FIFO queue whose short polls always come back empty, as they can on SQS."""
+    def __init__(self):
+        self.messages = []
+        self.waits = []
+
+    def send_message(self, QueueUrl, MessageBody, MessageGroupId, MessageDeduplicationId):
+        self.messages.append({'Body': MessageBody, 'ReceiptHandle': f'r{len(self.messages)}',
+                              'Attributes': {'ApproximateReceiveCount': '1'}})
+        return {'MessageId': f'm{len(self.messages)}'}
+
+    def receive_message(self, QueueUrl, AttributeNames, MaxNumberOfMessages, VisibilityTimeout, WaitTimeSeconds):
+        self.waits.append(WaitTimeSeconds)
+        if not WaitTimeSeconds:
+            return {}
+        batch, self.messages = self.messages[:MaxNumberOfMessages], self.messages[MaxNumberOfMessages:]
+        return {'Messages': batch}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        pass
+
+
+def test_sqs_claim_long_polls(tana, emulator):
+    client = ShortPollMissClient()
+    outbox = tapi.SQSOutbox('https://sqs.example/queue.fifo', client=client)
+    enqueue_names(outbox, 'a', 'b')
+    stats = drainer(outbox, tana, poll_wait=1).drain(time_budget=5)
+
+    assert stats.delivered == 2
+    assert children_of(emulator, 'INBOX') == ['a', 'b']
+    assert client.waits[0] == 1
@@ -0,0 +1,33 @@
+import TanaAPI as tapi
+
+
+def names(children) -> list:
+    return [c if isinstance(c, str) else (c.name, names(c.children or [])) for c in children]
+
+
+def test_nodes_go_under_latest_lower_level():
+    builder = tapi.OutlineBuilder()
+    builder.extend([(0, tapi.PlainNode(name='a')), (1, tapi.PlainNode(name='b')), (1, 'leaf'),
+                    (2, tapi.PlainNode(name='c')), (0, tapi.PlainNode(name='d'))])
+
+    # 'c' skips past the string, which never becomes a parent
+    assert names(builder.children) == [('a', [('b', []), 'leaf', ('c', [])]), ('d', [])]
+
+
+def test_placeholders_fill_skipped_levels():
+    root = tapi.PlainNode(name='root')
+    children = tapi.build_outline([(0, 'x'), (2, 'y')], lambda item: (item[0], tapi.PlainNode(name=item[1])),
+                                  root, placeholder=lambda: tapi.DummyNode(name='-'))
+
+    assert children is root.children
+    assert names(children) == [('x', [('-', [('y', [])])])]
+
+
+def test_children_are_set_as_by_assignment():
+    built = tapi.PlainNode(name='parent')
+    tapi.OutlineBuilder(built).add(0, tapi.PlainNode(name='child'))
+    assigned = tapi.PlainNode(name='parent')
+    assigned.children = [tapi.PlainNode(name='child')]
+
+    assert built.model_fields_set == assigned.model_fields_set
+    assert built.model_dump(exclude_unset=True) == assigned.model_dump(exclude_unset=True)
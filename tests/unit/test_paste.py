@@ -0,0 +1,85 @@
+import pytest
+
+import TanaAPI as tapi
+from TanaAPI._resolver import FIELD, REFERENCE, SUPERTAG
+from _helper_fxns import (PASTE_CHECKBOX, PASTE_DATE, PASTE_FIELD, PASTE_PLAIN, PASTE_REFERENCE, PASTE_URL,
+                          PasteToken, node_to_markup, parse_tana_paste, paste_token)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('plain text', PasteToken(0, PASTE_PLAIN, 'plain text')),
+    ('[[Cost^abc]]::', PasteToken(0, PASTE_FIELD, 'Cost', 'abc')),
+    ('Cost:: 12', PasteToken(0, PASTE_FIELD, 'Cost', None, PasteToken(0, PASTE_PLAIN, '12'))),
+    ('Owner:: [[Ann^p1]]', PasteToken(0, PASTE_FIELD, 'Owner', None, PasteToken(0, PASTE_REFERENCE, 'Ann', 'p1'))),
+    ('a::b is not a field', PasteToken(0, PASTE_PLAIN, 'a::b is not a field')),
+    ('[x] done', PasteToken(0, PASTE_CHECKBOX, 'done', value=True)),
+    ('[ ] todo', PasteToken(0, PASTE_CHECKBOX, 'todo', value=False)),
+    ('[[Ann^p1]]', PasteToken(0, PASTE_REFERENCE, 'Ann', 'p1')),
+    ('[[Ann]]', PasteToken(0, PASTE_REFERENCE, 'Ann')),
+    ('[[date:2024-04-01]]', PasteToken(0, PASTE_DATE, '2024-04-01')),
+    ('[site](https://example.com)', PasteToken(0, PASTE_URL, 'site', value='https://example.com')),
+    ('Standup #meeting #[[Weekly Sync^t1]]',
+     PasteToken(0, PASTE_PLAIN, 'Standup', supertags=(('meeting', None, '#meeting'),
+                                                      ('Weekly Sync', 't1', '#[[Weekly Sync^t1]]')))),
+    ('issue #12 is open', PasteToken(0, PASTE_PLAIN, 'issue #12 is open')),
+])
+def test_paste_token(text, expected):
+    assert paste_token(0, text) == expected
+
+
+PASTE = '''%%tana%%
+- Standup #[[meeting^t1]]
+  - Notes
+    - Cost:: 12
+    - [[Owner^f1]]::
+      - [[Ann^p1]]
+  - [x] done
+- [[date:2024-04-01]]
+'''
+
+
+def test_parses_nested_outline():
+    standup, date = parse_tana_paste(PASTE)
+
+    assert standup.name == 'Standup' and [t.id for t in standup.supertags] == ['t1']
+    notes, done = standup.children
+    cost, owner = notes.children
+    assert cost.name == 'Cost::'  # no resolver, so the field is kept as text, with its value under it
+    assert cost.children[0].name == '12'
+    assert isinstance(owner, tapi.FieldNode) and owner.attributeId == 'f1'
+    assert isinstance(owner.children[0], tapi.ReferenceNode)
+    assert isinstance(done, tapi.CheckboxNode) and done.value is True
+    assert isinstance(date, tapi.DateNode) and date.name == '2024-04-01'
+
+
+def test_chunked_source_parses_the_same():
+    chunks = [PASTE[i:i + 7] for i in range(0, len(PASTE), 7)]
+    assert [n.model_dump() for n in parse_tana_paste(chunks)] == [n.model_dump() for n in parse_tana_paste(PASTE)]
+
+
+def test_round_trips_markup():
+    names = {'t1': 'meeting', 'f1': 'Owner'}
+    nodes = parse_tana_paste('- Standup #[[meeting^t1]]\n  - [[Owner^f1]]::\n    - [x] done')
+    markup = node_to_markup(nodes[0], names)
+    assert [n.model_dump() for n in parse_tana_paste(markup)] == [n.model_dump() for n in nodes]
+
+
+def test_resolver_creates_names_in_one_submit_per_kind(tana, emulator):
+    resolver = tapi.NodeResolver(tana)
+    standup, = parse_tana_paste('- Standup #meeting\n  - Owner:: [[Ann]]\n  - Cost:: 12', resolver, create=True)
+
+    assert emulator.requests == 3  # one each for the fields, the supertags and the references
+    assert standup.name == 'Standup'
+    assert standup.supertags[0].id == resolver.get(SUPERTAG, 'meeting')
+    owner, cost = standup.children
+    assert owner.attributeId == resolver.get(FIELD, 'Owner')
+    assert owner.children[0].target.nodeId == resolver.get(REFERENCE, 'Ann')
+    assert cost.attributeId == resolver.get(FIELD, 'Cost')
+
+
+def test_unknown_names_stay_text_without_create(tana, emulator):
+    standup, = parse_tana_paste('- Standup #meeting\n  - [[Ann]]', tapi.NodeResolver(tana))
+
+    assert emulator.requests == 0
+    assert standup.name == 'Standup #meeting'
+    assert standup.children[0].name == '[[Ann]]'
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+import requests
+
+import TanaAPI as tapi
+from TanaAPI._rate_limit import parse_retry_after
+
+
+def test_retry_after_delays_the_next_request(tana, emulator, rate_limiter):
+    emulator.config.rate_429, emulator.config.retry_after = 1.0, 0.2
+    rate_limiter.max_retries = 2
+    start = time.monotonic()
+    with pytest.raises(requests.HTTPError):
+        tana.target_inbox().add_strings('a').submit()
+
+    assert time.monotonic() - start >= 2 * 0.2
+    assert emulator.requests == 3  # the first try and max_retries retries, then it gives up
+    assert (rate_limiter.metrics.throttled, rate_limiter.metrics.retries) == (3, 2)
+
+
+def test_server_errors_are_not_retried(tana, emulator, rate_limiter):
+    # the nodes may have been created before the error, so sending again could duplicate them
+    emulator.config.error_rate = 1.0
+    with pytest.raises(requests.HTTPError):
+        tana.target_inbox().add_strings('a').submit()
+
+    assert emulator.requests == 1
+    assert rate_limiter.metrics.retries == 0
+
+
+def test_503_retried_only_with_retry_after():
+    limiter = tapi.RateLimiter()
+    assert limiter.should_retry(503, 0, '1')
+    assert not limiter.should_retry(503, 0)
+    assert not limiter.should_retry(502, 0, '1')
+    assert not limiter.should_retry(429, limiter.max_retries)
+
+
+def test_rate_halves_on_429_and_recovers():
+    limiter = tapi.RateLimiter(rate=1.0, increase_step=0.25, increase_after=2)
+    limiter.on_response(429)
+    assert limiter.rate == 0.5
+    limiter.on_response(429)
+    assert limiter.rate == 0.25
+
+    for _ in range(6):
+        limiter.on_response(200)
+    assert limiter.rate == 1.0  # +0.25 every two successes, up to the starting rate
+    for _ in range(2):
+        limiter.on_response(200)
+    assert limiter.rate == 1.0
+
+
+def test_retry_after_parsing():
+    assert tapi.RateLimiter().backoff(0, '0.1') == pytest.approx(0.1)
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
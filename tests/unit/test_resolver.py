@@ -0,0 +1,75 @@
+import pytest
+
+import TanaAPI as tapi
+from TanaAPI._nodes import NodeType
+from TanaAPI._resolver import FIELD, REFERENCE
+from TanaAPI._supertag_models import SupertagBase, SupertagField
+
+from .conftest import children_of
+
+
+def test_creates_missing_names_in_one_submit(tana, emulator):
+    resolver = tapi.NodeResolver(tana)
+    node_ids = resolver.resolve_many(FIELD, ['Cost', 'Vendor', 'Cost'])
+
+    assert emulator.requests == 1
+    assert list(node_ids) == ['Cost', 'Vendor']
+    assert children_of(emulator, 'SCHEMA') == ['Cost', 'Vendor']
+    assert emulator.graph[node_ids['Cost']]['supertags'] == [{'id': 'SYS_T02'}]
+
+    assert resolver.resolve_many(FIELD, ['Vendor', 'Cost']) == {'Vendor': node_ids['Vendor'], 'Cost': node_ids['Cost']}
+    assert emulator.requests == 1
+
+
+def test_seeded_and_unknown_names(tana, emulator):
+    resolver = tapi.NodeResolver(tana)
+    resolver.seed(FIELD, {'Date': 'SYS_A90'})
+
+    assert resolver.field('Date').attributeId == 'SYS_A90'
+    with pytest.raises(KeyError):
+        resolver.resolve(FIELD, 'Nope', create=False)
+    assert emulator.requests == 0
+
+
+def test_store_is_shared_between_resolvers(tana, emulator, tmp_path):
+    store = tapi.SQLiteResolverStore(tmp_path / 'resolver.sqlite3')
+    node_id = tapi.NodeResolver(tana, store=store).resolve(REFERENCE, 'Acme')
+
+    assert tapi.NodeResolver(tana, store=store).get(REFERENCE, 'Acme') == node_id
+    assert emulator.requests == 1
+
+
+def test_ttl_applies_without_a_store(tana):
+    resolver = tapi.NodeResolver(tana, ttl=-1)  # everything is already expired
+    resolver.resolve(FIELD, 'Cost')
+
+    assert resolver.get(FIELD, 'Cost') is None
+
+
+def test_supertag_field_resolves_references_together(tana, emulator):
+    resolver = tapi.NodeResolver(tana)
+
+    class Meeting(SupertagBase):
+        supertag_id = 'meeting'
+        attendees = SupertagField('attendees', NodeType.reference, resolver=resolver)
+
+    meeting = Meeting('Standup')
+    meeting.attendees = ['Ann', 'Bob', 'Cy', 'Ann']
+    field = meeting.model_dump()['children'][0]
+
+    assert emulator.requests == 1
+    ids = [child['id'] for child in field['children']]
+    assert ids[0] == ids[3] and len(set(ids)) == 3
+    assert [emulator.graph[i]['name'] for i in ids] == ['Ann', 'Bob', 'Cy', 'Ann']
+
+
+def test_invalidate_kind_clears_the_store(tana, tmp_path):
+    store = tapi.SQLiteResolverStore(tmp_path / 'resolver.sqlite3')
+    tapi.NodeResolver(tana, store=store).resolve_many(FIELD, ['Cost', 'Vendor'])
+    tapi.NodeResolver(tana, store=store).resolve(REFERENCE, 'Acme')
+
+    # a resolver that never loaded the fields still forgets all of them
+    tapi.NodeResolver(tana, store=store).invalidate(FIELD)
+
+    assert store.get_many(FIELD, ['Cost', 'Vendor']) == {}
+    assert list(store.get_many(REFERENCE, ['Acme'])) == ['Acme']
@@ -0,0 +1,18 @@
+import pytest
+
+from sembly_transcripts import TRANSCRIPT_NAME, find_node_id
+
+MEETING = {'nodeId': 'm', 'name': 'Standup'}
+
+
+@pytest.mark.parametrize('children', [
+    [{'nodeId': 'f', 'type': 'field', 'children': [{'nodeId': 't', 'name': TRANSCRIPT_NAME}]}],
+    [{'nodeId': 't', 'name': TRANSCRIPT_NAME}],  # field nodes left out of the response
+])
+def test_finds_transcript_with_or_without_field_nodes(children):
+    assert find_node_id(dict(MEETING, children=children), TRANSCRIPT_NAME) == 't'
+
+
+def test_missing_transcript_is_an_error():
+    with pytest.raises(ValueError):
+        find_node_id(dict(MEETING, children=[]), TRANSCRIPT_NAME)
@@ -0,0 +1,57 @@
+import json
+
+import TanaAPI as tapi
+from TanaAPI._chunking import count_nodes
+from TanaAPI._nodes import FileNode
+
+
+def sample_nodes() -> list:
+    return [
+        tapi.PlainNode(name='Meeting', description='weekly', supertags=[tapi.SuperTag(id='tag1')], children=[
+            'a plain string',
+            tapi.FieldNode(attributeId='field1')(tapi.DateNode(name='2024-04-01')),
+            tapi.CheckboxNode(name='done', value=True),
+            tapi.URLNode(url='https://example.com', name='link'),
+            tapi.ReferenceNode(target=tapi.PlainNode(name='', nodeId='abc')),
+            tapi.PlainNode(name='ünïcødé "quoted" \\ back\nslash'),
+        ]),
+        'top level string',
+    ]
+
+
+def test_to_wire_matches_model_dump():
+    builder = tapi.Tana().target_inbox().add_children(*sample_nodes())
+    assert tapi.to_wire(builder.children) == builder.model_dump()['nodes']
+
+
+def test_encode_request_matches_model_dump_bytes():
+    builder = tapi.Tana().target_inbox().add_children(*sample_nodes())
+    body, count = tapi.encode_request(builder.children, builder.target_id)
+
+    expected = json.dumps(builder.model_dump(), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    assert body == expected
+    assert count == count_nodes(builder.model_dump()['nodes'])
+
+
+def test_encode_request_stops_at_limits():
+    nodes = [tapi.PlainNode(name=f'n{i}') for i in range(10)]
+    assert tapi.encode_request(nodes, 'INBOX', max_nodes=9) is None
+    assert tapi.encode_request(nodes, 'INBOX', max_bytes=50) is None
+    assert tapi.encode_request(nodes, 'INBOX', max_nodes=10, max_bytes=5000) is not None
+
+
+def test_tree_builder_matches_nodes():
+    tree = tapi.TreeBuilder()
+    meeting = tree.add('Meeting', supertags=['tag1'])
+    tree.extend(['one', 'two'], parent=tree.field('field1', parent=meeting))
+    nodes = [tapi.PlainNode(name='Meeting', supertags=[tapi.SuperTag(id='tag1')], children=[
+        tapi.FieldNode(attributeId='field1', children=['one', 'two'])])]
+
+    assert tapi.to_wire([tree]) == tapi.to_wire(nodes)
+    assert json.loads(tapi.encode_nodes([tree])) == tapi.to_wire(nodes)
+
+
+def test_file_node_encodes_like_model_dump():
+    node = FileNode.from_bytes(bytes(range(256)) * 4, 'data.bin')
+    assert json.loads(tapi.encode_nodes([node])) == [node.model_dump()]
+
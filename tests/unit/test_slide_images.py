@@ -0,0 +1,83 @@
+import pytest
+
+import slide_images
+from slide_images import MAX_QUALITY, fit_image, render_image
+
+HEADER = slide_images.IMAGE_FORMATS['png'][1]
+
+
+class FakePixmap:
+    """Encodes to ``header + bytes_per_pixel * pixels`` bytes, scaled by the jpeg quality."""
+    def __init__(self, width: int, height: int, bytes_per_pixel: float):
+        self.width, self.height, self.bytes_per_pixel = width, height, bytes_per_pixel
+
+    def tobytes(self, output='png', jpg_quality=MAX_QUALITY):
+        scale = 1.0 if output == 'png' else jpg_quality / 100
+        return b'x' * int(HEADER + self.bytes_per_pixel * scale * self.width * self.height)
+
+    def shrink(self, n):
+        self.width >>= n
+        self.height >>= n
+
+
+class FakePage:
+    """A 960x540 slide whose renders measure the given bytes per pixel, in turn."""
+    class rect:
+        width, height = 960, 540
+
+    def __init__(self, *bytes_per_pixel: float):
+        self.bytes_per_pixel = list(bytes_per_pixel)
+        self.zooms = []
+
+    def get_pixmap(self, matrix=(1, 0, 0, 1, 0, 0)):
+        zoom = matrix[0]
+        self.zooms.append(zoom)
+        bpp = self.bytes_per_pixel.pop(0) if len(self.bytes_per_pixel) > 1 else self.bytes_per_pixel[0]
+        return FakePixmap(int(self.rect.width * zoom), int(self.rect.height * zoom), bpp)
+
+
+@pytest.fixture(autouse=True)
+def fresh_estimates():
+    slide_images._bytes_per_pixel.clear()
+    yield
+    slide_images._bytes_per_pixel.clear()
+
+
+def test_fits_budget_in_at_most_two_renders():
+    page = FakePage(2.0)  # far denser than the png prior, so the first render overshoots
+    data = fit_image(page, 50_000)
+
+    assert len(data) <= 50_000
+    assert len(page.zooms) <= 2
+
+
+def test_keeps_first_render_when_second_overshoots():
+    page = FakePage(0.1, 2.0)  # the first fits well under, the re-render comes out much denser
+    data = fit_image(page, 50_000)
+
+    assert len(page.zooms) == 2 and page.zooms[1] > page.zooms[0]
+    assert HEADER < len(data) <= 50_000
+    first = FakePixmap(int(960 * page.zooms[0]), int(540 * page.zooms[0]), 0.1).tobytes()
+    assert data == first
+
+
+def test_jpeg_uses_highest_quality_that_fits():
+    page = FakePage(1.0)
+    data = fit_image(page, 20_000, image_format='jpeg')
+
+    pix = FakePixmap(int(960 * page.zooms[-1]), int(540 * page.zooms[-1]), 1.0)
+    fitting = [q for q in range(slide_images.MIN_QUALITY, MAX_QUALITY + 1) if len(pix.tobytes('jpeg', q)) <= 20_000]
+    assert data == pix.tobytes('jpeg', max(fitting))
+
+
+def test_unsized_render_is_zoom_one():
+    page = FakePage(0.8)
+    data = render_image(page)
+
+    assert page.zooms == [1]
+    assert len(data) == int(HEADER + 0.8 * 960 * 540)
+
+
+def test_raises_when_nothing_fits():
+    with pytest.raises(slide_images.LargeFileError):
+        fit_image(FakePage(0.8), HEADER - 1)